@@ -0,0 +1,235 @@
+"""
+模型后端
+
+NovelGenerator 只通过这里定义的接口调用模型：generate 一次返回全文，
+stream 按片段返回，count_tokens 统计 token 数，context_cache 提供缓存上下文
+（没有时返回 None）。create_backend 创建的后端外面包有 resilience.ResilientBackend，
+负责限流、重试和熔断。通过 LLM_BACKEND 环境变量选择后端：
+
+- gemini：Google Gemini，需要 GEMINI_API_KEY
+- fake：本地确定性后端，不访问网络，用于测试、基准测试和离线运行
+"""
+import os
+import time
+import random
+import hashlib
+import logging
+from typing import Iterator, Optional, List
+from .prompt import estimate_tokens
+from .bible import GeminiContextBackend, LocalContextBackend
+
+class LLMBackend:
+    """模型后端接口"""
+
+    # 后端名和模型名，模型名也用作响应缓存的键
+    name = ""
+    model = ""
+
+    def generate(self, prompt: str, cached_content: Optional[str] = None,
+                 timeout: Optional[float] = None) -> str:
+        """生成全文
+
+        Args:
+            prompt: 提示词
+            cached_content: 缓存上下文句柄，提示词接在缓存内容之后
+            timeout: 请求超时（秒），超时抛出 TimeoutError
+        """
+        raise NotImplementedError
+
+    def stream(self, prompt: str, cached_content: Optional[str] = None,
+               timeout: Optional[float] = None) -> Iterator[str]:
+        """按片段生成，调用方提前停止迭代时应释放底层连接"""
+        raise NotImplementedError
+
+    def count_tokens(self, text: str) -> int:
+        """统计文本的 token 数"""
+        raise NotImplementedError
+
+    def context_cache(self):
+        """缓存上下文后端，供 NovelBibleCache 使用，不支持时返回 None"""
+        return None
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini 后端"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "gemini-2.0-flash-exp"):
+        """
+        Args:
+            api_key: API 密钥，默认读取 GEMINI_API_KEY 环境变量
+            model: 模型名
+        """
+        from google import genai
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("未找到 GEMINI_API_KEY 环境变量")
+        self.client = genai.Client(api_key=api_key)
+        self.model = model
+
+    def generate(self, prompt: str, cached_content: Optional[str] = None,
+                 timeout: Optional[float] = None) -> str:
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._config(cached_content, timeout)
+        )
+        return response.text
+
+    def stream(self, prompt: str, cached_content: Optional[str] = None,
+               timeout: Optional[float] = None) -> Iterator[str]:
+        stream = self.client.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config=self._config(cached_content, timeout)
+        )
+        try:
+            for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            # 提前结束时关闭底层连接
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+    def count_tokens(self, text: str) -> int:
+        response = self.client.models.count_tokens(model=self.model, contents=text)
+        return response.total_tokens
+
+    def context_cache(self):
+        return GeminiContextBackend(self.client, self.model)
+
+    def _config(self, cached_content: Optional[str], timeout: Optional[float]):
+        if not cached_content and not timeout:
+            return None
+        from google.genai import types
+        return types.GenerateContentConfig(
+            cached_content=cached_content or None,
+            http_options=types.HttpOptions(timeout=int(timeout * 1000)) if timeout else None
+        )
+
+# 本地后端生成文本时使用的句子
+_FAKE_SENTENCES = [
+    "夜色渐深，山风从林间穿过。",
+    "他握紧手中的剑，没有说话。",
+    "远处传来几声犬吠，又很快归于寂静。",
+    "她望着窗外的灯火，想起了许多旧事。",
+    "客栈里人声嘈杂，酒香混着饭菜的热气。",
+    "马蹄声由远及近，停在了门外。",
+    "众人面面相觑，谁也不愿先开口。",
+    "雨点打在青石板上，溅起细碎的水花。",
+]
+
+class FakeBackend(LLMBackend):
+    """本地确定性后端
+
+    输出只由缓存内容和提示词决定，同样的输入总是得到同样的文本。
+    可以设置首个片段前的延迟、片段之间的延迟和输出长度，用于模拟模型的响应时间。
+    提示词要求 JSON 输出时返回空数组，使角色提取等解析 JSON 的调用也能正常结束。
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0, chunk_delay: float = 0.0,
+                 output_chars: int = 400, chunk_chars: int = 40, model: str = "fake"):
+        """
+        Args:
+            latency: 开始输出前的延迟（秒）
+            chunk_delay: 两个片段之间的延迟（秒）
+            output_chars: 每次输出的字数
+            chunk_chars: 流式输出时每个片段的字数
+            model: 模型名
+        """
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.output_chars = output_chars
+        self.chunk_chars = chunk_chars
+        self.model = model
+        self.calls = 0
+        self._contexts = LocalContextBackend()
+
+    def generate(self, prompt: str, cached_content: Optional[str] = None,
+                 timeout: Optional[float] = None) -> str:
+        return "".join(self.stream(prompt, cached_content, timeout))
+
+    def stream(self, prompt: str, cached_content: Optional[str] = None,
+               timeout: Optional[float] = None) -> Iterator[str]:
+        self.calls += 1
+        full_prompt = self._resolve(cached_content) + prompt
+        if timeout is not None and self.latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"请求超时: {timeout}秒")
+        if self.latency:
+            time.sleep(self.latency)
+        text = self._output(full_prompt)
+        for start in range(0, len(text), self.chunk_chars):
+            if start and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield text[start:start + self.chunk_chars]
+
+    def count_tokens(self, text: str) -> int:
+        return estimate_tokens(text)
+
+    def context_cache(self):
+        return self._contexts
+
+    def _resolve(self, cached_content: Optional[str]) -> str:
+        """取回缓存上下文，句柄无效时与服务端一样报错"""
+        if not cached_content:
+            return ""
+        text = self._contexts.resolve(cached_content)
+        if text is None:
+            raise ValueError(f"缓存上下文不存在: {cached_content}")
+        return text
+
+    def _output(self, prompt: str) -> str:
+        if "JSON" in prompt:
+            return "[]"
+        seed = int.from_bytes(hashlib.sha256(f"{self.model}\0{prompt}".encode()).digest()[:8], "little")
+        rng = random.Random(seed)
+        parts: List[str] = []
+        length = 0
+        while length < self.output_chars:
+            sentence = rng.choice(_FAKE_SENTENCES)
+            parts.append(sentence)
+            length += len(sentence)
+        return "".join(parts)[:self.output_chars]
+
+def create_backend(name: Optional[str] = None, resilient: bool = True) -> LLMBackend:
+    """按配置创建后端
+
+    Args:
+        name: 后端名，默认读取 LLM_BACKEND 环境变量（gemini）。
+            Gemini 的模型名来自 GEMINI_MODEL；本地后端的参数来自 FAKE_LLM_LATENCY、
+            FAKE_LLM_CHUNK_DELAY、FAKE_LLM_OUTPUT_CHARS
+        resilient: 是否包上限流、重试和熔断。参数来自 LLM_RATE_LIMIT（每秒请求数，
+            0 表示不限流）、LLM_BURST、LLM_MAX_ATTEMPTS、LLM_DEADLINE（秒）
+
+    Returns:
+        后端实例
+    """
+    name = (name or os.getenv("LLM_BACKEND", "gemini")).lower()
+    if name == "gemini":
+        backend = GeminiBackend(model=os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp"))
+    elif name == "fake":
+        backend = FakeBackend(
+            latency=float(os.getenv("FAKE_LLM_LATENCY", "0")),
+            chunk_delay=float(os.getenv("FAKE_LLM_CHUNK_DELAY", "0")),
+            output_chars=int(os.getenv("FAKE_LLM_OUTPUT_CHARS", "400"))
+        )
+    else:
+        raise ValueError(f"未知的模型后端: {name}")
+    logging.info(f"使用模型后端: {backend.name} ({backend.model})")
+    if not resilient:
+        return backend
+    
+    from .resilience import ResilientBackend
+    return ResilientBackend(
+        backend,
+        rate=float(os.getenv("LLM_RATE_LIMIT", "1")),
+        burst=float(os.getenv("LLM_BURST", "5")),
+        max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "4")),
+        deadline=float(os.getenv("LLM_DEADLINE", "120")) or None
+    )
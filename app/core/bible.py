@@ -0,0 +1,191 @@
+"""
+小说设定集（novel bible）缓存
+
+续写时写作要求、小说大纲、角色表和角色关系在多次调用之间基本不变，
+只有提示词和当前章节信息变化。这里把不变的部分按固定顺序拼成设定集，
+在模型服务端登记为缓存上下文，之后的调用只需引用缓存句柄；
+设定集内容变化（大纲或角色变化）时旧句柄作废并重新登记。
+"""
+import time
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+from .delta import content_hash
+from .prompt import estimate_tokens
+
+def build_novel_bible(instructions: str, outline: Optional[str], characters: List[Dict[str, Any]],
+                      relationships: List[Dict[str, Any]]) -> str:
+    """拼接设定集
+
+    同样的输入总是得到完全相同的文本：角色按ID排序，关系按双方ID和类型排序，
+    这样设定集内容不变时缓存句柄可以复用。
+
+    Args:
+        instructions: 写作要求
+        outline: 小说大纲
+        characters: 角色列表，每项至少包含 id、name、description
+        relationships: 关系列表，每项包含 character1_id、character1_name、
+            character2_id、character2_name、relationship_type、description
+
+    Returns:
+        设定集文本
+    """
+    parts = [instructions.strip()]
+    if outline:
+        parts.append(f"小说大纲：\n{outline.strip()}")
+    if characters:
+        lines = ["角色表："]
+        for char in sorted(characters, key=lambda c: (c.get('id') or 0, c['name'])):
+            line = f"- {char['name']}: {char.get('description') or ''}"
+            if char.get('characteristics'):
+                line += f" ({char['characteristics']})"
+            if char.get('role_type'):
+                line += f" [{char['role_type']}]"
+            lines.append(line)
+        parts.append("\n".join(lines))
+    if relationships:
+        lines = ["角色关系："]
+        ordered = sorted(relationships, key=lambda r: (
+            r.get('character1_id') or 0, r.get('character2_id') or 0, r['relationship_type']
+        ))
+        for r in ordered:
+            line = f"- {r['character1_name']} 与 {r['character2_name']}：{r['relationship_type']}"
+            if r.get('description'):
+                line += f"（{r['description']}）"
+            lines.append(line)
+        parts.append("\n".join(lines))
+    return "\n\n".join(parts)
+
+class GeminiContextBackend:
+    """通过 Gemini 的缓存上下文接口登记设定集"""
+
+    def __init__(self, client, model: str):
+        """
+        Args:
+            client: google.genai.Client 实例
+            model: 模型名，缓存只能被同一模型使用
+        """
+        self.client = client
+        self.model = model
+
+    def create(self, text: str, ttl: int) -> str:
+        """登记缓存上下文，返回句柄"""
+        from google.genai import types
+        cache = self.client.caches.create(
+            model=self.model,
+            config=types.CreateCachedContentConfig(
+                contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+                ttl=f"{ttl}s"
+            )
+        )
+        return cache.name
+
+    def delete(self, handle: str):
+        """删除缓存上下文"""
+        self.client.caches.delete(name=handle)
+
+class LocalContextBackend:
+    """在本地模拟缓存上下文，用于测试和离线运行
+
+    句柄对应的文本保存在内存中，resolve 可以取回完整的提示词前缀。
+    """
+
+    def __init__(self):
+        self._contents: Dict[str, str] = {}
+        self._next_id = 1
+        self.created = 0
+        self.deleted = 0
+
+    def create(self, text: str, ttl: int) -> str:
+        handle = f"cachedContents/local-{self._next_id}"
+        self._next_id += 1
+        self._contents[handle] = text
+        self.created += 1
+        return handle
+
+    def delete(self, handle: str):
+        if self._contents.pop(handle, None) is not None:
+            self.deleted += 1
+
+    def resolve(self, handle: str) -> Optional[str]:
+        """取回句柄对应的文本，句柄已删除时返回 None"""
+        return self._contents.get(handle)
+
+class NovelBibleCache:
+    """按小说管理设定集的缓存句柄"""
+
+    # 登记失败后暂停登记的秒数，期间直接发送完整提示词
+    RETRY_AFTER = 300
+
+    def __init__(self, backend, ttl: int = 3600, min_tokens: int = 4096):
+        """初始化设定集缓存
+
+        Args:
+            backend: 提供 create(text, ttl) 和 delete(handle) 的后端，见 LLMBackend.context_cache
+            ttl: 缓存上下文的有效期（秒）
+            min_tokens: 设定集少于此 token 数时不登记，服务端对缓存内容有最小长度要求，
+                较短的前缀缓存也没有收益
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        # key -> (设定集哈希, 句柄, 过期时间)
+        self._handles: Dict[Any, Tuple[str, str, float]] = {}
+        self._disabled_until = 0.0
+        self._lock = threading.Lock()
+
+    def get_handle(self, key: Any, text: str) -> Optional[str]:
+        """取得设定集的缓存句柄，内容变化或即将过期时重新登记
+
+        Args:
+            key: 设定集所属对象，通常是小说ID
+            text: 设定集文本
+
+        Returns:
+            缓存句柄；设定集太短或登记失败时返回 None，调用方应发送完整提示词
+        """
+        if estimate_tokens(text) < self.min_tokens:
+            return None
+        digest = content_hash(text)
+        now = time.time()
+        with self._lock:
+            stored = self._handles.get(key)
+            # 留出十分之一的有效期，避免请求途中过期
+            if stored is not None and stored[0] == digest and stored[2] - self.ttl * 0.1 > now:
+                return stored[1]
+            if now < self._disabled_until:
+                return None
+
+            if stored is not None:
+                self._delete(stored[1])
+                del self._handles[key]
+            try:
+                handle = self.backend.create(text, self.ttl)
+            except Exception as e:
+                logging.error(f"登记设定集缓存失败，{self.RETRY_AFTER}秒内发送完整提示词: {e}")
+                self._disabled_until = now + self.RETRY_AFTER
+                return None
+            self._handles[key] = (digest, handle, now + self.ttl)
+            logging.info(f"设定集缓存已登记: {key} -> {handle}，约{estimate_tokens(text)} tokens")
+            return handle
+
+    def invalidate(self, key: Any):
+        """作废设定集的缓存句柄"""
+        with self._lock:
+            stored = self._handles.pop(key, None)
+            if stored is not None:
+                self._delete(stored[1])
+
+    def clear(self):
+        """作废所有缓存句柄"""
+        with self._lock:
+            for _, handle, _ in self._handles.values():
+                self._delete(handle)
+            self._handles.clear()
+
+    def _delete(self, handle: str):
+        try:
+            self.backend.delete(handle)
+        except Exception as e:
+            # 删除失败时等待服务端按有效期清理
+            logging.warning(f"删除设定集缓存失败: {handle}, {e}")
@@ -0,0 +1,212 @@
+from typing import Optional, Dict, Any
+from ..database.sqlite import DatabaseManager
+import hashlib
+import threading
+import time
+import logging
+
+class ResponseCache:
+    """模型响应的磁盘缓存
+
+    摘要、大纲和角色提取的结果只取决于提示词，相同提示词直接返回缓存的响应。
+    缓存保存在独立的 SQLite 文件中，按模型名和规范化后提示词的哈希索引。
+    超过有效期的条目在读取时删除；条目数或总大小超出上限时按最近使用时间淘汰。
+    """
+
+    def __init__(self, db_path: str = "llm_cache.db", max_entries: int = 2000,
+                 max_bytes: int = 64 * 1024 * 1024, ttl: Optional[float] = 30 * 24 * 3600):
+        """初始化响应缓存
+
+        Args:
+            db_path: 缓存文件路径
+            max_entries: 最多保存的条目数
+            max_bytes: 响应总大小上限（字节）
+            ttl: 条目有效期（秒），None 表示不过期
+        """
+        self.db = DatabaseManager(db_path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._init_table()
+
+    def _init_table(self):
+        """创建缓存表"""
+        with self.db.transaction():
+            self.db.execute_query("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hit_count INTEGER DEFAULT 0
+                )
+            """)
+            self.db.execute_query("""
+                CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access
+                ON llm_cache (last_access)
+            """)
+
+    @staticmethod
+    def normalize_prompt(prompt: str) -> str:
+        """规范化提示词：去掉每行末尾的空白和首尾的空行
+
+        行首的空白保持不变，正文段落的全角空格缩进是内容的一部分。
+        """
+        lines = [line.rstrip() for line in (prompt or "").splitlines()]
+        return "\n".join(lines).strip("\n")
+
+    @classmethod
+    def make_key(cls, model: str, prompt: str) -> str:
+        """根据模型名和规范化后的提示词计算缓存键"""
+        data = model + "\0" + cls.normalize_prompt(prompt)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        """读取缓存的响应
+
+        Args:
+            model: 模型名
+            prompt: 提示词
+
+        Returns:
+            缓存的响应，未命中或已过期时返回 None
+        """
+        key = self.make_key(model, prompt)
+        now = time.time()
+        try:
+            result = self.db.execute_query(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            )
+            if result and (self.ttl is None or now - result[0][1] <= self.ttl):
+                self.db.execute_query(
+                    "UPDATE llm_cache SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?",
+                    (now, key)
+                )
+                with self._lock:
+                    self.hits += 1
+                return result[0][0]
+
+            if result:
+                # 已过期
+                self.db.execute_query("DELETE FROM llm_cache WHERE key = ?", (key,))
+            with self._lock:
+                self.misses += 1
+            return None
+
+        except Exception as e:
+            # 缓存不可用时直接调用模型，不影响生成
+            logging.error(f"读取响应缓存失败: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+    def put(self, model: str, prompt: str, response: str):
+        """保存响应，空响应不缓存
+
+        Args:
+            model: 模型名
+            prompt: 提示词
+            response: 模型返回的文本
+        """
+        if not response:
+            return
+
+        key = self.make_key(model, prompt)
+        now = time.time()
+        try:
+            with self.db.transaction():
+                self.db.execute_query("""
+                    INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (key, model, response, len(response.encode("utf-8")), now, now))
+                self._evict()
+        except Exception as e:
+            logging.error(f"写入响应缓存失败: {e}")
+
+    def delete(self, model: str, prompt: str):
+        """删除一条缓存，用于丢弃无法使用的响应"""
+        try:
+            self.db.execute_query("DELETE FROM llm_cache WHERE key = ?", (self.make_key(model, prompt),))
+        except Exception as e:
+            logging.error(f"删除响应缓存失败: {e}")
+
+    def _evict(self):
+        """条目数或总大小超出上限时，删除最久未使用的条目"""
+        count, total = self.db.execute_query(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        )[0]
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        evicted = 0
+        rows = self.db.execute_query("SELECT key, size FROM llm_cache ORDER BY last_access")
+        for key, size in rows:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self.db.execute_query("DELETE FROM llm_cache WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self.evictions += evicted
+        logging.info(f"响应缓存淘汰{evicted}个条目")
+
+    def purge_expired(self) -> int:
+        """删除所有过期条目
+
+        Returns:
+            删除的条目数
+        """
+        if self.ttl is None:
+            return 0
+        with self.db.transaction() as conn:
+            count = conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,)
+            ).rowcount
+        logging.info(f"响应缓存清理过期条目: {count}个")
+        return count
+
+    def clear(self):
+        """清空缓存"""
+        self.db.execute_query("DELETE FROM llm_cache")
+        logging.info("响应缓存已清空")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计
+
+        Returns:
+            包含以下字段的字典：
+                - hits / misses: 本次运行的命中和未命中次数
+                - hit_rate: 本次运行的命中率
+                - evictions: 本次运行淘汰的条目数
+                - entries: 当前条目数
+                - bytes: 当前响应总大小
+                - total_hits: 所有条目累计被命中的次数
+        """
+        count, total, total_hits = self.db.execute_query(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hit_count), 0) FROM llm_cache"
+        )[0]
+        with self._lock:
+            hits, misses, evictions = self.hits, self.misses, self.evictions
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "evictions": evictions,
+            "entries": count,
+            "bytes": total,
+            "total_hits": total_hits
+        }
+
+    def close(self):
+        """关闭缓存文件的所有连接"""
+        self.db.close()
@@ -45,7 +45,7 @@ class ContextManager:
         
     def _get_novel_info(self, novel_id: int) -> Optional[tuple]:
         """获取小说基本信息"""
-        query = "SELECT * FROM novels WHERE id = ?"
+        query = "SELECT id, title, outline, current_chapter FROM novels WHERE id = ?"
         result = self.db.execute_query(query, (novel_id,))
         return result[0] if result else None
         
@@ -84,7 +84,7 @@ class ContextManager:
         """
         query = """
             UPDATE chapters 
-            SET summary = ?
+            SET summary = ?, summary_hash = content_hash
             WHERE novel_id = ? AND chapter_number = ?
         """
         self.db.execute_query(query, (summary, novel_id, chapter_number))
@@ -0,0 +1,59 @@
+"""
+文本增量编码与内容哈希
+
+章节版本只保存与上一版本的差异。差异按行计算，编码为 JSON 数组：
+    [起始行, 行数]  从基准文本复制连续的若干行
+    "文本"          插入新文本
+"""
+import json
+import hashlib
+from difflib import SequenceMatcher
+from typing import List
+
+def make_delta(base: str, target: str) -> str:
+    """计算从 base 到 target 的增量
+
+    Args:
+        base: 基准文本
+        target: 目标文本
+
+    Returns:
+        JSON 编码的增量
+    """
+    base_lines = (base or "").splitlines(keepends=True)
+    target_lines = (target or "").splitlines(keepends=True)
+
+    ops: List = []
+    matcher = SequenceMatcher(None, base_lines, target_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2 - i1])
+        elif tag in ("replace", "insert"):
+            ops.append("".join(target_lines[j1:j2]))
+        # delete：基准中的行不复制即可
+
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+def apply_delta(base: str, delta: str) -> str:
+    """将增量应用到基准文本上
+
+    Args:
+        base: 基准文本，必须与生成增量时的 base 相同
+        delta: make_delta 返回的增量
+
+    Returns:
+        还原出的目标文本
+    """
+    base_lines = (base or "").splitlines(keepends=True)
+    parts = []
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            start, count = op
+            parts.extend(base_lines[start:start + count])
+    return "".join(parts)
+
+def content_hash(text: str) -> str:
+    """计算文本内容的哈希，None 与空字符串视为相同内容"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
@@ -0,0 +1,131 @@
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from ..database.sqlite import DatabaseManager
+from ..models.chapter import Chapter
+import threading
+import logging
+
+DIFF_MODES = ("line", "char")
+
+def diff_texts(old: str, new: str, mode: str = "line") -> List[Dict[str, Any]]:
+    """比较两段文本
+
+    逐字比较长文本开销很大，char 模式先按行比较，只在改动过的行块内逐字细分。
+
+    Args:
+        old: 旧文本
+        new: 新文本
+        mode: line 按行比较，char 按字比较
+
+    Returns:
+        差异片段列表，每项包含：
+            - tag: equal / insert / delete / replace
+            - old: 旧文本中的片段
+            - new: 新文本中的片段
+    """
+    if mode not in DIFF_MODES:
+        raise ValueError(f"未知的比较方式: {mode}，可选: {', '.join(DIFF_MODES)}")
+
+    old_lines = (old or "").splitlines(keepends=True)
+    new_lines = (new or "").splitlines(keepends=True)
+
+    ops = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        old_part = "".join(old_lines[i1:i2])
+        new_part = "".join(new_lines[j1:j2])
+        if tag == "replace" and mode == "char":
+            ops.extend(_diff_chars(old_part, new_part))
+        else:
+            ops.append({"tag": tag, "old": old_part, "new": new_part})
+    return ops
+
+def _diff_chars(old: str, new: str) -> List[Dict[str, Any]]:
+    """逐字比较一个改动块"""
+    matcher = SequenceMatcher(None, old, new, autojunk=False)
+    return [
+        {"tag": tag, "old": old[i1:i2], "new": new[j1:j2]}
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+    ]
+
+class VersionDiffer:
+    """比较章节的任意两个版本
+
+    版本写入后内容不再变化（清理只会改变存储方式），因此比较结果可以按
+    版本对缓存，重复查看同一对版本时不必再次还原和比较。
+    """
+
+    def __init__(self, db_manager: DatabaseManager, max_entries: int = 64):
+        """初始化版本比较器
+
+        Args:
+            db_manager: 数据库管理器实例
+            max_entries: 最多缓存的比较结果数，超出时淘汰最久未使用的
+        """
+        self.chapter_model = Chapter(db_manager)
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def diff(self, old_version_id: int, new_version_id: int, mode: str = "line") -> Dict[str, Any]:
+        """比较两个版本
+
+        Args:
+            old_version_id: 旧版本ID
+            new_version_id: 新版本ID
+            mode: line 按行比较，char 按字比较
+
+        Returns:
+            比较结果字典，调用方不应修改，包含：
+                - old_id / new_id: 版本ID
+                - mode: 比较方式
+                - ops: diff_texts 返回的差异片段
+                - added: 新增的字符数
+                - removed: 删除的字符数
+        """
+        key = (old_version_id, new_version_id, mode)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+
+        try:
+            old = self.chapter_model.get_version_content(old_version_id)
+            new = self.chapter_model.get_version_content(new_version_id)
+            ops = diff_texts(old, new, mode)
+            result = {
+                "old_id": old_version_id,
+                "new_id": new_version_id,
+                "mode": mode,
+                "ops": ops,
+                "added": sum(len(op["new"]) for op in ops if op["tag"] != "equal"),
+                "removed": sum(len(op["old"]) for op in ops if op["tag"] != "equal")
+            }
+        except Exception as e:
+            logging.error(f"比较版本失败: {e}")
+            raise
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    def invalidate(self, version_ids: Optional[List[int]] = None):
+        """清除缓存，版本被删除后调用
+
+        Args:
+            version_ids: 只清除涉及这些版本的结果，为空时全部清除
+        """
+        with self._lock:
+            if version_ids is None:
+                self._cache.clear()
+                return
+            ids = set(version_ids)
+            for key in [k for k in self._cache if k[0] in ids or k[1] in ids]:
+                del self._cache[key]
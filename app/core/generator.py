@@ -1,19 +1,63 @@
 import os
-from typing import Optional, Dict, Any
-from google import genai
+import threading
+from typing import Optional, Dict, Any, Iterator, Tuple
 from dotenv import load_dotenv
+from .cache import ResponseCache
+from .prompt import PromptAssembler, estimate_tokens
+from .bible import NovelBibleCache, build_novel_bible
+from .backends import LLMBackend, create_backend
 import logging
 
+# 续写的写作要求，不使用设定集缓存时放在提示词开头，使用时放在设定集开头
+CONTENT_INSTRUCTIONS = """
+            你是一个专业的小说创作助手。请基于以下信息创作故事情节：
+
+            1. 写作要求：
+               - 保持情节连贯性和人物性格一致性
+               - 细腻的描写和自然的对话
+               - 符合小说整体风格和主题
+               
+            2. 标记要求：
+               - 新角色首次出场用【角色名：性格特征、外貌特征、身份背景】
+               - 已有角色出场用【角色名】
+               - 重要情节转折用《情节》标记
+               
+            3. 上下文信息：
+            """
+
 class NovelGenerator:
-    def __init__(self):
-        """初始化小说生成器"""
+    def __init__(self, cache: Optional[ResponseCache] = None, backend: Optional[LLMBackend] = None):
+        """初始化小说生成器
+        
+        Args:
+            cache: 响应缓存，默认使用 LLM_CACHE_PATH 环境变量指定的文件（llm_cache.db）
+            backend: 模型后端，默认按 LLM_BACKEND 环境变量创建
+        """
         load_dotenv()
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("未找到 GEMINI_API_KEY 环境变量")
+        self.backend = backend or create_backend()
+        self.model = self.backend.model
+        self.cache = cache or ResponseCache(os.getenv("LLM_CACHE_PATH", "llm_cache.db"))
+        
+        # 上下文提示词的 token 上限，可通过 PROMPT_TOKEN_BUDGET 环境变量调整
+        self.prompt_token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", "16000"))
+        self.last_prompt_report = []
         
-        self.client = genai.Client(api_key=api_key)
-        self.model = 'gemini-2.0-flash-exp'
+        # 前文检索，设置后按提示词和章节大纲取出最相关的前文片段
+        self.retriever = None
+        self.retrieval_top_k = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+        
+        # 角色名索引，设置后提示词只包含被提到的角色和主角
+        self.cast_index = None
+        
+        # 小说设定集缓存，CONTEXT_CACHE=0 时关闭
+        self.bible_cache = None
+        context_backend = self.backend.context_cache()
+        if context_backend is not None and os.getenv("CONTEXT_CACHE", "1") != "0":
+            self.bible_cache = NovelBibleCache(
+                context_backend,
+                ttl=int(os.getenv("CONTEXT_CACHE_TTL", "3600")),
+                min_tokens=int(os.getenv("CONTEXT_CACHE_MIN_TOKENS", "4096"))
+            )
         
     def generate_content(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
         """生成内容
@@ -31,35 +75,10 @@ class NovelGenerator:
         """
         try:
             logging.info("开始生成内容...")
-            logging.info(f"原始提示词: {prompt}")
+            full_prompt, cached_content = self._prepare_content_request(prompt, context)
             
-            # 构建完整提示词
-            base_prompt = """
-            你是一个专业的小说创作助手。请基于以下信息创作故事情节：
-
-            1. 写作要求：
-               - 保持情节连贯性和人物性格一致性
-               - 细腻的描写和自然的对话
-               - 符合小说整体风格和主题
-               
-            2. 标记要求：
-               - 新角色首次出场用【角色名：性格特征、外貌特征、身份背景】
-               - 已有角色出场用【角色名】
-               - 重要情节转折用《情节》标记
-               
-            3. 上下文信息：
-            """
-            
-            full_prompt = self._build_prompt(base_prompt + "\n" + prompt, context)
-            logging.info(f"完整提示词: {full_prompt}")
-            
-            # 调用 API 生成内容
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=full_prompt
-            )
-            
-            generated_content = response.text
+            # 调用模型生成内容
+            generated_content = self.backend.generate(full_prompt, cached_content)
             logging.info(f"内容生成成功，长度: {len(generated_content)}")
             
             return generated_content
@@ -68,71 +87,233 @@ class NovelGenerator:
             logging.error(f"内容生成失败: {str(e)}")
             raise
             
-    def _build_prompt(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
+    def generate_content_stream(self, prompt: str, context: Optional[Dict[str, Any]] = None,
+                                cancel_event: Optional[threading.Event] = None) -> Iterator[str]:
+        """流式生成内容，收到一段文本就返回一段
+        
+        提示词与 generate_content 相同。调用方停止迭代或设置 cancel_event 后
+        不再读取后续内容，已返回的文本拼接起来就是最终结果。
+        
+        Args:
+            prompt: 用户提示词
+            context: 上下文信息，与 generate_content 相同
+            cancel_event: 取消标志，在两段文本之间检查
+            
+        Yields:
+            生成的文本片段
+        """
+        try:
+            logging.info("开始流式生成内容...")
+            full_prompt, cached_content = self._prepare_content_request(prompt, context)
+            
+            stream = self.backend.stream(full_prompt, cached_content)
+            total = 0
+            try:
+                for text in stream:
+                    if cancel_event is not None and cancel_event.is_set():
+                        logging.info(f"流式生成已取消，已生成长度: {total}")
+                        return
+                    if text:
+                        total += len(text)
+                        yield text
+            finally:
+                # 提前结束时释放后端的连接
+                stream.close()
+                    
+            logging.info(f"流式生成完成，长度: {total}")
+            
+        except Exception as e:
+            logging.error(f"流式生成失败: {str(e)}")
+            raise
+            
+    def _prepare_content_request(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> Tuple[str, Any]:
+        """在用户提示词前加上写作要求和上下文，generate_content 与 generate_content_stream 共用
+        
+        写作要求、小说大纲、角色表和角色关系组成的设定集能登记为缓存上下文时，
+        提示词中不再包含这些内容，改为引用缓存句柄；否则全部放在提示词中。
+        
+        Returns:
+            (提示词, 缓存上下文句柄)，不使用缓存时句柄为 None
+        """
+        logging.info(f"原始提示词: {prompt}")
+        
+        novel_id = ((context or {}).get("current_chapter") or {}).get("novel_id")
+        if self.bible_cache is not None and novel_id is not None:
+            bible = self._build_bible(novel_id, context)
+            handle = self.bible_cache.get_handle(novel_id, bible)
+            if handle is not None:
+                # 设定集也占用上下文窗口，剩余预算至少保留四分之一
+                budget = max(self.prompt_token_budget - estimate_tokens(bible), self.prompt_token_budget // 4)
+                full_prompt = self._build_prompt(prompt, context, bible_cached=True, budget=budget)
+                logging.info(f"使用设定集缓存 {handle}，提示词: {full_prompt}")
+                return full_prompt, handle
+        
+        full_prompt = self._build_prompt(CONTENT_INSTRUCTIONS + "\n" + prompt, context)
+        logging.info(f"完整提示词: {full_prompt}")
+        return full_prompt, None
+        
+    def _build_bible(self, novel_id: int, context: Dict[str, Any]) -> str:
+        """按上下文拼接小说设定集，包含全部角色及其关系"""
+        characters = context.get("characters") or []
+        relationships = []
+        if self.cast_index is not None and characters:
+            try:
+                relationships = self.cast_index.relationships(novel_id, [char['id'] for char in characters])
+            except Exception as e:
+                logging.error(f"获取角色关系失败: {e}")
+        return build_novel_bible(CONTENT_INSTRUCTIONS, context.get("novel_outline"), characters, relationships)
+            
+    def _build_prompt(self, prompt: str, context: Optional[Dict[str, Any]] = None,
+                      bible_cached: bool = False, budget: Optional[int] = None) -> str:
         """构建完整的提示词
         
+        整个提示词不超过 budget（默认 prompt_token_budget）个 token。提示词本身和当前章节信息
+        总是完整保留，其余按大纲、前文摘要、角色的顺序分配剩余预算：
+        摘要越新越优先，放不下的旧摘要压缩为第一句；角色优先保留在提示词、
+        章节大纲和最近摘要中出现过的；设置了 cast_index 时只放入在提示词、当前章节
+        和最近摘要中被提到的角色、主角及其直接关系。设置了 retriever 时最后放入检索到的相关前文，
+        相关度越高越优先。各段的 token 数记录在 last_prompt_report 中。
+        
         Args:
             prompt: 基础提示词
             context: 上下文信息
+            bible_cached: 大纲、角色和关系已在设定集缓存中，不再放入提示词
+            budget: token 上限
             
         Returns:
             完整的提示词
         """
         if not context:
             logging.warning("没有提供上下文信息")
+            self.last_prompt_report = []
             return prompt
             
-        # 构建上下文提示词
-        context_prompt = []
+        assembler = PromptAssembler(budget or self.prompt_token_budget)
         
         # 添加小说大纲
-        if "novel_outline" in context:
-            context_prompt.append(f"小说大纲：\n{context['novel_outline']}")
-            logging.info("已添加小说大纲到上下文")
+        if "novel_outline" in context and not bible_cached:
+            assembler.add("novel_outline", [context['novel_outline']], priority=1, header="小说大纲：")
             
         # 添加当前章节信息
+        focus_text = prompt
         if "current_chapter" in context:
             chapter = context["current_chapter"]
-            context_prompt.append(
+            chapter_outline = chapter.get('outline') or '暂无大纲'
+            assembler.add("current_chapter", [
                 f"当前位置：第{chapter['chapter_number']}章 {chapter['title']}\n"
-                f"章节大纲：\n{chapter.get('outline', '暂无大纲')}"
-            )
-            logging.info(f"已添加当前章节信息：第{chapter['chapter_number']}章")
+                f"章节大纲：\n{chapter_outline}"
+            ], priority=0, required=True)
+            focus_text += chapter_outline
             
-        # 添加之前章节的摘要
-        if "previous_summaries" in context:
-            summaries = context["previous_summaries"]
-            if summaries:
-                # 按章节号排序
-                sorted_summaries = sorted(summaries, key=lambda x: x['chapter_number'])
-                context_prompt.append("之前章节摘要：")
-                for chapter_summary in sorted_summaries:
-                    context_prompt.append(
-                        f"第{chapter_summary['chapter_number']}章：{chapter_summary['summary']}"
-                    )
-                logging.info(f"已添加{len(summaries)}个之前章节的摘要")
+        # 添加之前章节的摘要，按章节号排序，越新越优先
+        if context.get("previous_summaries"):
+            sorted_summaries = sorted(context["previous_summaries"], key=lambda x: x['chapter_number'])
+            assembler.add("previous_summaries", [
+                f"{s.get('label') or '第' + str(s['chapter_number']) + '章'}：{s['summary']}"
+                for s in sorted_summaries if s.get('summary')
+            ], priority=2, header="之前章节摘要：", compress=True)
+            focus_text += "".join(s.get('summary') or "" for s in sorted_summaries[-5:])
             
-        # 添加角色信息
-        if "characters" in context:
+        # 添加角色信息，在当前情节中出现过的角色优先
+        if context.get("characters") and not bible_cached:
             characters = context["characters"]
-            if characters:
-                context_prompt.append("已有角色：")
-                for char in characters:
-                    desc = f"- {char['name']}: {char['description']}"
-                    if "characteristics" in char:
-                        desc += f" ({char['characteristics']})"
-                    context_prompt.append(desc)
-                logging.info(f"已添加{len(characters)}个角色信息")
+            relationships = []
+            if self.cast_index is not None and "current_chapter" in context:
+                characters, relationships = self._select_characters(
+                    characters, context["current_chapter"], focus_text
+                )
+            lines = []
+            for char in characters:
+                desc = f"- {char['name']}: {char['description']}"
+                if "characteristics" in char:
+                    desc += f" ({char['characteristics']})"
+                lines.append(desc)
+            rank = sorted(range(len(characters)),
+                          key=lambda i: (characters[i]['name'] not in focus_text, i))
+            assembler.add("characters", lines, priority=3, header="已有角色：", rank=rank)
+            assembler.add("relationships", [
+                f"- {r['character1_name']} 与 {r['character2_name']}：{r['relationship_type']}"
+                + (f"（{r['description']}）" if r.get('description') else "")
+                for r in relationships
+            ], priority=3, header="角色关系：")
+            
+        # 添加检索到的相关前文
+        if self.retriever is not None and "current_chapter" in context:
+            passages = self._retrieve_passages(prompt, context)
+            if passages:
+                ordered = sorted(range(len(passages)), key=lambda i: passages[i]['chapter_number'])
+                assembler.add("relevant_passages", [
+                    f"（第{passages[i]['chapter_number']}章{'摘要' if passages[i]['kind'] == 'summary' else ''}）"
+                    f"{passages[i]['text']}"
+                    for i in ordered
+                ], priority=4, header="相关前文：", rank=sorted(range(len(ordered)), key=lambda j: ordered[j]))
+            
+        assembler.add("prompt", [prompt], priority=0, required=True)
         
-        # 组合所有提示词
-        full_prompt = "\n\n".join(context_prompt + [prompt])
+        full_prompt, report = assembler.build()
+        self.last_prompt_report = report
+        logging.info(
+            f"提示词共约 {sum(r['tokens'] for r in report)} tokens（预算 {assembler.budget}）: " +
+            ", ".join(f"{r['section']}={r['tokens']}({r['included']}/{r['items']})" for r in report)
+        )
         return full_prompt
         
-    def generate_summary(self, content: str) -> str:
+    def _select_characters(self, characters: list, chapter: Dict[str, Any], focus_text: str):
+        """只保留被提到的角色和主角，并取出他们的直接关系
+        
+        在提示词、章节大纲、最近摘要和当前章节正文中查找角色名。
+        查找失败时保留全部角色，不影响生成。
+        
+        Returns:
+            (角色列表, 关系列表)
+        """
+        novel_id = chapter.get('novel_id')
+        if novel_id is None:
+            return characters, []
+        try:
+            mentioned = self.cast_index.mentioned(novel_id, focus_text, chapter.get('content') or '')
+            selected = [
+                char for char in characters
+                if char.get('id') in mentioned or char.get('role_type') == '主角'
+            ]
+            relationships = self.cast_index.relationships(novel_id, [char['id'] for char in selected])
+        except Exception as e:
+            logging.error(f"筛选角色失败: {e}")
+            return characters, []
+        logging.info(f"提示词包含{len(selected)}/{len(characters)}个角色，{len(relationships)}条关系")
+        return selected, relationships
+        
+    def _retrieve_passages(self, prompt: str, context: Dict[str, Any]) -> list:
+        """按提示词和章节大纲检索当前章节之前的相关片段
+        
+        已经作为章节摘要放入提示词的摘要不再重复。检索失败时返回空列表，不影响生成。
+        """
+        chapter = context["current_chapter"]
+        if chapter.get('novel_id') is None:
+            return []
+        listed = {
+            s['chapter_number'] for s in context.get("previous_summaries") or []
+            if s.get('level', 'chapter') == 'chapter'
+        }
+        query = "\n".join([prompt, chapter.get('title') or '', chapter.get('outline') or ''])
+        try:
+            passages = self.retriever.search(
+                chapter['novel_id'], query,
+                before_chapter=chapter['chapter_number'],
+                top_k=self.retrieval_top_k + len(listed)
+            )
+        except Exception as e:
+            logging.error(f"检索相关前文失败: {e}")
+            return []
+        passages = [p for p in passages if not (p['kind'] == 'summary' and p['chapter_number'] in listed)]
+        return passages[:self.retrieval_top_k]
+        
+    def generate_summary(self, content: str, use_cache: bool = True) -> str:
         """生成内容摘要
         
         Args:
             content: 需要总结的内容
+            use_cache: 是否使用响应缓存，为 False 时总是重新生成
             
         Returns:
             生成的摘要
@@ -144,22 +325,20 @@ class NovelGenerator:
 摘要："""
         
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt
-            )
-            return response.text
+            return self._generate_cached(prompt, use_cache)
         except Exception as e:
             logging.error(f"摘要生成失败: {e}")
             raise
 
-    def generate_outline(self, novel_title: str = None, chapter_content: str = None, is_chapter: bool = False) -> str:
+    def generate_outline(self, novel_title: str = None, chapter_content: str = None, is_chapter: bool = False,
+                         use_cache: bool = True) -> str:
         """生成大纲
         
         Args:
             novel_title: 小说标题（生成小说大纲时使用）
             chapter_content: 章节内容（生成章节大纲时使用）
             is_chapter: 是否为章节大纲
+            use_cache: 是否使用响应缓存，为 False 时总是重新生成
             
         Returns:
             生成的大纲内容
@@ -191,18 +370,19 @@ class NovelGenerator:
                 4. 故事的主题和中心思想
                 """
                 
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt
-            )
-            return response.text
+            return self._generate_cached(prompt, use_cache)
             
         except Exception as e:
             logging.error(f"生成大纲失败: {str(e)}")
             raise
 
-    def extract_characters(self, content: str) -> list:
-        """从内容中提取角色信息"""
+    def extract_characters(self, content: str, use_cache: bool = True) -> list:
+        """从内容中提取角色信息
+        
+        Args:
+            content: 故事内容
+            use_cache: 是否使用响应缓存，为 False 时总是重新提取
+        """
         try:
             prompt = f"""
             请分析以下故事中用【】标记的角色信息，并将其转换为严格的JSON格式。
@@ -242,13 +422,10 @@ class NovelGenerator:
             仅返回JSON数组：
             """
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt
-            )
+            response_text = self._generate_cached(prompt, use_cache)
             
             # 清理响应文本，只保留JSON部分
-            response_text = response.text.strip()
+            response_text = response_text.strip()
             if response_text.startswith('```json'):
                 response_text = response_text[7:]
             if response_text.endswith('```'):
@@ -281,11 +458,34 @@ class NovelGenerator:
                 
             except json.JSONDecodeError as e:
                 logging.error(f"JSON解析失败: {str(e)}\n响应内容: {response_text}")
+                # 格式错误的响应不保留在缓存中，下次重新提取
+                self.cache.delete(self.model, prompt)
                 return []
                 
         except Exception as e:
+            # 模型调用失败时抛出，调用方不会把失败当作没有新角色
             logging.error(f"提取角色信息失败: {str(e)}")
-            return []
+            raise
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """模型调用的限流、熔断和重试统计，后端不提供时返回空字典"""
+        metrics = getattr(self.backend, "metrics", None)
+        return metrics() if metrics is not None else {}
+        
+    def _generate_cached(self, prompt: str, use_cache: bool = True) -> str:
+        """调用模型生成文本，相同提示词优先返回缓存的响应
+        
+        use_cache 为 False 时不读缓存，但仍会用新结果覆盖缓存。
+        """
+        if use_cache:
+            cached = self.cache.get(self.model, prompt)
+            if cached is not None:
+                logging.info(f"命中响应缓存，长度: {len(cached)}")
+                return cached
+                
+        text = self.backend.generate(prompt)
+        self.cache.put(self.model, prompt, text)
+        return text
 
 if __name__ == "__main__":
     # 设置日志
@@ -0,0 +1,561 @@
+"""
+持久化的后台任务队列
+
+调用模型的工作（摘要、大纲、角色提取等）以任务的形式写入 jobs 表，
+由 JobWorker 的工作线程按优先级取出执行：
+- 优先级：priority 大的先执行，相同时先提交的先执行
+- 去重：同一 dedup_key 最多只有一个排队中的任务，再次提交时更新参数；
+  正在执行的任务不会与同一 dedup_key 的排队任务并行
+- 重试：模型暂时不可用等临时错误按指数退避重新排队，超过 max_attempts 次后失败
+- 重启恢复：程序退出或崩溃时正在执行的任务在下次启动时重新排队
+
+任务函数的调用方式为 fn(ctx, payload)，payload 和返回值都要能序列化为 JSON。
+"""
+import json
+import time
+import threading
+import logging
+from typing import Callable, Dict, Any, List, Optional, Iterable
+from ..database.sqlite import DatabaseManager
+from .resilience import CircuitOpenError, is_retryable
+
+# 任务优先级
+PRIORITY_HIGH = 20  # 用户正在等待结果，如生成大纲
+PRIORITY_NORMAL = 10  # 保存后的处理，如角色提取、章节摘要
+PRIORITY_LOW = 0  # 可以延后的批量工作，如补全摘要
+
+class JobInterrupted(Exception):
+    """任务被中断且工作尚未完成，重新排队且不计入尝试次数"""
+
+class JobQueue:
+    """jobs 表的读写，线程安全"""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, db_manager: DatabaseManager):
+        """初始化任务队列
+
+        Args:
+            db_manager: 数据库管理器实例
+        """
+        self.db = db_manager
+        self._listeners: List[Callable[[int], None]] = []
+
+    def add_listener(self, fn: Callable[[int], None]):
+        """注册提交任务后的回调，参数为任务ID，JobWorker 用它唤醒工作线程"""
+        self._listeners.append(fn)
+
+    def enqueue(self, kind: str, payload: Optional[Dict[str, Any]] = None, priority: int = PRIORITY_NORMAL,
+                dedup_key: Optional[str] = None, max_attempts: int = 3, delay: float = 0) -> int:
+        """提交任务
+
+        Args:
+            kind: 任务类型，对应 JobWorker.register 注册的函数
+            payload: 任务参数
+            priority: 优先级，越大越先执行
+            dedup_key: 去重键，已有同一键的排队任务时更新它的参数并取两者中较高的优先级
+            max_attempts: 最多尝试次数
+            delay: 延迟执行的秒数
+
+        Returns:
+            任务ID
+        """
+        try:
+            data = json.dumps(payload or {}, ensure_ascii=False)
+            run_after = time.time() + delay
+            with self.db.transaction(immediate=True):
+                existing = None
+                if dedup_key is not None:
+                    existing = self.db.execute_query(
+                        "SELECT id FROM jobs WHERE dedup_key = ? AND status = ?",
+                        (dedup_key, self.PENDING)
+                    )
+                if existing:
+                    job_id = existing[0][0]
+                    self.db.execute_query("""
+                        UPDATE jobs SET payload = ?, priority = MAX(priority, ?), max_attempts = ?,
+                               run_after = ?, updated_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, (data, priority, max_attempts, run_after, job_id))
+                else:
+                    job_id = self.db.execute_query("""
+                        INSERT INTO jobs (kind, payload, dedup_key, priority, max_attempts, run_after)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, (kind, data, dedup_key, priority, max_attempts, run_after))
+            for fn in self._listeners:
+                fn(job_id)
+            return job_id
+
+        except Exception as e:
+            logging.error(f"提交任务失败: {kind}, {e}")
+            raise
+
+    def claim(self, kinds: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """取出下一个可以执行的任务并标记为执行中
+
+        Args:
+            kinds: 只取这些类型的任务，为空时不限
+
+        Returns:
+            任务信息，没有可执行的任务时返回 None
+        """
+        conditions = ["status = ?", "run_after <= ?"]
+        params: List[Any] = [self.PENDING, time.time()]
+        # 同一去重键的任务不并行执行
+        conditions.append("""(dedup_key IS NULL OR dedup_key NOT IN (
+            SELECT dedup_key FROM jobs WHERE status = ? AND dedup_key IS NOT NULL))""")
+        params.append(self.RUNNING)
+        if kinds is not None:
+            kinds = list(kinds)
+            conditions.append(f"kind IN ({', '.join('?' for _ in kinds)})")
+            params.extend(kinds)
+
+        with self.db.transaction(immediate=True):
+            rows = self.db.execute_query(f"""
+                SELECT id FROM jobs WHERE {' AND '.join(conditions)}
+                ORDER BY priority DESC, id LIMIT 1
+            """, tuple(params))
+            if not rows:
+                return None
+            job_id = rows[0][0]
+            self.db.execute_query("""
+                UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (self.RUNNING, job_id))
+            return self.get(job_id)
+
+    def next_run_at(self) -> Optional[float]:
+        """最早的排队任务可以执行的时间，没有排队任务时返回 None"""
+        rows = self.db.execute_query(
+            "SELECT MIN(run_after) FROM jobs WHERE status = ?", (self.PENDING,)
+        )
+        return rows[0][0] if rows else None
+
+    def complete(self, job_id: int, result: Any = None):
+        """标记任务完成并保存结果"""
+        self._finish(job_id, self.DONE, result=result)
+
+    def fail(self, job_id: int, error: str):
+        """标记任务失败"""
+        self._finish(job_id, self.FAILED, error=error)
+
+    def mark_cancelled(self, job_id: int):
+        """标记执行中被取消的任务"""
+        self._finish(job_id, self.CANCELLED)
+
+    def retry(self, job_id: int, error: str, delay: float):
+        """任务失败后重新排队，delay 秒后再执行"""
+        with self.db.transaction(immediate=True):
+            if self._superseded(job_id):
+                return
+            self.db.execute_query("""
+                UPDATE jobs SET status = ?, error = ?, run_after = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (self.PENDING, error, time.time() + delay, job_id))
+
+    def requeue(self, job_id: int):
+        """把被中断的任务放回队列，不计入尝试次数"""
+        with self.db.transaction(immediate=True):
+            if self._superseded(job_id):
+                return
+            self.db.execute_query("""
+                UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (self.PENDING, job_id))
+
+    def cancel(self, job_id: int) -> bool:
+        """取消排队中的任务
+
+        Returns:
+            是否已取消，任务已在执行或已结束时返回 False
+        """
+        with self.db.transaction(immediate=True):
+            job = self.get(job_id)
+            if job is None or job["status"] != self.PENDING:
+                return False
+            self._finish(job_id, self.CANCELLED)
+            return True
+
+    def reset(self, job_id: int) -> bool:
+        """重新执行失败或已取消的任务，尝试次数清零
+
+        Returns:
+            是否已重新排队
+        """
+        with self.db.transaction(immediate=True):
+            job = self.get(job_id)
+            if job is None or job["status"] not in (self.FAILED, self.CANCELLED):
+                return False
+            if job["dedup_key"] is not None and self.db.execute_query(
+                    "SELECT 1 FROM jobs WHERE dedup_key = ? AND status = ?",
+                    (job["dedup_key"], self.PENDING)):
+                # 已有同样的任务在排队
+                return False
+            self.db.execute_query("""
+                UPDATE jobs SET status = ?, attempts = 0, error = NULL, run_after = 0,
+                       finished_at = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (self.PENDING, job_id))
+        for fn in self._listeners:
+            fn(job_id)
+        return True
+
+    def recover(self) -> int:
+        """把上次退出时仍在执行的任务重新排队，在启动工作线程前调用
+
+        Returns:
+            重新排队的任务数
+        """
+        with self.db.transaction(immediate=True):
+            rows = self.db.execute_query("SELECT id FROM jobs WHERE status = ?", (self.RUNNING,))
+            # 崩溃前执行的那次尝试照常计数，反复导致崩溃的任务最终会失败
+            for (job_id,) in rows:
+                if self._superseded(job_id):
+                    continue
+                self.db.execute_query(
+                    "UPDATE jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (self.PENDING, job_id)
+                )
+        if rows:
+            logging.info(f"重新排队上次未完成的任务: {len(rows)}个")
+        return len(rows)
+
+    def purge(self, older_than_days: float = 7) -> int:
+        """删除较早结束的任务记录
+
+        Returns:
+            删除的任务数
+        """
+        cutoff = f"-{older_than_days} days"
+        rows = self.db.execute_query("""
+            SELECT COUNT(*) FROM jobs
+            WHERE status IN (?, ?, ?) AND finished_at < datetime('now', ?)
+        """, (self.DONE, self.FAILED, self.CANCELLED, cutoff))
+        if rows[0][0]:
+            self.db.execute_query("""
+                DELETE FROM jobs
+                WHERE status IN (?, ?, ?) AND finished_at < datetime('now', ?)
+            """, (self.DONE, self.FAILED, self.CANCELLED, cutoff))
+        return rows[0][0]
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """获取任务信息"""
+        rows = self.db.execute_query(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,))
+        return self._to_dict(rows[0]) if rows else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """按提交时间倒序列出任务
+
+        Args:
+            status: 只列出此状态的任务，为空时不限
+            limit: 最多返回的条数
+        """
+        if status is None:
+            rows = self.db.execute_query(
+                f"SELECT {self._COLUMNS} FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+            )
+        else:
+            rows = self.db.execute_query(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE status = ? ORDER BY id DESC LIMIT ?",
+                (status, limit)
+            )
+        return [self._to_dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        rows = self.db.execute_query("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        counts = {status: 0 for status in (self.PENDING, self.RUNNING, self.DONE, self.FAILED, self.CANCELLED)}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
+
+    _COLUMNS = ("id, kind, payload, dedup_key, priority, status, attempts, max_attempts, "
+                "run_after, result, error, created_at, finished_at")
+
+    def _to_dict(self, row) -> Dict[str, Any]:
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "payload": json.loads(row[2]) if row[2] else {},
+            "dedup_key": row[3],
+            "priority": row[4],
+            "status": row[5],
+            "attempts": row[6],
+            "max_attempts": row[7],
+            "run_after": row[8],
+            "result": json.loads(row[9]) if row[9] is not None else None,
+            "error": row[10],
+            "created_at": row[11],
+            "finished_at": row[12]
+        }
+
+    def _superseded(self, job_id: int) -> bool:
+        """已有同一去重键的新任务排队时取消此任务，由新任务处理最新的参数
+
+        Returns:
+            是否已取消
+        """
+        rows = self.db.execute_query("""
+            SELECT 1 FROM jobs AS newer JOIN jobs AS job ON newer.dedup_key = job.dedup_key
+            WHERE job.id = ? AND newer.status = ? AND newer.id != job.id
+        """, (job_id, self.PENDING))
+        if rows:
+            self._finish(job_id, self.CANCELLED)
+        return bool(rows)
+
+    def _finish(self, job_id: int, status: str, result: Any = None, error: Optional[str] = None):
+        self.db.execute_query("""
+            UPDATE jobs SET status = ?, result = ?, error = ?,
+                   updated_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, job_id))
+
+class JobContext:
+    """传给任务函数的执行上下文
+
+    与界面的 workers.Job 一样提供 cancel_event、is_cancelled 和 report_progress，
+    任务函数应在适当的位置检查取消。
+    """
+
+    def __init__(self, worker: "JobWorker", job: Dict[str, Any]):
+        self.worker = worker
+        self.job = job
+        self.cancel_event = threading.Event()
+        self.cancelled = False  # 由用户取消，区别于程序退出时的中断
+
+    def is_cancelled(self) -> bool:
+        """是否已请求取消或程序正在退出"""
+        return self.cancel_event.is_set()
+
+    def report_progress(self, value):
+        """报告进度，在工作线程中调用进度回调"""
+        if not self.is_cancelled():
+            self.worker._notify_progress(self.job, value)
+
+class JobWorker:
+    """从 JobQueue 取出任务并在固定数量的工作线程中执行"""
+
+    def __init__(self, queue: JobQueue, workers: int = 2, poll_interval: float = 5.0,
+                 retry_delay: float = 30.0, max_retry_delay: float = 600.0):
+        """初始化任务执行器
+
+        Args:
+            queue: 任务队列
+            workers: 工作线程数，即同时执行的任务数上限
+            poll_interval: 没有任务时检查队列的最长间隔（秒）
+            retry_delay: 第一次重试前等待的秒数，之后每次翻倍
+            max_retry_delay: 重试等待的上限
+        """
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._handlers: Dict[str, Callable[[JobContext, Dict[str, Any]], Any]] = {}
+        self._finished_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._progress_listeners: List[Callable[[Dict[str, Any], Any], None]] = []
+        self._running: Dict[int, JobContext] = {}
+        self._threads: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        self._condition = threading.Condition()
+        self._generation = 0  # 每次提交任务加一，避免等待前错过通知
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        queue.add_listener(lambda job_id: self.wake())
+
+    def register(self, kind: str, fn: Callable[[JobContext, Dict[str, Any]], Any]):
+        """注册任务类型的执行函数，调用方式为 fn(ctx, payload)"""
+        self._handlers[kind] = fn
+
+    def add_listener(self, fn: Callable[[Dict[str, Any]], None]):
+        """注册任务结束的回调，参数为结束后的任务信息，在工作线程中调用"""
+        self._finished_listeners.append(fn)
+
+    def add_progress_listener(self, fn: Callable[[Dict[str, Any], Any], None]):
+        """注册进度回调，参数为任务信息和进度，在工作线程中调用"""
+        self._progress_listeners.append(fn)
+
+    def start(self):
+        """恢复上次未完成的任务并启动工作线程"""
+        if self._threads:
+            return
+        self.queue.recover()
+        try:
+            self.queue.purge()
+        except Exception as e:
+            logging.warning(f"清理任务记录失败: {e}")
+        self._stop_event.clear()
+        for i in range(max(1, self.workers)):
+            thread = threading.Thread(target=self._run, name=f"JobWorker-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"后台任务线程已启动: {len(self._threads)}个")
+
+    def stop(self, timeout: Optional[float] = 5):
+        """停止工作线程，正在执行的任务收到取消请求，未完成的任务下次启动时继续"""
+        self._stop_event.set()
+        with self._condition:
+            for ctx in self._running.values():
+                ctx.cancel_event.set()
+            self._condition.notify_all()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def wake(self):
+        """通知工作线程有新任务"""
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def cancel(self, job_id: int) -> bool:
+        """取消任务，正在执行的任务收到取消请求后结束
+
+        Returns:
+            是否已取消或已请求取消
+        """
+        if self.queue.cancel(job_id):
+            return True
+        with self._condition:
+            ctx = self._running.get(job_id)
+            if ctx is None:
+                return False
+            ctx.cancelled = True
+            ctx.cancel_event.set()
+            return True
+
+    def is_running(self, job_id: int) -> bool:
+        """任务是否正在执行"""
+        with self._condition:
+            return job_id in self._running
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """等待没有可立即执行的任务且没有任务在执行
+
+        Returns:
+            是否已空闲，超时返回 False
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._condition:
+                running = len(self._running)
+            next_run = self.queue.next_run_at()
+            if not running and (next_run is None or next_run > time.time()):
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def metrics(self) -> Dict[str, Any]:
+        """队列中各状态的任务数和本次启动后的执行统计"""
+        with self._condition:
+            stats = {"running": len(self._running), "processed": self.processed,
+                     "failed": self.failed, "retried": self.retried}
+        return {"queue": self.queue.counts(), **stats}
+
+    def _run(self):
+        """工作线程主循环"""
+        try:
+            while not self._stop_event.is_set():
+                with self._condition:
+                    generation = self._generation
+                try:
+                    job = self.queue.claim(self._handlers.keys())
+                except Exception as e:
+                    logging.error(f"读取任务队列失败: {e}")
+                    job = None
+                if job is None:
+                    self._wait(generation)
+                    continue
+                self._execute(job)
+        finally:
+            self.queue.db.release_connection()
+
+    def _wait(self, generation: int):
+        """等待新任务、最早的重试时间或轮询间隔"""
+        timeout = self.poll_interval
+        try:
+            next_run = self.queue.next_run_at()
+            if next_run is not None:
+                timeout = min(timeout, max(0.01, next_run - time.time()))
+        except Exception:
+            pass
+        with self._condition:
+            if self._generation == generation and not self._stop_event.is_set():
+                self._condition.wait(timeout)
+
+    def _execute(self, job: Dict[str, Any]):
+        """执行一个任务并记录结果"""
+        ctx = JobContext(self, job)
+        with self._condition:
+            self._running[job["id"]] = ctx
+            if self._stop_event.is_set():
+                ctx.cancel_event.set()
+        label = f"{job['kind']}#{job['id']}"
+        start = time.monotonic()
+        try:
+            handler = self._handlers[job["kind"]]
+            try:
+                result = handler(ctx, job["payload"])
+            except Exception as e:
+                self._handle_error(ctx, e)
+            else:
+                if ctx.cancelled:
+                    self.queue.mark_cancelled(job["id"])
+                else:
+                    self.queue.complete(job["id"], result)
+                    self._count("processed")
+                    logging.info(f"任务完成: {label}，耗时{time.monotonic() - start:.1f}秒")
+        except Exception as e:
+            # 记录结果失败时任务保持执行中，下次启动时重新排队
+            logging.error(f"记录任务结果失败: {label}, {e}")
+        finally:
+            with self._condition:
+                self._running.pop(job["id"], None)
+                # 同一去重键的排队任务可以执行了
+                self._generation += 1
+                self._condition.notify_all()
+
+        finished = self.queue.get(job["id"])
+        # 重新排队（重试、中断）的任务还没有结束，不通知
+        if finished is not None and finished["status"] in (JobQueue.DONE, JobQueue.FAILED, JobQueue.CANCELLED):
+            for fn in self._finished_listeners:
+                try:
+                    fn(finished)
+                except Exception as e:
+                    logging.error(f"任务结束回调失败: {label}, {e}")
+
+    def _handle_error(self, ctx: JobContext, error: Exception):
+        """按错误类型取消、重新排队、重试或标记失败"""
+        job = ctx.job
+        label = f"{job['kind']}#{job['id']}"
+        if ctx.cancelled:
+            self.queue.mark_cancelled(job["id"])
+        elif isinstance(error, JobInterrupted) or (ctx.is_cancelled() and self._stop_event.is_set()):
+            logging.info(f"任务已中断，下次继续: {label}")
+            self.queue.requeue(job["id"])
+        elif (is_retryable(error) or isinstance(error, CircuitOpenError)) and job["attempts"] < job["max_attempts"]:
+            delay = min(self.max_retry_delay, self.retry_delay * 2 ** (job["attempts"] - 1))
+            logging.warning(f"任务失败，{delay:.0f}秒后重试: {label}, {error}")
+            self.queue.retry(job["id"], str(error), delay)
+            self._count("retried")
+        else:
+            logging.error(f"任务失败: {label}, {error}")
+            self.queue.fail(job["id"], str(error))
+            self._count("failed")
+
+    def _count(self, name: str):
+        with self._condition:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _notify_progress(self, job: Dict[str, Any], value):
+        for fn in self._progress_listeners:
+            try:
+                fn(job, value)
+            except Exception as e:
+                logging.error(f"任务进度回调失败: {job['kind']}#{job['id']}, {e}")
@@ -0,0 +1,135 @@
+"""
+角色标记解析
+
+生成内容时要求模型用【角色名：性格特征、外貌特征、身份背景】标记新角色、
+用【角色名】标记已有角色。这里在本地解析这些标记，只有无法解析的标记才需要交给模型。
+"""
+import re
+from typing import List, Dict, Iterable, Optional, NamedTuple
+
+# 角色名最长字数，超过时多半是把一句话误写进了标记
+MAX_NAME_LENGTH = 12
+
+# 角色名中不应出现的字符：空白和常见标点
+_INVALID_NAME = re.compile(r"[\s，。！？；、,.!?;:：\"“”‘’（）()《》【】]")
+
+# 特征之间的分隔符
+_DETAIL_SEPARATOR = re.compile(r"[、，,；;]")
+
+_ROLE_KEYWORDS = (("主角", "主角"), ("反派", "反派"))
+
+class CharacterMarker(NamedTuple):
+    """文本中的一个【】标记"""
+    name: str
+    details: Optional[str]  # 冒号后的描述，【角色名】形式为 None
+    start: int  # 标记在文本中的位置
+    raw: str  # 标记原文，不含括号
+
+def find_markers(text: str) -> List[CharacterMarker]:
+    """找出文本中所有的【】标记
+
+    逐字扫描，遇到新的【时丢弃之前未闭合的标记，没有闭合的【会被忽略。
+
+    Args:
+        text: 章节内容
+
+    Returns:
+        标记列表，按出现位置排列
+    """
+    markers = []
+    start = None
+    for i, ch in enumerate(text or ""):
+        if ch == "【":
+            start = i
+        elif ch == "】" and start is not None:
+            raw = text[start + 1:i]
+            name, details = _split_marker(raw)
+            markers.append(CharacterMarker(name, details, start, raw))
+            start = None
+    return markers
+
+def _split_marker(raw: str):
+    """在第一个冒号处把标记内容拆成角色名和描述，没有冒号时描述为 None"""
+    for index, ch in enumerate(raw):
+        if ch in "：:":
+            return raw[:index].strip(), raw[index + 1:].strip()
+    return raw.strip(), None
+
+def is_valid_name(name: str) -> bool:
+    """检查标记中的角色名是否像一个名字"""
+    return 0 < len(name) <= MAX_NAME_LENGTH and not _INVALID_NAME.search(name)
+
+def structure_marker(marker: CharacterMarker) -> Optional[Dict[str, str]]:
+    """把带描述的新角色标记转换为角色信息
+
+    描述按“性格特征、外貌特征、身份背景”的顺序解析：最后一项作为身份背景，
+    其余作为描述。只有一项时全部作为描述。
+
+    Returns:
+        与 NovelGenerator.extract_characters 相同格式的角色字典，无法解析时返回 None
+    """
+    if not marker.details or not is_valid_name(marker.name):
+        return None
+
+    parts = [p.strip() for p in _DETAIL_SEPARATOR.split(marker.details) if p.strip()]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        description, characteristics = parts[0], ""
+    else:
+        description, characteristics = "，".join(parts[:-1]), parts[-1]
+
+    role_type = "配角"
+    for keyword, role in _ROLE_KEYWORDS:
+        if keyword in marker.details:
+            role_type = role
+            break
+
+    return {
+        "name": marker.name,
+        "description": description,
+        "characteristics": characteristics,
+        "role_type": role_type
+    }
+
+class MarkerParseResult(NamedTuple):
+    """解析结果"""
+    new_characters: List[Dict[str, str]]  # 可以直接创建的新角色
+    known_names: List[str]  # 指向已有角色的名字
+    unresolved: List[CharacterMarker]  # 需要交给模型处理的标记
+
+def parse_character_markers(text: str, existing_names: Iterable[str]) -> MarkerParseResult:
+    """解析文本中的角色标记，并与小说已有角色对照
+
+    Args:
+        text: 章节内容
+        existing_names: 小说已有的角色名
+
+    Returns:
+        解析结果。同一个新角色出现多次时以第一次带描述的标记为准
+    """
+    index = set(existing_names)
+    new_characters: Dict[str, Dict[str, str]] = {}
+    known = []
+    pending: Dict[str, CharacterMarker] = {}
+
+    for marker in find_markers(text):
+        if marker.name in index:
+            if marker.name not in known:
+                known.append(marker.name)
+            continue
+        if marker.name in new_characters:
+            continue
+
+        character = structure_marker(marker)
+        if character is not None:
+            new_characters[marker.name] = character
+            pending.pop(marker.name, None)
+        elif marker.name not in pending:
+            pending[marker.name] = marker
+
+    return MarkerParseResult(
+        new_characters=list(new_characters.values()),
+        known_names=known,
+        unresolved=list(pending.values())
+    )
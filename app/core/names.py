@@ -0,0 +1,170 @@
+"""
+角色名匹配
+
+用 Aho–Corasick 自动机一次扫描文本，找出其中提到的所有角色，
+耗时只与文本长度有关，不随角色数增长。每个角色可以有多个名字（别名）。
+"""
+import threading
+import logging
+from typing import List, Dict, Any, Iterable, Tuple, Set
+from ..database.sqlite import DatabaseManager
+
+class NameMatcher:
+    """多模式字符串匹配自动机"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        """构建自动机
+
+        Args:
+            patterns: (名字, 键) 序列，多个名字可以对应同一个键
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+
+        for pattern, key in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append((len(pattern), key))
+
+        # 按层构建失败指针，并把失败状态的输出合并进来
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+                queue.append(next_state)
+
+    def find(self, text: str) -> List[Tuple[int, int, Any]]:
+        """找出文本中所有出现的名字，包括相互重叠的
+
+        Returns:
+            (起始位置, 结束位置, 键) 列表，按结束位置排列
+        """
+        matches = []
+        state = 0
+        for i, ch in enumerate(text or ""):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, key in self._output[state]:
+                matches.append((i + 1 - length, i + 1, key))
+        return matches
+
+    def keys(self, text: str) -> Set[Any]:
+        """文本中提到的所有键"""
+        return {key for _, _, key in self.find(text)}
+
+class CastIndex:
+    """按小说缓存角色名自动机
+
+    小说的 cast_version 在角色增删或改名时递增，版本号变化后在下次使用时重建。
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        """初始化角色名索引
+
+        Args:
+            db_manager: 数据库管理器实例
+        """
+        self.db = db_manager
+        # novel_id -> (名单版本号, 自动机)
+        self._matchers: Dict[int, Tuple[int, NameMatcher]] = {}
+        self._lock = threading.Lock()
+
+    def mentioned(self, novel_id: int, *texts: str) -> Set[int]:
+        """找出文本中提到的角色
+
+        Args:
+            novel_id: 小说ID
+            texts: 要扫描的文本，例如提示词、章节大纲和正文
+
+        Returns:
+            被提到的角色ID集合
+        """
+        try:
+            matcher = self._get_matcher(novel_id)
+            found: Set[int] = set()
+            for text in texts:
+                if text:
+                    found |= matcher.keys(text)
+            return found
+
+        except Exception as e:
+            logging.error(f"匹配角色名失败: {e}")
+            raise
+
+    def relationships(self, novel_id: int, character_ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """获取与指定角色直接相关的关系
+
+        Returns:
+            关系列表，每项包含 character1_id、character1_name、character2_id、
+            character2_name、relationship_type 和 description
+        """
+        ids = list(character_ids)
+        if not ids:
+            return []
+        placeholders = ", ".join("?" * len(ids))
+        result = self.db.execute_query(f"""
+            SELECT r.character1_id, c1.name, r.character2_id, c2.name,
+                   r.relationship_type, r.description
+            FROM character_relationships r
+            JOIN characters c1 ON r.character1_id = c1.id
+            JOIN characters c2 ON r.character2_id = c2.id
+            WHERE r.novel_id = ?
+              AND (r.character1_id IN ({placeholders}) OR r.character2_id IN ({placeholders}))
+            ORDER BY r.id
+        """, (novel_id, *ids, *ids))
+        return [{
+            "character1_id": row[0],
+            "character1_name": row[1],
+            "character2_id": row[2],
+            "character2_name": row[3],
+            "relationship_type": row[4],
+            "description": row[5]
+        } for row in result] if result else []
+
+    def invalidate(self, novel_id: int):
+        """丢弃小说的自动机"""
+        with self._lock:
+            self._matchers.pop(novel_id, None)
+
+    def _get_matcher(self, novel_id: int) -> NameMatcher:
+        """取得小说的自动机，名单版本号变化时重建"""
+        version = self._cast_version(novel_id)
+        with self._lock:
+            cached = self._matchers.get(novel_id)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        names = self._load_names(novel_id)
+        matcher = NameMatcher((name, character_id) for character_id, name in names)
+        with self._lock:
+            self._matchers[novel_id] = (version, matcher)
+        logging.info(f"角色名自动机已重建: novel_id={novel_id}, 共{len(names)}个名字")
+        return matcher
+
+    def _cast_version(self, novel_id: int) -> int:
+        """读取小说角色名单的版本号"""
+        result = self.db.execute_query("SELECT cast_version FROM novels WHERE id = ?", (novel_id,))
+        return result[0][0] if result else 0
+
+    def _load_names(self, novel_id: int) -> List[Tuple[int, str]]:
+        """读取小说角色的 (角色ID, 名字) 列表"""
+        result = self.db.execute_query(
+            "SELECT id, name FROM characters WHERE novel_id = ?", (novel_id,)
+        )
+        return [(row[0], row[1]) for row in result if row[1]] if result else []
@@ -0,0 +1,161 @@
+"""
+按 token 预算组装提示词
+
+提示词由若干段组成（大纲、章节信息、前文摘要、角色等），每段有优先级。
+预算不足时先保证高优先级的段，低优先级的段按条目的重要程度保留一部分，
+放不下的条目先压缩为第一句，仍放不下时丢弃。
+"""
+import re
+import math
+from typing import List, Dict, Any, Optional, NamedTuple, Tuple
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_SENTENCE_END = re.compile(r"[。！？!?\n]")
+
+# 压缩或截断后短于此长度的条目没有意义，直接丢弃
+MIN_ITEM_TOKENS = 8
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数
+
+    中文字符和全角标点按每字 1 个 token 计，其余非空白字符按每 4 个 1 个 token 计。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    other = len(re.sub(r"\s", "", text)) - cjk
+    return cjk + math.ceil(other / 4)
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = "…") -> str:
+    """截断文本，使其不超过 max_tokens 个 token"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    # 二分查找能放下的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid] + marker) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + marker if low else ""
+
+def first_sentence(text: str) -> str:
+    """取第一句，用于压缩放不下的条目"""
+    match = _SENTENCE_END.search(text or "")
+    return text[:match.end()].strip() if match else (text or "")
+
+class PromptSection(NamedTuple):
+    """提示词中的一段"""
+    name: str  # 段名，用于报告
+    header: Optional[str]  # 段标题，为空时不输出
+    items: List[str]  # 段内条目，按输出顺序排列
+    priority: int  # 数字越小越重要
+    required: bool = False  # 必须完整保留，不参与截断
+    rank: Optional[List[int]] = None  # 条目的保留顺序（下标列表），默认从后往前，即越新越重要
+    compress: bool = False  # 放不下时是否先压缩为第一句
+
+class PromptAssembler:
+    def __init__(self, budget: int):
+        """初始化提示词组装器
+
+        Args:
+            budget: 整个提示词的 token 上限
+        """
+        self.budget = budget
+        self.sections: List[PromptSection] = []
+
+    def add(self, name: str, items: List[str], priority: int, header: Optional[str] = None,
+            required: bool = False, rank: Optional[List[int]] = None, compress: bool = False):
+        """添加一段，段按添加顺序输出
+
+        Args:
+            name: 段名
+            items: 段内条目
+            priority: 优先级，数字越小越先分配预算
+            header: 段标题
+            required: 必须完整保留
+            rank: 条目的保留顺序，默认越靠后的条目越重要
+            compress: 放不下时是否先压缩为第一句
+        """
+        items = [item for item in items if item]
+        if items:
+            self.sections.append(PromptSection(name, header, items, priority, required, rank, compress))
+
+    def build(self) -> Tuple[str, List[Dict[str, Any]]]:
+        """按预算组装提示词
+
+        Returns:
+            (提示词, 报告)。报告每项对应一段，包含：
+                - section: 段名
+                - tokens: 该段实际占用的 token 数
+                - items: 条目总数
+                - included: 完整保留的条目数
+                - compressed: 被压缩的条目数
+                - dropped: 被丢弃的条目数
+        """
+        # 段标题也计入预算
+        remaining = self.budget
+        chosen: Dict[int, Dict[int, str]] = {}
+        stats: Dict[int, Dict[str, int]] = {}
+
+        order = sorted(range(len(self.sections)),
+                       key=lambda i: (not self.sections[i].required, self.sections[i].priority, i))
+        for index in order:
+            section = self.sections[index]
+            kept: Dict[int, str] = {}
+            counts = {"included": 0, "compressed": 0, "dropped": 0}
+            header_tokens = estimate_tokens(section.header) if section.header else 0
+
+            if section.required:
+                for i, item in enumerate(section.items):
+                    kept[i] = item
+                counts["included"] = len(section.items)
+                remaining -= header_tokens + sum(estimate_tokens(item) for item in section.items)
+            elif remaining > header_tokens:
+                remaining -= header_tokens
+                rank = section.rank if section.rank is not None else list(range(len(section.items) - 1, -1, -1))
+                for i in rank:
+                    item = section.items[i]
+                    cost = estimate_tokens(item)
+                    if cost <= remaining:
+                        kept[i] = item
+                        counts["included"] += 1
+                        remaining -= cost
+                        continue
+                    short = first_sentence(item) if section.compress else truncate_to_tokens(item, remaining)
+                    short = truncate_to_tokens(short, remaining)
+                    if estimate_tokens(short) >= min(MIN_ITEM_TOKENS, cost):
+                        kept[i] = short
+                        counts["compressed"] += 1
+                        remaining -= estimate_tokens(short)
+                    else:
+                        counts["dropped"] += 1
+                if not kept:
+                    # 一条都放不下时不输出标题
+                    remaining += header_tokens
+            else:
+                counts["dropped"] = len(section.items)
+
+            chosen[index] = kept
+            stats[index] = counts
+
+        parts = []
+        report = []
+        for index, section in enumerate(self.sections):
+            kept = chosen[index]
+            text = ""
+            if kept:
+                lines = ([section.header] if section.header else []) + [kept[i] for i in sorted(kept)]
+                text = "\n".join(lines)
+                parts.append(text)
+            report.append({
+                "section": section.name,
+                "tokens": estimate_tokens(text),
+                "items": len(section.items),
+                **stats[index]
+            })
+
+        return "\n\n".join(parts), report
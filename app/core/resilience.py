@@ -0,0 +1,333 @@
+"""
+模型调用的限流、重试和熔断
+
+ResilientBackend 包装任意 LLMBackend：
+- 令牌桶限流：同一模型的所有调用共用一个令牌桶，控制请求速率
+- 重试：429、5xx、超时和连接错误按带随机抖动的指数退避重试
+- 截止时间：每次调用（包括排队和重试）不超过 deadline 秒
+- 熔断：连续失败达到阈值后一段时间内直接拒绝调用，之后放行一次试探调用
+
+各组件的状态通过 metrics() 导出。
+"""
+import time
+import random
+import threading
+import logging
+from typing import Iterator, Optional, Dict, Any, Callable
+from .backends import LLMBackend
+
+# 可以重试的 HTTP 状态码
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# 可以重试的网络异常类名。google.genai 通过 httpx 发请求，连接中断、超时等异常
+# 都继承自 httpx.TransportError，不是内置的 ConnectionError/TimeoutError。
+# 按类名匹配，不需要导入 httpx
+RETRYABLE_ERROR_NAMES = {"TransportError", "TimeoutException", "ConnectError"}
+
+class CircuitOpenError(RuntimeError):
+    """熔断期间拒绝调用"""
+
+class DeadlineExceeded(TimeoutError):
+    """调用超过截止时间"""
+
+def error_status(error: Exception) -> Optional[int]:
+    """取出异常中的 HTTP 状态码，google.genai 的 APIError 使用 code 属性"""
+    for attr in ("code", "status_code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+def is_retryable(error: Exception) -> bool:
+    """判断异常是否是可以重试的临时错误"""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    status = error_status(error)
+    return status in RETRYABLE_STATUS
+
+class TokenBucket:
+    """令牌桶限流器，线程安全"""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: 每秒补充的令牌数，即长期平均请求速率
+            capacity: 桶容量，即允许的突发请求数
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """取一个令牌，不够时等待
+
+        Args:
+            timeout: 最长等待秒数，为空时一直等待
+
+        Returns:
+            是否取得令牌，超时返回 False
+        """
+        start = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    if waited:
+                        self.waits += 1
+                        self.wait_seconds += now - start
+                    return True
+                delay = (1 - self._tokens) / self.rate
+            if timeout is not None and now - start + delay > timeout:
+                return False
+            waited = True
+            time.sleep(delay)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "tokens": round(tokens, 3),
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 3)
+            }
+
+# 模型名 -> 令牌桶，同一模型的所有调用共用
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+def get_rate_limiter(model: str, rate: float, capacity: float) -> TokenBucket:
+    """取得模型的令牌桶，第一次调用时按参数创建"""
+    with _buckets_lock:
+        bucket = _buckets.get(model)
+        if bucket is None:
+            bucket = _buckets[model] = TokenBucket(rate, capacity)
+        return bucket
+
+class CircuitBreaker:
+    """熔断器
+
+    closed：正常放行；连续失败 failure_threshold 次后转为 open。
+    open：拒绝所有调用；reset_timeout 秒后转为 half_open。
+    half_open：只放行一次试探调用，成功后恢复 closed，失败则重新 open。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self):
+        """检查是否放行调用，拒绝时抛出 CircuitOpenError"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+            remaining = max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+            raise CircuitOpenError(f"模型服务暂时不可用，{remaining:.0f}秒后重试")
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release(self):
+        """试探调用没有得到服务端的明确结果（如本地超时、参数错误）时释放试探名额"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                    logging.warning(f"连续失败{self._failures}次，熔断{self.reset_timeout}秒")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+class ResilientBackend(LLMBackend):
+    """为后端调用加上限流、重试、截止时间和熔断"""
+
+    def __init__(self, backend: LLMBackend, rate: float = 1.0, burst: float = 5,
+                 max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 20.0,
+                 deadline: Optional[float] = 120.0, breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            backend: 被包装的后端
+            rate: 每秒请求数上限，同一模型共用，不大于 0 时不限流
+            burst: 允许的突发请求数
+            max_attempts: 每次调用最多尝试的次数
+            base_delay: 第一次重试前的最长等待秒数，之后每次翻倍
+            max_delay: 重试等待的上限
+            deadline: 每次调用默认的截止时间（秒），包括限流等待和重试，为空时不限制
+            breaker: 熔断器，默认新建
+        """
+        self.backend = backend
+        self.name = backend.name
+        self.model = backend.model
+        self.limiter = get_rate_limiter(backend.model, rate, burst) if rate > 0 else None
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def generate(self, prompt: str, cached_content: Optional[str] = None,
+                 timeout: Optional[float] = None) -> str:
+        return self._call(lambda remaining: self.backend.generate(prompt, cached_content, timeout=remaining),
+                          timeout)
+
+    def stream(self, prompt: str, cached_content: Optional[str] = None,
+               timeout: Optional[float] = None) -> Iterator[str]:
+        """流式生成，只在收到第一个片段之前重试，之后的错误直接抛出，避免重复输出"""
+        def start(remaining):
+            stream = self.backend.stream(prompt, cached_content, timeout=remaining)
+            try:
+                return stream, next(stream, None)
+            except BaseException:
+                stream.close()
+                raise
+
+        stream, first = self._call(start, timeout)
+        try:
+            if first is not None:
+                yield first
+            for chunk in stream:
+                yield chunk
+        except Exception as e:
+            self._count_failure()
+            if is_retryable(e):
+                self.breaker.record_failure()
+            raise
+        finally:
+            stream.close()
+
+    def count_tokens(self, text: str) -> int:
+        return self.backend.count_tokens(text)
+
+    def context_cache(self):
+        return self.backend.context_cache()
+
+    def metrics(self) -> Dict[str, Any]:
+        """限流器、熔断器和调用统计"""
+        with self._lock:
+            calls = {"calls": self.calls, "retries": self.retries, "failures": self.failures}
+        return {
+            "model": self.model,
+            "limiter": self.limiter.metrics() if self.limiter is not None else None,
+            "breaker": self.breaker.metrics(),
+            **calls
+        }
+
+    def _call(self, fn: Callable[[Optional[float]], Any], timeout: Optional[float] = None):
+        """按重试策略执行调用
+
+        Args:
+            fn: 实际的调用，参数是剩余可用秒数
+            timeout: 本次调用的截止时间，为空时使用 self.deadline
+        """
+        with self._lock:
+            self.calls += 1
+        seconds = timeout or self.deadline
+        deadline = time.monotonic() + seconds if seconds else None
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.allow()
+            try:
+                remaining = self._remaining(deadline)
+                if self.limiter is not None and not self.limiter.acquire(remaining):
+                    raise DeadlineExceeded("等待限流超过截止时间")
+                result = fn(self._remaining(deadline))
+            except Exception as e:
+                if not is_retryable(e):
+                    # 参数错误、截止时间等不说明服务不可用，不计入熔断
+                    self._count_failure()
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                if attempt >= self.max_attempts or (
+                        deadline is not None and time.monotonic() + delay >= deadline):
+                    self._count_failure()
+                    logging.error(f"模型调用失败，已尝试{attempt}次: {e}")
+                    raise
+                with self._lock:
+                    self.retries += 1
+                logging.warning(f"模型调用失败，{delay:.1f}秒后第{attempt + 1}次尝试: {e}")
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        """剩余可用秒数，已超过截止时间时抛出 DeadlineExceeded"""
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("模型调用超过截止时间")
+        return remaining
+
+    def _count_failure(self):
+        with self._lock:
+            self.failures += 1
@@ -0,0 +1,227 @@
+from typing import List, Dict, Any, Optional, NamedTuple, Iterable
+from datetime import datetime, timedelta
+from ..database.sqlite import DatabaseManager
+from ..models.chapter import Chapter
+import threading
+import logging
+
+class RetentionRule(NamedTuple):
+    """一档保留规则
+
+    年龄小于 max_age 的版本按 interval 分段，每段只保留最新的一个；
+    interval 为 None 表示全部保留，max_age 为 None 表示适用于更早的所有版本。
+    """
+    max_age: Optional[timedelta]
+    interval: Optional[timedelta]
+
+# 一小时内全部保留，一天内每小时一个，一个月内每天一个，更早的每周一个
+DEFAULT_RULES = (
+    RetentionRule(timedelta(hours=1), None),
+    RetentionRule(timedelta(days=1), timedelta(hours=1)),
+    RetentionRule(timedelta(days=30), timedelta(days=1)),
+    RetentionRule(None, timedelta(weeks=1)),
+)
+
+class PruneReport(NamedTuple):
+    """一次清理的结果"""
+    versions_deleted: int
+    chapters_processed: int
+    bytes_before: int
+    bytes_after: int
+    bytes_reclaimed: int
+
+_EPOCH = datetime(1970, 1, 1)
+
+def _utcnow() -> datetime:
+    """当前 UTC 时间，与 CURRENT_TIMESTAMP 写入的 created_at 一致，不带时区"""
+    return datetime.utcnow()
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    """解析 SQLite 的 CURRENT_TIMESTAMP 格式"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.strptime(str(value)[:19], "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+class RetentionPolicy:
+    def __init__(self, rules: Iterable[RetentionRule] = DEFAULT_RULES):
+        """初始化保留策略
+
+        Args:
+            rules: 按 max_age 从小到大排列的保留规则
+        """
+        self.rules = list(rules)
+        if not self.rules:
+            raise ValueError("保留策略至少需要一条规则")
+
+    def _rule_for(self, age: timedelta) -> Optional[int]:
+        """返回适用于该年龄的规则序号，超出所有规则时返回 None"""
+        for index, rule in enumerate(self.rules):
+            if rule.max_age is None or age < rule.max_age:
+                return index
+        return None
+
+    def select_expired(self, versions: List[Dict[str, Any]], now: Optional[datetime] = None) -> List[int]:
+        """选出按策略应删除的版本
+
+        最新的版本总是保留；时间无法解析的版本不做处理。
+
+        Args:
+            versions: 版本列表，每项包含 id 和 created_at
+            now: 当前 UTC 时间，默认为系统时间
+
+        Returns:
+            应删除的版本ID列表
+        """
+        if not versions:
+            return []
+        now = now or _utcnow()
+        latest_id = max(v["id"] for v in versions)
+
+        kept: Dict[tuple, int] = {}
+        expired = []
+        # 从新到旧遍历，每段第一个遇到的就是该段最新的版本
+        for version in sorted(versions, key=lambda v: v["id"], reverse=True):
+            created_at = _parse_timestamp(version["created_at"])
+            if version["id"] == latest_id or created_at is None:
+                continue
+
+            index = self._rule_for(max(now - created_at, timedelta(0)))
+            if index is None:
+                expired.append(version["id"])
+                continue
+
+            interval = self.rules[index].interval
+            if interval is None:
+                continue
+
+            bucket = (index, int((created_at - _EPOCH) / interval))
+            if bucket in kept:
+                expired.append(version["id"])
+            else:
+                kept[bucket] = version["id"]
+
+        return expired
+
+class VersionPruner:
+    def __init__(self, db_manager: DatabaseManager, policy: Optional[RetentionPolicy] = None,
+                 batch_size: int = 20):
+        """初始化版本清理器
+
+        Args:
+            db_manager: 数据库管理器实例
+            policy: 保留策略，默认使用 DEFAULT_RULES
+            batch_size: 每个事务处理的章节数，较小的批次可以缩短写锁的持有时间
+        """
+        self.db = db_manager
+        self.policy = policy or RetentionPolicy()
+        self.batch_size = batch_size
+        self.chapter_model = Chapter(db_manager)
+        self.last_report: Optional[PruneReport] = None
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def prune(self, now: Optional[datetime] = None, vacuum: bool = True, full_vacuum: bool = False) -> PruneReport:
+        """按保留策略清理所有章节的版本历史
+
+        Args:
+            now: 当前 UTC 时间，默认为系统时间
+            vacuum: 清理后是否回收空闲页
+            full_vacuum: 数据库未开启增量回收时是否执行完整的 VACUUM。VACUUM 重写整个文件
+                并一直占用写锁，后台清理不应使用，由用户在数据库管理器中手动执行
+
+        Returns:
+            清理结果
+        """
+        try:
+            bytes_before = self.db.get_space_usage()["total_bytes"]
+
+            result = self.db.execute_query(
+                "SELECT DISTINCT chapter_id FROM chapter_versions ORDER BY chapter_id"
+            )
+            chapter_ids = [row[0] for row in result] if result else []
+
+            deleted = 0
+            for start in range(0, len(chapter_ids), self.batch_size):
+                if self._stop_event.is_set():
+                    break
+                batch = chapter_ids[start:start + self.batch_size]
+                # 每批一个写事务，在事务内选择版本，避免与编辑器新写入的版本交错
+                with self.db.transaction(immediate=True):
+                    for chapter_id in batch:
+                        deleted += self._prune_chapter(chapter_id, now)
+
+            if vacuum and deleted:
+                self.db.reclaim_space(full=full_vacuum)
+            bytes_after = self.db.get_space_usage()["total_bytes"]
+
+            report = PruneReport(
+                versions_deleted=deleted,
+                chapters_processed=len(chapter_ids),
+                bytes_before=bytes_before,
+                bytes_after=bytes_after,
+                bytes_reclaimed=max(bytes_before - bytes_after, 0)
+            )
+            self.last_report = report
+            logging.info(
+                f"版本清理完成: 处理{report.chapters_processed}个章节, 删除{report.versions_deleted}个版本, "
+                f"回收{report.bytes_reclaimed}字节"
+            )
+            return report
+
+        except Exception as e:
+            logging.error(f"版本清理失败: {e}")
+            raise
+
+    def _prune_chapter(self, chapter_id: int, now: Optional[datetime]) -> int:
+        """清理单个章节的过期版本，只读取版本的ID和时间"""
+        result = self.db.execute_query(
+            "SELECT id, created_at FROM chapter_versions WHERE chapter_id = ?",
+            (chapter_id,)
+        )
+        versions = [{"id": row[0], "created_at": row[1]} for row in result] if result else []
+        expired = self.policy.select_expired(versions, now)
+        return self.chapter_model.prune_versions(chapter_id, expired) if expired else 0
+
+    def start(self, interval: float = 3600, initial_delay: float = 60):
+        """在后台线程中定期清理
+
+        Args:
+            interval: 两次清理之间的秒数
+            initial_delay: 启动后首次清理前等待的秒数，避开程序启动时的加载
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval, initial_delay),
+            name="VersionPruner", daemon=True
+        )
+        self._thread.start()
+        logging.info(f"版本清理线程已启动，间隔{interval}秒")
+
+    def stop(self, timeout: Optional[float] = 5):
+        """停止后台清理，正在处理的批次完成后退出"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self, interval: float, initial_delay: float):
+        """后台线程主循环"""
+        try:
+            if self._stop_event.wait(initial_delay):
+                return
+            while True:
+                try:
+                    self.prune()
+                except Exception:
+                    # 错误已在 prune 中记录，下个周期重试
+                    pass
+                if self._stop_event.wait(interval):
+                    return
+        finally:
+            self.db.release_connection()
@@ -0,0 +1,390 @@
+"""
+前文检索
+
+在本地为章节摘要和正文片段建立 BM25 索引，续写时按当前提示词和章节大纲
+取出最相关的前文片段，不依赖外部服务。
+
+中文没有空格分词，这里按字二元组切分，英文和数字按单词切分。
+每部小说的索引在第一次检索时从数据库建立，之后只对内容或摘要变化的章节
+重新切分，其余章节的倒排数据保持不变。
+"""
+import re
+import hashlib
+import threading
+import logging
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import numpy as np
+from ..database.sqlite import DatabaseManager
+from .delta import content_hash
+
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+# 汉字所在的 Unicode 区段：扩展 A、基本区、兼容汉字
+_CJK_RANGES = ((0x3400, 0x4DBF), (0x4E00, 0x9FFF), (0xF900, 0xFAFF))
+
+# 英文单词的词项编号从此处开始，与汉字二元组的编号不重叠
+_WORD_BASE = 1 << 50
+
+# 正文按段落合并成不超过此字数的片段
+CHUNK_CHARS = 400
+
+# 已删除的片段超过此比例时重建索引
+COMPACT_RATIO = 0.5
+
+# 新增的文档先放在小的尾段中，超过主段的此比例（且不少于 MIN_TAIL_DOCS）时合并
+MERGE_RATIO = 0.1
+MIN_TAIL_DOCS = 1000
+
+def term_ids(text: str) -> np.ndarray:
+    """把文本切分为检索用的词项编号
+
+    连续汉字按相邻两字切分，单独的汉字保留为一个词项，编号由字的码位拼接而成；
+    英文和数字按单词切分并转为小写，编号取单词的哈希。
+    """
+    if not text:
+        return np.zeros(0, dtype=np.int64)
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+    cjk = np.zeros(len(codes), dtype=bool)
+    for low, high in _CJK_RANGES:
+        cjk |= (codes >= low) & (codes <= high)
+
+    pair = cjk[:-1] & cjk[1:]
+    bigrams = (codes[:-1][pair] << 21) | codes[1:][pair]
+    # 前后都不是汉字的单字
+    alone = cjk.copy()
+    alone[1:] &= ~cjk[:-1]
+    alone[:-1] &= ~cjk[1:]
+    singles = codes[alone] << 21
+
+    words = [
+        _WORD_BASE + int.from_bytes(hashlib.blake2b(word.lower().encode(), digest_size=5).digest(), "little")
+        for word in _WORD.findall(text)
+    ]
+    return np.concatenate([bigrams, singles, np.array(words, dtype=np.int64)])
+
+def split_chunks(content: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """把正文按段落切成片段，过长的段落按字数截断"""
+    chunks = []
+    current = ""
+    for paragraph in (content or "").split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + len(paragraph) + 1 > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+class _Segment:
+    """一组文档的倒排数据：所有（词项, 文档, 词频）按词项排序存放"""
+
+    def __init__(self, doc_ids: Iterable[int], doc_terms: List[np.ndarray], doc_tfs: List[np.ndarray]):
+        doc_ids = list(doc_ids)
+        if doc_ids:
+            terms = np.concatenate([doc_terms[d] for d in doc_ids])
+            docs = np.repeat(np.array(doc_ids, dtype=np.int64), [len(doc_terms[d]) for d in doc_ids])
+            tfs = np.concatenate([doc_tfs[d] for d in doc_ids])
+            order = np.argsort(terms, kind="stable")
+            self.terms, self.docs, self.tfs = terms[order], docs[order], tfs[order]
+        else:
+            self.terms = np.zeros(0, dtype=np.int64)
+            self.docs = np.zeros(0, dtype=np.int64)
+            self.tfs = np.zeros(0, dtype=np.float64)
+
+    def lookup(self, query_terms: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """查找查询词项的倒排数据
+
+        Returns:
+            (查询词项下标, 文档编号, 词频) 三个等长数组
+        """
+        low = np.searchsorted(self.terms, query_terms, side="left")
+        high = np.searchsorted(self.terms, query_terms, side="right")
+        counts = high - low
+        total = int(counts.sum())
+        if total == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float64)
+        owner = np.repeat(np.arange(len(query_terms)), counts)
+        # 每个区间内的偏移
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(low, counts) + offsets
+        return owner, self.docs[positions], self.tfs[positions]
+
+class BM25Index:
+    """支持增量增删文档的 BM25 索引
+
+    每个文档切分后保存词项编号和词频数组。检索用的倒排数据分为主段和尾段：
+    新文档只使尾段失效，尾段较大时才与主段合并重排，避免每次保存都重建全部数据。
+    删除文档只做标记，标记过多时整体重建。文档按分组（例如章节）整体删除。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._texts: List[str] = []
+        self._meta: List[Dict[str, Any]] = []
+        self._doc_terms: List[np.ndarray] = []
+        self._doc_tfs: List[np.ndarray] = []
+        self._lengths: List[int] = []
+        self._alive: List[bool] = []
+        self._groups: Dict[Any, List[int]] = {}
+        self._dead = 0
+        self._main = _Segment([], [], [])
+        self._main_end = 0  # 主段包含编号小于此值的文档
+        self._tail: Optional[_Segment] = None
+
+    def __len__(self) -> int:
+        return len(self._texts) - self._dead
+
+    def add(self, text: str, meta: Dict[str, Any], group: Any = None) -> int:
+        """添加文档，返回文档编号"""
+        doc = len(self._texts)
+        terms, tfs = np.unique(term_ids(text), return_counts=True)
+        self._texts.append(text)
+        self._meta.append(meta)
+        self._doc_terms.append(terms)
+        self._doc_tfs.append(tfs.astype(np.float64))
+        self._lengths.append(int(tfs.sum()))
+        self._alive.append(True)
+        self._groups.setdefault(group, []).append(doc)
+        self._tail = None
+        return doc
+
+    def remove_group(self, group: Any):
+        """删除分组中的全部文档"""
+        for doc in self._groups.pop(group, []):
+            self._alive[doc] = False
+            self._dead += 1
+        if self._dead > COMPACT_RATIO * len(self._texts):
+            self._compact()
+
+    def search(self, query: str, top_k: int = 5,
+               allow: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """检索与查询最相关的文档
+
+        Args:
+            query: 查询文本
+            top_k: 返回的文档数
+            allow: 可选的布尔数组，只在为 True 的文档中检索
+
+        Returns:
+            (文档编号, 得分) 列表，按得分从高到低排列，不含得分为 0 的文档
+        """
+        if not self._texts or top_k <= 0:
+            return []
+        alive = np.array(self._alive, dtype=bool)
+        if allow is not None:
+            alive &= allow
+        total = int(alive.sum())
+        if total == 0:
+            return []
+        query_terms, weights = np.unique(term_ids(query), return_counts=True)
+        if len(query_terms) == 0:
+            return []
+
+        owners, docs, tfs = [], [], []
+        for segment in self._segments():
+            owner, doc, tf = segment.lookup(query_terms)
+            live = alive[doc]
+            owners.append(owner[live])
+            docs.append(doc[live])
+            tfs.append(tf[live])
+        owner, doc, tf = np.concatenate(owners), np.concatenate(docs), np.concatenate(tfs)
+        if len(doc) == 0:
+            return []
+
+        lengths = np.array(self._lengths, dtype=np.float64)
+        avg_length = lengths[alive].mean() or 1.0
+        norm = self.k1 * (1 - self.b + self.b * lengths[doc] / avg_length)
+        df = np.bincount(owner, minlength=len(query_terms))
+        idf = np.log(1 + (total - df + 0.5) / (df + 0.5))
+        contribution = weights[owner] * idf[owner] * tf * (self.k1 + 1) / (tf + norm)
+        scores = np.bincount(doc, weights=contribution, minlength=len(self._texts))
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            top = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+            candidates = candidates[top]
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(d), float(scores[d])) for d in ordered]
+
+    def text(self, doc: int) -> str:
+        return self._texts[doc]
+
+    def meta(self, doc: int) -> Dict[str, Any]:
+        return self._meta[doc]
+
+    def meta_array(self, key: str) -> np.ndarray:
+        """所有文档某个元数据字段组成的数组，用于构造 search 的 allow 参数"""
+        return np.array([meta.get(key) for meta in self._meta])
+
+    def _segments(self) -> List[_Segment]:
+        """取得最新的主段和尾段，必要时合并"""
+        count = len(self._texts)
+        if count - self._main_end > max(MIN_TAIL_DOCS, MERGE_RATIO * self._main_end):
+            self._main = _Segment(range(count), self._doc_terms, self._doc_tfs)
+            self._main_end = count
+            self._tail = None
+        if self._tail is None:
+            self._tail = _Segment(range(self._main_end, count), self._doc_terms, self._doc_tfs)
+        return [self._main, self._tail]
+
+    def _compact(self):
+        """丢弃已删除的文档并重建索引，文档编号会改变"""
+        owner = {doc: group for group, docs in self._groups.items() for doc in docs}
+        kept = [doc for doc in range(len(self._texts)) if self._alive[doc]]
+        texts, meta = self._texts, self._meta
+        doc_terms, doc_tfs, lengths = self._doc_terms, self._doc_tfs, self._lengths
+        self.__init__(self.k1, self.b)
+        for doc in kept:
+            new = len(self._texts)
+            self._texts.append(texts[doc])
+            self._meta.append(meta[doc])
+            self._doc_terms.append(doc_terms[doc])
+            self._doc_tfs.append(doc_tfs[doc])
+            self._lengths.append(lengths[doc])
+            self._alive.append(True)
+            self._groups.setdefault(owner[doc], []).append(new)
+
+class ContextRetriever:
+    """按小说维护前文检索索引"""
+
+    READ_BATCH = 500  # 同步索引时每次读取的章节数
+
+    def __init__(self, db_manager: DatabaseManager, chunk_chars: int = CHUNK_CHARS):
+        """初始化前文检索
+
+        Args:
+            db_manager: 数据库管理器实例
+            chunk_chars: 正文片段的最大字数
+        """
+        self.db = db_manager
+        self.chunk_chars = chunk_chars
+        self._indexes: Dict[int, BM25Index] = {}
+        # novel_id -> {chapter_id: 章节签名}
+        self._signatures: Dict[int, Dict[int, str]] = {}
+        self._lock = threading.Lock()
+
+    def search(self, novel_id: int, query: str, before_chapter: Optional[int] = None,
+               top_k: int = 5, exclude_chapters: Iterable[int] = ()) -> List[Dict[str, Any]]:
+        """检索与查询最相关的前文片段
+
+        检索前会同步索引，只重新切分内容或摘要变化过的章节。
+
+        Args:
+            novel_id: 小说ID
+            query: 查询文本，通常是提示词和章节大纲
+            before_chapter: 只检索此章节号之前的章节
+            top_k: 返回的片段数
+            exclude_chapters: 不参与检索的章节号，例如已经完整放入提示词的章节
+
+        Returns:
+            片段列表，按相关度从高到低排列，每项包含：
+                - chapter_number: 章节号
+                - kind: summary / content
+                - text: 片段内容
+                - score: BM25 得分
+        """
+        try:
+            with self._lock:
+                index = self._sync(novel_id)
+                allow = None
+                excluded = set(exclude_chapters)
+                if before_chapter is not None or excluded:
+                    numbers = index.meta_array("chapter_number")
+                    allow = np.ones(len(numbers), dtype=bool)
+                    if before_chapter is not None:
+                        allow &= numbers < before_chapter
+                    if excluded:
+                        allow &= ~np.isin(numbers, list(excluded))
+                results = index.search(query, top_k, allow)
+                return [{
+                    "chapter_number": index.meta(doc)["chapter_number"],
+                    "kind": index.meta(doc)["kind"],
+                    "text": index.text(doc),
+                    "score": score
+                } for doc, score in results]
+
+        except Exception as e:
+            logging.error(f"检索前文失败: {e}")
+            raise
+
+    def update_chapter(self, novel_id: int, chapter_id: int):
+        """章节保存后更新索引，小说的索引尚未建立时不做任何事"""
+        with self._lock:
+            if novel_id not in self._indexes:
+                return
+            result = self.db.execute_query("""
+                SELECT id, chapter_number, content, summary, content_hash
+                FROM chapters WHERE id = ?
+            """, (chapter_id,))
+            signatures = self._signatures[novel_id]
+            index = self._indexes[novel_id]
+            if not result:
+                index.remove_group(chapter_id)
+                signatures.pop(chapter_id, None)
+                return
+            row = result[0]
+            signature = self._signature(row[4], row[3], row[1])
+            if signatures.get(chapter_id) != signature:
+                index.remove_group(chapter_id)
+                self._add_chapter(index, chapter_id, row[1], row[2], row[3])
+                signatures[chapter_id] = signature
+
+    def drop_novel(self, novel_id: int):
+        """丢弃小说的索引"""
+        with self._lock:
+            self._indexes.pop(novel_id, None)
+            self._signatures.pop(novel_id, None)
+
+    def _sync(self, novel_id: int) -> BM25Index:
+        """使索引与数据库一致，返回小说的索引"""
+        index = self._indexes.setdefault(novel_id, BM25Index())
+        signatures = self._signatures.setdefault(novel_id, {})
+
+        # 只读取签名，正文只在章节变化时读取
+        rows = self.db.execute_query("""
+            SELECT id, chapter_number, summary, content_hash
+            FROM chapters WHERE novel_id = ?
+        """, (novel_id,)) or []
+        current = {row[0]: self._signature(row[3], row[2], row[1]) for row in rows}
+
+        for chapter_id in [cid for cid in signatures if cid not in current]:
+            index.remove_group(chapter_id)
+            del signatures[chapter_id]
+
+        changed = [cid for cid, signature in current.items() if signatures.get(cid) != signature]
+        for offset in range(0, len(changed), self.READ_BATCH):
+            batch = changed[offset:offset + self.READ_BATCH]
+            placeholders = ", ".join("?" * len(batch))
+            for row in self.db.iter_query(f"""
+                SELECT id, chapter_number, content, summary
+                FROM chapters WHERE id IN ({placeholders})
+            """, tuple(batch)):
+                index.remove_group(row[0])
+                self._add_chapter(index, row[0], row[1], row[2], row[3])
+                signatures[row[0]] = current[row[0]]
+        if changed:
+            logging.info(f"检索索引已更新: novel_id={novel_id}, 重新切分{len(changed)}章")
+        return index
+
+    def _add_chapter(self, index: BM25Index, chapter_id: int, chapter_number: int,
+                     content: Optional[str], summary: Optional[str]):
+        """把章节的摘要和正文片段加入索引，以章节ID分组"""
+        if summary:
+            index.add(summary, {"chapter_number": chapter_number, "kind": "summary"}, chapter_id)
+        for chunk in split_chunks(content, self.chunk_chars):
+            index.add(chunk, {"chapter_number": chapter_number, "kind": "content"}, chapter_id)
+
+    def _signature(self, content_digest: Optional[str], summary: Optional[str], chapter_number: int) -> str:
+        """章节签名，正文哈希、摘要或章节号变化时改变"""
+        return f"{chapter_number}:{content_digest}:{content_hash(summary or '')}"
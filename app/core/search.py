@@ -0,0 +1,140 @@
+from typing import List, Dict, Any
+from ..database.sqlite import DatabaseManager
+import logging
+
+class SearchIndex:
+    """章节全文检索
+
+    基于 chapters_fts 全文索引（FTS5 + trigram 分词），索引由数据库触发器
+    在章节增删改时自动维护，这里只负责查询。
+    SQLite 不支持 FTS5 时数据库中没有索引，所有检索都逐章扫描。
+    """
+
+    # bm25 字段权重，顺序与 chapters_fts 的字段一致：novel_id, title, content, summary, outline
+    FIELD_WEIGHTS = (0.0, 5.0, 1.0, 2.0, 2.0)
+
+    # trigram 分词器无法用 MATCH 检索少于三个字的词
+    MIN_MATCH_LENGTH = 3
+
+    def __init__(self, db_manager: DatabaseManager):
+        """初始化全文检索
+
+        Args:
+            db_manager: 数据库管理器实例
+        """
+        self.db = db_manager
+        self._fts_available = None
+
+    @property
+    def fts_available(self) -> bool:
+        """数据库中是否有全文索引"""
+        if self._fts_available is None:
+            result = self.db.execute_query(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chapters_fts'"
+            )
+            self._fts_available = bool(result)
+        return self._fts_available
+
+    def search(self, novel_id: int, query: str, limit: int = 20,
+               highlight: tuple = ("[", "]")) -> List[Dict[str, Any]]:
+        """在小说的章节标题、正文、摘要和大纲中搜索
+
+        多个关键词用空格分隔，章节需包含全部关键词。
+
+        Args:
+            novel_id: 小说ID
+            query: 搜索关键词
+            limit: 最多返回的结果数
+            highlight: 片段中标记命中文字的前后缀
+
+        Returns:
+            按相关度排序的结果列表，每项包含：
+                - chapter_id: 章节ID
+                - chapter_number: 章节号
+                - title: 章节标题
+                - snippet: 命中位置附近的片段
+                - position: 第一个关键词在正文中的位置（从0开始），正文未命中时为 None
+        """
+        terms = query.split()
+        if not terms:
+            return []
+
+        try:
+            if self.fts_available and all(len(term) >= self.MIN_MATCH_LENGTH for term in terms):
+                results = self._match_search(novel_id, terms, limit, highlight)
+            else:
+                results = self._scan_search(novel_id, terms, limit)
+
+            logging.info(f"全文检索完成: novel_id={novel_id}, 关键词={terms}, 共{len(results)}条结果")
+            return results
+
+        except Exception as e:
+            logging.error(f"全文检索失败: {e}")
+            raise
+
+    def rebuild(self):
+        """根据章节表重建全部索引"""
+        if not self.fts_available:
+            return
+        self.db.execute_query("INSERT INTO chapters_fts (chapters_fts) VALUES ('rebuild')")
+        logging.info("全文索引重建完成")
+
+    def _match_search(self, novel_id: int, terms: List[str], limit: int,
+                      highlight: tuple) -> List[Dict[str, Any]]:
+        """使用全文索引检索并按 bm25 排序"""
+        # 每个关键词作为短语加引号，避免用户输入被解析为 FTS5 语法
+        match_expr = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        weights = ", ".join(str(w) for w in self.FIELD_WEIGHTS)
+
+        query = f"""
+            SELECT c.id, c.chapter_number, c.title,
+                   snippet(chapters_fts, -1, ?, ?, '…', 24),
+                   instr(c.content, ?)
+            FROM chapters_fts
+            JOIN chapters c ON c.id = chapters_fts.rowid
+            WHERE chapters_fts MATCH ? AND chapters_fts.novel_id = ?
+            ORDER BY bm25(chapters_fts, {weights})
+            LIMIT ?
+        """
+        result = self.db.execute_query(
+            query,
+            (highlight[0], highlight[1], terms[0], match_expr, novel_id, limit)
+        )
+        return [self._to_result(row) for row in result] if result else []
+
+    def _scan_search(self, novel_id: int, terms: List[str], limit: int) -> List[Dict[str, Any]]:
+        """关键词过短时逐章扫描，只在当前小说的章节范围内进行"""
+        conditions = []
+        params: List[Any] = [terms[0], terms[0], terms[0], novel_id]
+        for term in terms:
+            conditions.append(
+                "(instr(title, ?) OR instr(content, ?) OR instr(summary, ?) OR instr(outline, ?))"
+            )
+            params.extend([term] * 4)
+        params.append(limit)
+
+        # 片段取第一个关键词前后各约20字
+        query = f"""
+            SELECT id, chapter_number, title,
+                   CASE WHEN instr(content, ?) > 0
+                        THEN substr(content, max(instr(content, ?) - 20, 1), 60)
+                        ELSE substr(coalesce(summary, outline, ''), 1, 60)
+                   END,
+                   instr(content, ?)
+            FROM chapters
+            WHERE novel_id = ? AND {' AND '.join(conditions)}
+            ORDER BY chapter_number
+            LIMIT ?
+        """
+        result = self.db.execute_query(query, tuple(params))
+        return [self._to_result(row) for row in result] if result else []
+
+    def _to_result(self, row) -> Dict[str, Any]:
+        """将查询行转换为结果字典"""
+        return {
+            "chapter_id": row[0],
+            "chapter_number": row[1],
+            "title": row[2],
+            "snippet": row[3],
+            "position": row[4] - 1 if row[4] else None
+        }
@@ -1,8 +1,30 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, NamedTuple, Callable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+import time
 from .generator import NovelGenerator
+from .summary_tree import SummaryTree
+from .delta import content_hash
+from .resilience import CircuitOpenError
 from ..database.sqlite import DatabaseManager
 import logging
 
+class BackfillReport(NamedTuple):
+    """摘要补全的结果"""
+    total: int  # 本次需要补全的章节数
+    done: int  # 已生成并保存摘要的章节数
+    failed: int  # 生成失败的章节数，下次补全时重试
+    chars: int  # 已处理章节的正文总字数
+    elapsed: float  # 耗时（秒）
+
+    @property
+    def chapters_per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def chars_per_second(self) -> float:
+        return self.chars / self.elapsed if self.elapsed > 0 else 0.0
+
 class SummarySystem:
     def __init__(self, db_manager: DatabaseManager, generator: NovelGenerator):
         """初始化摘要系统
@@ -13,6 +35,7 @@ class SummarySystem:
         """
         self.db = db_manager
         self.generator = generator
+        self.tree = SummaryTree(db_manager, generator)
         
     def generate_chapter_summary(self, content: str) -> str:
         """生成章节摘要
@@ -25,9 +48,180 @@ class SummarySystem:
         """
         return self.generator.generate_summary(content)
         
+    def get_previous_summaries(self, novel_id: int, before_chapter: int) -> List[Dict[str, Any]]:
+        """获取生成内容用的前文摘要，不调用模型
+        
+        较早的章节以情节段和卷的汇总摘要代替，条目数有上限。
+        
+        Args:
+            novel_id: 小说ID
+            before_chapter: 当前章节号
+            
+        Returns:
+            SummaryTree.get_context_summaries 返回的摘要列表
+        """
+        return self.tree.get_context_summaries(novel_id, before_chapter)
+        
+    def refresh_summary_tree(self, novel_id: int) -> int:
+        """重新生成摘要已变化的情节段和卷摘要
+        
+        Args:
+            novel_id: 小说ID
+            
+        Returns:
+            重新生成的节点数
+        """
+        return self.tree.refresh(novel_id)
+        
+    def summarize_chapter(self, chapter_id: int) -> Optional[str]:
+        """为一章生成并保存摘要，摘要已与正文一致时不调用模型
+        
+        Args:
+            chapter_id: 章节ID
+            
+        Returns:
+            新的摘要；章节没有正文、摘要已是最新或生成期间正文被修改时返回 None
+        """
+        rows = self.db.execute_query(
+            "SELECT content, summary, summary_hash FROM chapters WHERE id = ?", (chapter_id,)
+        )
+        if not rows or not rows[0][0]:
+            return None
+        content, summary, summary_hash = rows[0]
+        digest = content_hash(content)
+        if summary and summary_hash == digest:
+            return None
+        summary = self.generator.generate_summary(content)
+        return summary if self._save_summary(chapter_id, summary, digest) else None
+        
+    def get_pending_chapters(self, novel_id: int) -> List[Dict[str, Any]]:
+        """获取摘要缺失或过期的章节
+        
+        摘要为空，或生成摘要时的正文哈希与当前正文不一致的章节需要补全，
+        没有正文的章节跳过。
+        
+        Args:
+            novel_id: 小说ID
+            
+        Returns:
+            按章节号排列的章节列表，每项包含 id、chapter_number
+        """
+        query = """
+            SELECT id, chapter_number FROM chapters
+            WHERE novel_id = ? AND content IS NOT NULL AND content != ''
+              AND (summary IS NULL OR summary = ''
+                   OR summary_hash IS NULL OR summary_hash != content_hash)
+            ORDER BY chapter_number
+        """
+        rows = self.db.execute_query(query, (novel_id,))
+        return [{"id": row[0], "chapter_number": row[1]} for row in rows]
+        
+    def backfill_summaries(self, novel_id: int, concurrency: int = 4,
+                           cancel_event: Optional[threading.Event] = None,
+                           progress: Optional[Callable[[BackfillReport], None]] = None,
+                           refresh_tree: bool = True) -> BackfillReport:
+        """为摘要缺失或过期的章节批量生成摘要
+        
+        最多 concurrency 个章节同时调用模型，请求速率由生成器后端的限流器控制。
+        每章的摘要生成后立即写入数据库，中途退出后再次调用只处理剩余的章节；
+        生成期间正文被修改的章节不保存，留到下次补全。
+        
+        Args:
+            novel_id: 小说ID
+            concurrency: 同时生成摘要的章节数
+            cancel_event: 设置后不再开始新的章节，等待进行中的章节完成后返回
+            progress: 每完成一章调用一次，参数为当前的统计结果
+            refresh_tree: 完成后是否更新情节段和卷的摘要
+            
+        Returns:
+            补全结果和吞吐量
+        """
+        try:
+            pending = self.get_pending_chapters(novel_id)
+            total = len(pending)
+            done = failed = chars = 0
+            start = time.monotonic()
+            if not pending:
+                return BackfillReport(0, 0, 0, 0, 0.0)
+            logging.info(f"开始补全章节摘要: 小说 {novel_id}，共{total}章，并发{concurrency}")
+            
+            queue = iter(pending)
+            stopped = False
+            with ThreadPoolExecutor(max_workers=max(1, concurrency),
+                                    thread_name_prefix="summary-backfill") as executor:
+                running = {}
+                while True:
+                    # 补足进行中的章节
+                    while not stopped and len(running) < max(1, concurrency):
+                        if cancel_event is not None and cancel_event.is_set():
+                            stopped = True
+                            break
+                        chapter = next(queue, None)
+                        if chapter is None:
+                            break
+                        # 正文在当前线程读取，工作线程只调用模型，不占用小说数据库的连接
+                        content = self._get_chapter_content(chapter["id"])
+                        if not content:
+                            continue
+                        chapter["hash"] = content_hash(content)
+                        chapter["chars"] = len(content)
+                        running[executor.submit(self._generate_summary, content)] = chapter
+                    if not running:
+                        break
+                        
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        chapter = running.pop(future)
+                        try:
+                            summary = future.result()
+                        except Exception as e:
+                            failed += 1
+                            logging.error(f"生成第{chapter['chapter_number']}章摘要失败: {e}")
+                            if isinstance(e, CircuitOpenError) and not stopped:
+                                logging.warning("模型服务暂时不可用，停止补全摘要")
+                                stopped = True
+                            continue
+                        # 每章单独提交，作为补全进度的检查点
+                        if not self._save_summary(chapter["id"], summary, chapter["hash"]):
+                            logging.info(f"第{chapter['chapter_number']}章正文已修改，摘要留到下次补全")
+                            continue
+                        done += 1
+                        chars += chapter["chars"]
+                        if progress is not None:
+                            progress(BackfillReport(total, done, failed, chars, time.monotonic() - start))
+                            
+            report = BackfillReport(total, done, failed, chars, time.monotonic() - start)
+            logging.info(
+                f"章节摘要补全结束: 完成{done}/{total}章，失败{failed}章，耗时{report.elapsed:.1f}秒，"
+                f"{report.chapters_per_second:.2f}章/秒，{report.chars_per_second:.0f}字/秒"
+            )
+            
+            if refresh_tree and done and not (cancel_event is not None and cancel_event.is_set()):
+                self.tree.refresh(novel_id)
+            return report
+            
+        except Exception as e:
+            logging.error(f"补全章节摘要失败: {e}")
+            raise
+            
+    def _generate_summary(self, content: str) -> str:
+        """在补全摘要的工作线程中生成摘要
+        
+        生成器的响应缓存使用独立的数据库，每次调用后释放工作线程在其中的连接，
+        线程池结束后不会留下连接。
+        """
+        try:
+            return self.generator.generate_summary(content)
+        finally:
+            cache = getattr(self.generator, "cache", None)
+            if cache is not None:
+                cache.db.release_connection()
+            
     def update_novel_outline(self, novel_id: int) -> str:
         """更新小说大纲
         
+        使用分层摘要，缺失或过期的汇总摘要会先生成。
+        
         Args:
             novel_id: 小说ID
             
@@ -35,8 +229,8 @@ class SummarySystem:
             更新后的大纲
         """
         try:
-            # 获取所有章节摘要
-            summaries = self._get_all_chapter_summaries(novel_id)
+            # 获取分层摘要
+            summaries = self.tree.get_context_summaries(novel_id, generate=True)
             if not summaries:
                 return ""
                 
@@ -85,21 +279,10 @@ class SummarySystem:
             logging.error(f"提取关键情节点失败: {e}")
             raise
             
-    def _get_all_chapter_summaries(self, novel_id: int) -> List[Dict[str, Any]]:
-        """获取小说所有章节的摘要"""
-        query = """
-            SELECT chapter_number, summary
-            FROM chapters
-            WHERE novel_id = ?
-            ORDER BY chapter_number
-        """
-        result = self.db.execute_query(query, (novel_id,))
-        return [{"chapter": row[0], "summary": row[1]} for row in result] if result else []
-        
     def _build_outline_prompt(self, summaries: List[Dict[str, Any]]) -> str:
         """构建更新大纲的提示词"""
         summary_text = "\n".join([
-            f"第{s['chapter']}章：{s['summary']}"
+            f"{s['label']}：{s['summary']}"
             for s in summaries
         ])
         
@@ -122,4 +305,16 @@ class SummarySystem:
         """获取章节内容"""
         query = "SELECT content FROM chapters WHERE id = ?"
         result = self.db.execute_query(query, (chapter_id,))
-        return result[0][0] if result else None 
\ No newline at end of file
+        return result[0][0] if result else None 
+        
+    def _save_summary(self, chapter_id: int, summary: str, digest: str) -> bool:
+        """正文仍是生成摘要时的内容时保存摘要，返回是否已保存"""
+        with self.db.transaction(immediate=True):
+            rows = self.db.execute_query("SELECT content_hash FROM chapters WHERE id = ?", (chapter_id,))
+            if not rows or rows[0][0] != digest:
+                return False
+            self.db.execute_query(
+                "UPDATE chapters SET summary = ?, summary_hash = ? WHERE id = ?",
+                (summary, digest, chapter_id)
+            )
+            return True
@@ -0,0 +1,197 @@
+from typing import List, Dict, Any, Optional, Tuple
+from ..database.sqlite import DatabaseManager
+from .delta import content_hash
+import logging
+
+class SummaryTree:
+    """分层摘要：章节摘要每 ARC_SIZE 章汇总为一个情节段摘要，
+    每 VOLUME_SIZE 个情节段汇总为一卷摘要，每 VOLUME_SIZE 卷再向上汇总，依此类推。
+
+    汇总节点保存在 summary_nodes 表中，同时记录所覆盖章节摘要的哈希；
+    只有其中某章的摘要变化后，节点才需要重新生成。
+    读取前文摘要时，已完成的范围用尽可能高层的汇总节点代替，每层最多
+    VOLUME_SIZE - 1 个条目，只有最近不足一个情节段的章节使用章节摘要，
+    条目数随章节数对数增长。
+    """
+
+    ARC_SIZE = 10  # 每个情节段包含的章节数
+    VOLUME_SIZE = 10  # 每卷包含的情节段数
+
+    LEVEL_ARC = 1
+    LEVEL_VOLUME = 2
+
+    def __init__(self, db_manager: DatabaseManager, generator=None):
+        """初始化分层摘要
+
+        Args:
+            db_manager: 数据库管理器实例
+            generator: 提供 generate_summary(text) 的生成器，只读取时可以为空
+        """
+        self.db = db_manager
+        self.generator = generator
+        self.generated_count = 0  # 累计生成的节点数
+
+    def get_context_summaries(self, novel_id: int, before_chapter: Optional[int] = None,
+                              generate: bool = False) -> List[Dict[str, Any]]:
+        """获取指定章节之前的分层摘要
+
+        Args:
+            novel_id: 小说ID
+            before_chapter: 只包含此章节号之前的章节，为空时包含全部章节
+            generate: 是否为缺失或过期的节点调用生成器。为 False 时不访问模型：
+                过期的节点照常使用，缺失的节点展开为下一层的摘要
+
+        Returns:
+            按章节顺序排列的摘要列表，每项包含：
+                - level: volume / arc / chapter，卷以上各层均为 volume
+                - start_chapter / end_chapter: 覆盖的章节号范围
+                - chapter_number: 同 end_chapter，便于按章节排序
+                - label: 如“第1-10章”
+                - summary: 摘要
+        """
+        try:
+            leaves = self._load_chapter_summaries(novel_id, before_chapter)
+            if not leaves:
+                return []
+            nodes = self._load_nodes(novel_id)
+            last = max(leaves)
+
+            # 最高层是范围不超过已有章节的层，该层的节点数也少于 VOLUME_SIZE
+            top = self.LEVEL_ARC
+            while self._span(top + 1) <= last:
+                top += 1
+
+            items = []
+            start = 1
+            # 从高到低依次取已完成的节点
+            for level in range(top, self.LEVEL_ARC - 1, -1):
+                span = self._span(level)
+                while start + span - 1 <= last:
+                    items.extend(self._resolve(novel_id, level, start, start + span - 1,
+                                               leaves, nodes, generate))
+                    start += span
+            # 最近的章节
+            items.extend(self._chapter_items(leaves, start, last))
+            return items
+
+        except Exception as e:
+            logging.error(f"获取分层摘要失败: {e}")
+            raise
+
+    def refresh(self, novel_id: int) -> int:
+        """为所有已完成的情节段和卷生成缺失或过期的摘要
+
+        Args:
+            novel_id: 小说ID
+
+        Returns:
+            重新生成的节点数
+        """
+        before = self.generated_count
+        self.get_context_summaries(novel_id, generate=True)
+        regenerated = self.generated_count - before
+        logging.info(f"分层摘要更新完成: novel_id={novel_id}, 重新生成{regenerated}个节点")
+        return regenerated
+
+    def _resolve(self, novel_id: int, level: int, start: int, end: int,
+                 leaves: Dict[int, str], nodes: Dict[Tuple[int, int, int], Tuple[str, str]],
+                 generate: bool) -> List[Dict[str, Any]]:
+        """取得一个汇总节点，必要时生成或展开为下一层"""
+        source_hash = self._source_hash(leaves, start, end)
+        if source_hash is None:
+            # 范围内没有任何摘要
+            return []
+
+        stored = nodes.get((level, start, end))
+        if stored is not None and stored[1] == source_hash:
+            return [self._node_item(level, start, end, stored[0])]
+
+        children = self._children(novel_id, level, start, end, leaves, nodes, generate)
+        if generate and self.generator is not None:
+            text = "\n".join(f"{child['label']}：{child['summary']}" for child in children)
+            summary = self.generator.generate_summary(text)
+            self._save_node(novel_id, level, start, end, summary, source_hash)
+            nodes[(level, start, end)] = (summary, source_hash)
+            self.generated_count += 1
+            return [self._node_item(level, start, end, summary)]
+
+        if stored is not None:
+            # 不访问模型时沿用过期的摘要
+            return [self._node_item(level, start, end, stored[0])]
+        return children
+
+    def _children(self, novel_id: int, level: int, start: int, end: int,
+                  leaves: Dict[int, str], nodes, generate: bool) -> List[Dict[str, Any]]:
+        """取得节点的下一层条目"""
+        if level == self.LEVEL_ARC:
+            return self._chapter_items(leaves, start, end)
+        items = []
+        span = self._span(level - 1)
+        for child_start in range(start, end + 1, span):
+            items.extend(self._resolve(novel_id, level - 1, child_start, child_start + span - 1,
+                                       leaves, nodes, generate))
+        return items
+
+    def _span(self, level: int) -> int:
+        """指定层的一个节点覆盖的章节数"""
+        return self.ARC_SIZE * self.VOLUME_SIZE ** (level - 1)
+
+    def _chapter_items(self, leaves: Dict[int, str], start: int, end: int) -> List[Dict[str, Any]]:
+        """章节摘要条目"""
+        return [{
+            "level": "chapter",
+            "start_chapter": number,
+            "end_chapter": number,
+            "chapter_number": number,
+            "label": f"第{number}章",
+            "summary": leaves[number]
+        } for number in range(start, end + 1) if number in leaves]
+
+    def _node_item(self, level: int, start: int, end: int, summary: str) -> Dict[str, Any]:
+        """汇总节点条目"""
+        return {
+            "level": "arc" if level == self.LEVEL_ARC else "volume",
+            "start_chapter": start,
+            "end_chapter": end,
+            "chapter_number": end,
+            "label": f"第{start}-{end}章",
+            "summary": summary
+        }
+
+    def _source_hash(self, leaves: Dict[int, str], start: int, end: int) -> Optional[str]:
+        """计算范围内章节摘要的哈希，没有任何摘要时返回 None"""
+        parts = [f"{number}\0{leaves[number]}" for number in range(start, end + 1) if number in leaves]
+        return content_hash("\n".join(parts)) if parts else None
+
+    def _load_chapter_summaries(self, novel_id: int, before_chapter: Optional[int]) -> Dict[int, str]:
+        """读取章节号到摘要的映射，只读取摘要字段"""
+        query = """
+            SELECT chapter_number, summary
+            FROM chapters
+            WHERE novel_id = ? AND summary IS NOT NULL AND summary != ''
+        """
+        params: tuple = (novel_id,)
+        if before_chapter is not None:
+            query += " AND chapter_number < ?"
+            params = (novel_id, before_chapter)
+        result = self.db.execute_query(query, params)
+        return {row[0]: row[1] for row in result} if result else {}
+
+    def _load_nodes(self, novel_id: int) -> Dict[Tuple[int, int, int], Tuple[str, str]]:
+        """读取小说已保存的汇总节点"""
+        result = self.db.execute_query("""
+            SELECT level, start_chapter, end_chapter, summary, source_hash
+            FROM summary_nodes
+            WHERE novel_id = ?
+        """, (novel_id,))
+        return {(row[0], row[1], row[2]): (row[3], row[4]) for row in result} if result else {}
+
+    def _save_node(self, novel_id: int, level: int, start: int, end: int, summary: str, source_hash: str):
+        """保存汇总节点"""
+        self.db.execute_query("""
+            INSERT INTO summary_nodes (novel_id, level, start_chapter, end_chapter, summary, source_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (novel_id, level, start_chapter, end_chapter)
+            DO UPDATE SET summary = excluded.summary, source_hash = excluded.source_hash,
+                          updated_at = CURRENT_TIMESTAMP
+        """, (novel_id, level, start, end, summary, source_hash))
@@ -0,0 +1,157 @@
+"""
+调用模型的后台任务
+
+AITasks 把摘要、大纲、角色提取等工作注册为 JobWorker 的任务类型，
+并提供提交这些任务的方法。界面只负责提交任务和显示结果，
+任务参数只包含ID，执行时从数据库读取最新的内容。
+"""
+from typing import Dict, Any, Optional
+from ..database.sqlite import DatabaseManager
+from ..models.chapter import Chapter
+from ..models.character import Character
+from ..models.novel import Novel
+from .generator import NovelGenerator
+from .summary import SummarySystem
+from .jobs import JobQueue, JobWorker, JobContext, JobInterrupted, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
+class AITasks:
+    """调用模型的任务类型"""
+
+    EXTRACT_CHARACTERS = "extract_characters"
+    CHAPTER_SUMMARY = "chapter_summary"
+    SUMMARY_TREE = "summary_tree"
+    SUMMARY_BACKFILL = "summary_backfill"
+    INDEX_CHAPTER = "index_chapter"
+    OUTLINE = "outline"
+    KEY_POINTS = "key_points"
+
+    def __init__(self, db_manager: DatabaseManager, queue: JobQueue, generator: NovelGenerator,
+                 summary_system: SummarySystem, retriever=None):
+        """
+        Args:
+            db_manager: 数据库管理器实例
+            queue: 任务队列
+            generator: AI生成器实例
+            summary_system: 摘要系统
+            retriever: 检索索引（ContextRetriever），为空时不更新索引
+        """
+        self.db = db_manager
+        self.queue = queue
+        self.generator = generator
+        self.summary_system = summary_system
+        self.retriever = retriever
+        self.chapter_model = Chapter(db_manager)
+        self.character_model = Character(db_manager)
+        self.novel_model = Novel(db_manager)
+
+    def register(self, worker: JobWorker):
+        """把任务类型注册到任务执行器"""
+        worker.register(self.EXTRACT_CHARACTERS, self._extract_characters)
+        worker.register(self.CHAPTER_SUMMARY, self._chapter_summary)
+        worker.register(self.SUMMARY_TREE, self._summary_tree)
+        worker.register(self.SUMMARY_BACKFILL, self._summary_backfill)
+        worker.register(self.INDEX_CHAPTER, self._index_chapter)
+        worker.register(self.OUTLINE, self._outline)
+        worker.register(self.KEY_POINTS, self._key_points)
+
+    def chapter_saved(self, novel_id: int, chapter_id: int, auto_summary: bool = False) -> Dict[str, int]:
+        """章节保存后提交角色提取、检索索引和（启用时）摘要任务
+
+        同一章节还在排队的任务会被合并，连续保存只处理最新的内容。
+
+        Returns:
+            任务类型 -> 任务ID
+        """
+        payload = {"novel_id": novel_id, "chapter_id": chapter_id}
+        jobs = {
+            self.INDEX_CHAPTER: self.queue.enqueue(
+                self.INDEX_CHAPTER, payload, PRIORITY_NORMAL, dedup_key=f"{self.INDEX_CHAPTER}:{chapter_id}"
+            ),
+            self.EXTRACT_CHARACTERS: self.queue.enqueue(
+                self.EXTRACT_CHARACTERS, payload, PRIORITY_NORMAL,
+                dedup_key=f"{self.EXTRACT_CHARACTERS}:{chapter_id}"
+            )
+        }
+        if auto_summary:
+            jobs[self.CHAPTER_SUMMARY] = self.queue.enqueue(
+                self.CHAPTER_SUMMARY, payload, PRIORITY_NORMAL, dedup_key=f"{self.CHAPTER_SUMMARY}:{chapter_id}"
+            )
+        return jobs
+
+    def extract_characters(self, novel_id: int, chapter_id: Optional[int], text: str) -> int:
+        """提交从一段尚未保存的文本（如刚插入的生成内容）中提取角色的任务"""
+        return self.queue.enqueue(self.EXTRACT_CHARACTERS, {
+            "novel_id": novel_id, "chapter_id": chapter_id, "text": text
+        }, PRIORITY_NORMAL)
+
+    def generate_outline(self, novel_id: int, chapter_id: Optional[int] = None, is_chapter: bool = False) -> int:
+        """提交生成大纲的任务，结果为 {"outline": 大纲}"""
+        target = f"chapter:{chapter_id}" if is_chapter else f"novel:{novel_id}"
+        return self.queue.enqueue(self.OUTLINE, {
+            "novel_id": novel_id, "chapter_id": chapter_id, "is_chapter": is_chapter
+        }, PRIORITY_HIGH, dedup_key=f"{self.OUTLINE}:{target}")
+
+    def backfill_summaries(self, novel_id: int) -> int:
+        """提交补全整部小说章节摘要的任务，结果为 BackfillReport 的各字段"""
+        return self.queue.enqueue(self.SUMMARY_BACKFILL, {"novel_id": novel_id}, PRIORITY_LOW,
+                                  dedup_key=f"{self.SUMMARY_BACKFILL}:{novel_id}")
+
+    def extract_key_points(self, chapter_id: int) -> int:
+        """提交提取章节关键情节点的任务，结果为 {"key_points": [...]}"""
+        return self.queue.enqueue(self.KEY_POINTS, {"chapter_id": chapter_id}, PRIORITY_NORMAL,
+                                  dedup_key=f"{self.KEY_POINTS}:{chapter_id}")
+
+    def _extract_characters(self, ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+        text = payload.get("text")
+        if text is None:
+            chapter = self.chapter_model.get(payload["chapter_id"])
+            if not chapter or not chapter["content"]:
+                return {"added": 0}
+            text = chapter["content"]
+        added = self.character_model.auto_update_characters(
+            self.generator, payload["novel_id"], payload.get("chapter_id"), text
+        )
+        return {"added": added}
+
+    def _chapter_summary(self, ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+        summary = self.summary_system.summarize_chapter(payload["chapter_id"])
+        if summary is not None:
+            # 章节摘要变化后更新所在情节段和卷的摘要
+            self.queue.enqueue(self.SUMMARY_TREE, {"novel_id": payload["novel_id"]}, PRIORITY_LOW,
+                               dedup_key=f"{self.SUMMARY_TREE}:{payload['novel_id']}")
+        return {"summary": summary}
+
+    def _summary_tree(self, ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"generated": self.summary_system.refresh_summary_tree(payload["novel_id"])}
+
+    def _summary_backfill(self, ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+        report = self.summary_system.backfill_summaries(
+            payload["novel_id"], cancel_event=ctx.cancel_event, progress=ctx.report_progress
+        )
+        if ctx.is_cancelled() and report.done + report.failed < report.total:
+            # 已完成的章节已经保存，继续执行时只处理剩余章节
+            raise JobInterrupted(f"摘要补全中断: {report.done}/{report.total}")
+        result = report._asdict()
+        result.update(chapters_per_second=report.chapters_per_second, chars_per_second=report.chars_per_second)
+        return result
+
+    def _index_chapter(self, ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if self.retriever is not None:
+            self.retriever.update_chapter(payload["novel_id"], payload["chapter_id"])
+        return {}
+
+    def _outline(self, ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if payload["is_chapter"]:
+            chapter = self.chapter_model.get(payload["chapter_id"])
+            if not chapter or not chapter["content"]:
+                raise ValueError("当前章节没有内容")
+            outline = self.generator.generate_outline(chapter_content=chapter["content"], is_chapter=True)
+        else:
+            novel = self.novel_model.get(payload["novel_id"])
+            if not novel:
+                raise ValueError(f"小说不存在: {payload['novel_id']}")
+            outline = self.generator.generate_outline(novel_title=novel["title"], is_chapter=False)
+        return {"outline": outline}
+
+    def _key_points(self, ctx: JobContext, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"key_points": self.summary_system.extract_key_points(payload["chapter_id"])}
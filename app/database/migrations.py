@@ -0,0 +1,426 @@
+import sqlite3
+import hashlib
+import logging
+from typing import List, Dict, Callable, NamedTuple
+from ..core.delta import apply_delta
+
+class Migration(NamedTuple):
+    """一次数据库结构升级
+
+    version 从 1 开始连续递增，已应用的最高版本记录在 PRAGMA user_version 中。
+    """
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Cursor], None]
+
+def _column_exists(cursor: sqlite3.Cursor, table_name: str, column_name: str) -> bool:
+    """检查表中是否已有指定字段"""
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    return any(row[1] == column_name for row in cursor.fetchall())
+
+def _create_base_tables(cursor: sqlite3.Cursor):
+    """创建基础表结构，已存在的表保持不变"""
+    # 创建小说表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS novels (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 创建章节表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chapters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            novel_id INTEGER NOT NULL,
+            chapter_number INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            content TEXT,
+            summary TEXT,
+            outline TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (novel_id) REFERENCES novels(id) ON DELETE CASCADE
+        )
+    """)
+
+    # 创建角色表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS characters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            novel_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT,
+            characteristics TEXT,
+            role_type TEXT,
+            first_appearance INTEGER,
+            status TEXT DEFAULT '活跃',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (novel_id) REFERENCES novels(id) ON DELETE CASCADE,
+            FOREIGN KEY (first_appearance) REFERENCES chapters(id) ON DELETE SET NULL
+        )
+    """)
+
+    # 创建角色关系表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS character_relationships (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            novel_id INTEGER NOT NULL,
+            character1_id INTEGER NOT NULL,
+            character2_id INTEGER NOT NULL,
+            relationship_type TEXT NOT NULL,
+            description TEXT,
+            start_chapter INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (novel_id) REFERENCES novels(id) ON DELETE CASCADE,
+            FOREIGN KEY (character1_id) REFERENCES characters(id) ON DELETE CASCADE,
+            FOREIGN KEY (character2_id) REFERENCES characters(id) ON DELETE CASCADE,
+            FOREIGN KEY (start_chapter) REFERENCES chapters(id) ON DELETE SET NULL
+        )
+    """)
+
+    # 创建关系类型表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS relationship_types (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _add_novel_progress_columns(cursor: sqlite3.Cursor):
+    """为小说表添加大纲和当前章节字段"""
+    if not _column_exists(cursor, 'novels', 'outline'):
+        cursor.execute("ALTER TABLE novels ADD COLUMN outline TEXT")
+    if not _column_exists(cursor, 'novels', 'current_chapter'):
+        cursor.execute("ALTER TABLE novels ADD COLUMN current_chapter INTEGER DEFAULT 1")
+
+def _create_chapter_versions(cursor: sqlite3.Cursor):
+    """创建章节版本历史表"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chapter_versions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chapter_id INTEGER NOT NULL,
+            content TEXT,
+            comment TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (chapter_id) REFERENCES chapters(id) ON DELETE CASCADE
+        )
+    """)
+
+def _create_lookup_indexes(cursor: sqlite3.Cursor):
+    """为常用查询条件创建索引"""
+    # 按小说列出章节、按章节号定位章节
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chapters_novel_number
+        ON chapters (novel_id, chapter_number)
+    """)
+
+    # 按章节查询版本历史并按时间排序
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chapter_versions_chapter_created
+        ON chapter_versions (chapter_id, created_at)
+    """)
+
+    # 按小说列出角色、按名称查找角色
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_characters_novel_name
+        ON characters (novel_id, name)
+    """)
+
+    # 角色关系的 character1_id = ? OR character2_id = ? 查询需要两侧各一个索引
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_relationships_character1
+        ON character_relationships (character1_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_relationships_character2
+        ON character_relationships (character2_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_relationships_novel
+        ON character_relationships (novel_id)
+    """)
+
+def _unique_relationship_types(cursor: sqlite3.Cursor):
+    """清理重复的预定义关系类型并加唯一约束
+
+    旧版本每次启动都会重复插入预定义关系类型，这里只保留每组最早的一条。
+    """
+    cursor.execute("""
+        DELETE FROM relationship_types
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM relationship_types GROUP BY category, type
+        )
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_relationship_types_category_type
+        ON relationship_types (category, type)
+    """)
+
+def _fts5_trigram_available(cursor: sqlite3.Cursor) -> bool:
+    """检查 SQLite 是否支持 FTS5 和 trigram 分词器（需要 3.34 及以上版本）"""
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(a, tokenize='trigram')")
+        cursor.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def _create_chapter_search_index(cursor: sqlite3.Cursor):
+    """创建章节全文索引，并用触发器保持与章节表同步
+
+    使用外部内容表，索引只保存倒排数据，不重复存储正文。
+    trigram 分词器按三字切分，适合没有空格分词的中文。
+    SQLite 不支持时跳过，检索改为逐章扫描。
+    """
+    if not _fts5_trigram_available(cursor):
+        logging.warning(f"SQLite {sqlite3.sqlite_version} 不支持 FTS5 trigram 分词，不创建章节全文索引")
+        return
+
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS chapters_fts USING fts5(
+            novel_id UNINDEXED,
+            title,
+            content,
+            summary,
+            outline,
+            content='chapters',
+            content_rowid='id',
+            tokenize='trigram'
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS chapters_fts_insert AFTER INSERT ON chapters BEGIN
+            INSERT INTO chapters_fts (rowid, novel_id, title, content, summary, outline)
+            VALUES (new.id, new.novel_id, new.title, new.content, new.summary, new.outline);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS chapters_fts_delete AFTER DELETE ON chapters BEGIN
+            INSERT INTO chapters_fts (chapters_fts, rowid, novel_id, title, content, summary, outline)
+            VALUES ('delete', old.id, old.novel_id, old.title, old.content, old.summary, old.outline);
+        END
+    """)
+    # 只在被索引的字段变化时更新，单独修改 updated_at 等字段不会触发重建
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS chapters_fts_update
+        AFTER UPDATE OF novel_id, title, content, summary, outline ON chapters BEGIN
+            INSERT INTO chapters_fts (chapters_fts, rowid, novel_id, title, content, summary, outline)
+            VALUES ('delete', old.id, old.novel_id, old.title, old.content, old.summary, old.outline);
+            INSERT INTO chapters_fts (rowid, novel_id, title, content, summary, outline)
+            VALUES (new.id, new.novel_id, new.title, new.content, new.summary, new.outline);
+        END
+    """)
+
+    # 为已有章节建立索引
+    cursor.execute("INSERT INTO chapters_fts (chapters_fts) VALUES ('rebuild')")
+
+def _add_version_delta_columns(cursor: sqlite3.Cursor):
+    """章节版本支持增量存储
+
+    delta 为空的版本是关键帧，content 保存全文；
+    否则 content 为空，delta 保存相对 base_id 版本的差异。已有版本都是关键帧。
+    """
+    if not _column_exists(cursor, 'chapter_versions', 'delta'):
+        cursor.execute("ALTER TABLE chapter_versions ADD COLUMN delta TEXT")
+    if not _column_exists(cursor, 'chapter_versions', 'base_id'):
+        cursor.execute("ALTER TABLE chapter_versions ADD COLUMN base_id INTEGER")
+
+def _add_content_hashes(cursor: sqlite3.Cursor):
+    """章节和版本记录内容哈希，用于跳过未变化的保存和复用相同版本
+
+    已有章节在此补算哈希；已有版本保持为空，只是不参与去重。
+    """
+    if not _column_exists(cursor, 'chapters', 'content_hash'):
+        cursor.execute("ALTER TABLE chapters ADD COLUMN content_hash TEXT")
+    if not _column_exists(cursor, 'chapter_versions', 'content_hash'):
+        cursor.execute("ALTER TABLE chapter_versions ADD COLUMN content_hash TEXT")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chapter_versions_chapter_hash
+        ON chapter_versions (chapter_id, content_hash)
+    """)
+
+    # 分批读取正文补算哈希，与 delta.content_hash 的算法保持一致
+    reader = cursor.connection.cursor()
+    reader.execute("SELECT id, content FROM chapters WHERE content_hash IS NULL")
+    while True:
+        rows = reader.fetchmany(200)
+        if not rows:
+            break
+        cursor.executemany(
+            "UPDATE chapters SET content_hash = ? WHERE id = ?",
+            [(hashlib.sha256((row[1] or "").encode("utf-8")).hexdigest(), row[0]) for row in rows]
+        )
+    reader.close()
+
+def _add_version_sizes(cursor: sqlite3.Cursor):
+    """版本记录全文长度，列出版本历史时不必还原内容
+    
+    同时按 (chapter_id, id) 建索引，用于按ID分页列出版本。
+    已有版本按章节依次还原全文补算长度。
+    """
+    if not _column_exists(cursor, 'chapter_versions', 'content_size'):
+        cursor.execute("ALTER TABLE chapter_versions ADD COLUMN content_size INTEGER")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chapter_versions_chapter_id
+        ON chapter_versions (chapter_id, id)
+    """)
+    
+    reader = cursor.connection.cursor()
+    reader.execute("""
+        SELECT id, chapter_id, content, delta, base_id
+        FROM chapter_versions
+        ORDER BY chapter_id, id
+    """)
+    contents: Dict[int, str] = {}
+    current_chapter = None
+    while True:
+        rows = reader.fetchmany(200)
+        if not rows:
+            break
+        sizes = []
+        for version_id, chapter_id, content, delta, base_id in rows:
+            if chapter_id != current_chapter:
+                contents.clear()
+                current_chapter = chapter_id
+            if delta is None:
+                contents[version_id] = content or ""
+            elif base_id in contents:
+                contents[version_id] = apply_delta(contents[base_id], delta)
+            else:
+                # 基准版本缺失，无法还原，长度保持为空
+                continue
+            sizes.append((len(contents[version_id]), version_id))
+        cursor.executemany("UPDATE chapter_versions SET content_size = ? WHERE id = ?", sizes)
+    reader.close()
+
+def _create_extraction_state(cursor: sqlite3.Cursor):
+    """记录每个章节已提取过角色的段落哈希，自动保存时只提取新增或修改的段落"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chapter_extraction_state (
+            chapter_id INTEGER NOT NULL,
+            paragraph_hash TEXT NOT NULL,
+            PRIMARY KEY (chapter_id, paragraph_hash),
+            FOREIGN KEY (chapter_id) REFERENCES chapters(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+
+def _create_summary_nodes(cursor: sqlite3.Cursor):
+    """创建分层摘要节点表
+
+    level 1 为情节段，2 为卷，更高层依次向上汇总；source_hash 是生成时所覆盖章节摘要的哈希，
+    与当前章节摘要的哈希不一致时节点需要重新生成。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS summary_nodes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            novel_id INTEGER NOT NULL,
+            level INTEGER NOT NULL,
+            start_chapter INTEGER NOT NULL,
+            end_chapter INTEGER NOT NULL,
+            summary TEXT NOT NULL,
+            source_hash TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (novel_id, level, start_chapter, end_chapter),
+            FOREIGN KEY (novel_id) REFERENCES novels(id) ON DELETE CASCADE
+        )
+    """)
+
+def _add_summary_hashes(cursor: sqlite3.Cursor):
+    """章节记录生成摘要时正文的哈希，正文修改后可以找出过期的摘要
+
+    已有的摘要视为与当前正文一致。
+    """
+    if not _column_exists(cursor, 'chapters', 'summary_hash'):
+        cursor.execute("ALTER TABLE chapters ADD COLUMN summary_hash TEXT")
+    cursor.execute("""
+        UPDATE chapters SET summary_hash = content_hash
+        WHERE summary IS NOT NULL AND summary != ''
+    """)
+
+def _create_jobs(cursor: sqlite3.Cursor):
+    """创建后台任务表
+
+    status 为 pending / running / done / failed / cancelled；run_after 是最早
+    可以执行的时间（Unix 时间戳），用于重试退避。同一 dedup_key 最多只有一个
+    排队中的任务，再次提交时合并到已有任务。
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            dedup_key TEXT,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after REAL NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_queue
+        ON jobs (status, priority DESC, id)
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup
+        ON jobs (dedup_key) WHERE dedup_key IS NOT NULL AND status = 'pending'
+    """)
+
+# 按版本号顺序排列，只能在末尾追加，已发布的迁移不能修改
+def _add_cast_versions(cursor: sqlite3.Cursor):
+    """小说记录角色名单的版本号
+
+    角色增删或改名时由触发器递增，缓存角色名的地方只需比较版本号就能判断名单是否变化，
+    不论角色是通过模型还是数据库管理器修改的。
+    """
+    if not _column_exists(cursor, 'novels', 'cast_version'):
+        cursor.execute("ALTER TABLE novels ADD COLUMN cast_version INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS characters_cast_insert AFTER INSERT ON characters BEGIN
+            UPDATE novels SET cast_version = cast_version + 1 WHERE id = new.novel_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS characters_cast_delete AFTER DELETE ON characters BEGIN
+            UPDATE novels SET cast_version = cast_version + 1 WHERE id = old.novel_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS characters_cast_update
+        AFTER UPDATE OF novel_id, name ON characters BEGIN
+            UPDATE novels SET cast_version = cast_version + 1 WHERE id IN (old.novel_id, new.novel_id);
+        END
+    """)
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "创建基础表结构", _create_base_tables),
+    Migration(2, "小说表添加大纲和当前章节字段", _add_novel_progress_columns),
+    Migration(3, "创建章节版本历史表", _create_chapter_versions),
+    Migration(4, "创建查询索引", _create_lookup_indexes),
+    Migration(5, "关系类型去重并添加唯一索引", _unique_relationship_types),
+    Migration(6, "创建章节全文索引", _create_chapter_search_index),
+    Migration(7, "章节版本支持增量存储", _add_version_delta_columns),
+    Migration(8, "章节和版本记录内容哈希", _add_content_hashes),
+    Migration(9, "版本记录全文长度并添加分页索引", _add_version_sizes),
+    Migration(10, "创建角色提取进度表", _create_extraction_state),
+    Migration(11, "创建分层摘要节点表", _create_summary_nodes),
+    Migration(12, "章节记录摘要对应的正文哈希", _add_summary_hashes),
+    Migration(13, "创建后台任务表", _create_jobs),
+    Migration(14, "小说记录角色名单版本", _add_cast_versions),
+]
@@ -1,113 +1,217 @@
 import sqlite3
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import threading
+import itertools
+import weakref
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Union
 from datetime import datetime
+from .migrations import MIGRATIONS
+from .profiles import PerformanceProfile, resolve_profile, apply_profile, read_settings
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+class _ConnectionHolder:
+    """保存在线程局部存储中的连接
+
+    线程结束时线程局部存储被清理，holder 被回收，登记的 finalize 回调关闭连接，
+    不需要线程在退出前显式释放。
+    """
+    __slots__ = ("key", "conn", "__weakref__")
+
+    def __init__(self, key: int, conn: sqlite3.Connection):
+        self.key = key
+        self.conn = conn
+
+def _discard_connection(manager_ref, key: int, conn: sqlite3.Connection):
+    """线程结束后关闭它的连接，连接已被 close 或 set_profile 关闭时跳过"""
+    manager = manager_ref()
+    if manager is not None:
+        with manager._lock:
+            if manager._connections.pop(key, None) is None:
+                return
+    try:
+        conn.close()
+    except Exception as e:
+        logger.error(f"关闭数据库连接失败: {e}")
+
 class DatabaseManager:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, profile: Union[str, PerformanceProfile, None] = None):
         """初始化数据库管理器
         
         Args:
             db_path: 数据库文件路径
+            profile: 性能配置名称（interactive / bulk_import / readonly_export）
+                或 PerformanceProfile 实例，默认 interactive
         """
         self.db_path = db_path
-        logger.info(f"数据库管理器初始化: {db_path}")
+        self.profile = resolve_profile(profile)
+        # 所有线程的连接，键为连接编号；各线程通过 _local.holder 取得自己的连接。
+        # 不使用线程ID作为键，线程ID在线程结束后可能被新线程复用
+        self._connections: Dict[int, sqlite3.Connection] = {}
+        self._keys = itertools.count(1)
+        self._lock = threading.Lock()
+        # 每个线程的连接和当前的事务嵌套深度
+        self._local = threading.local()
+        logger.info(f"数据库管理器初始化: {db_path}, 性能配置: {self.profile.name}")
         
     def get_connection(self) -> sqlite3.Connection:
-        """获取数据库连接"""
+        """获取当前线程的数据库连接
+        
+        连接在线程首次访问时创建并完成配置，之后在该线程内复用，
+        直到调用 release_connection、close 或线程结束。
+        
+        Returns:
+            当前线程专属的数据库连接
+        """
+        holder = getattr(self._local, 'holder', None)
+        # 已被 close 或 set_profile 关闭的连接不再登记，需要重新创建
+        if holder is not None and holder.key in self._connections:
+            return holder.conn
+            
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+            # 连接只在创建它的线程中使用，关闭时可能由其他线程统一处理
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._configure_connection(conn)
         except Exception as e:
             logger.error(f"数据库连接失败: {e}")
             raise
             
+        key = next(self._keys)
+        with self._lock:
+            self._connections[key] = conn
+        holder = _ConnectionHolder(key, conn)
+        weakref.finalize(holder, _discard_connection, weakref.ref(self), key, conn)
+        self._local.holder = holder
+        logger.info(f"创建数据库连接: 线程={threading.current_thread().name}, 当前连接数={len(self._connections)}")
+        return conn
+        
+    def _configure_connection(self, conn: sqlite3.Connection):
+        """配置新建的连接，每个连接只执行一次"""
+        conn.row_factory = sqlite3.Row
+        # 只对还没有建表的新数据库生效（需在切换 WAL 之前设置），
+        # 已有的数据库由 reclaim_space(full=True) 执行一次 VACUUM 后切换
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        apply_profile(conn, self.profile)
+        
+    def set_profile(self, profile: Union[str, PerformanceProfile]):
+        """切换性能配置
+        
+        当前线程的连接立即应用新配置；其他线程的连接被关闭，
+        下次访问时按新配置重新创建。应在没有其他线程访问数据库时调用。
+        
+        Args:
+            profile: 配置名称或 PerformanceProfile 实例
+        """
+        self.profile = resolve_profile(profile)
+        
+        holder = getattr(self._local, 'holder', None)
+        with self._lock:
+            current = self._connections.get(holder.key) if holder is not None else None
+            others = [conn for key, conn in self._connections.items() if conn is not current]
+            self._connections = {holder.key: current} if current is not None else {}
+            
+        for conn in others:
+            conn.close()
+        if current is not None:
+            apply_profile(current, self.profile)
+        logger.info(f"性能配置已切换: {self.profile.name}")
+        
+    def get_active_settings(self) -> Dict[str, Any]:
+        """获取当前线程连接上实际生效的性能设置
+        
+        Returns:
+            包含 profile 名称和各 PRAGMA 当前值的字典
+        """
+        settings = read_settings(self.get_connection())
+        settings["profile"] = self.profile.name
+        return settings
+        
+    def release_connection(self):
+        """关闭并释放当前线程的连接
+        
+        线程结束时连接会自动关闭；长期运行的后台线程在不再访问数据库时
+        可以调用此方法提前释放。
+        """
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            return
+        self._local.holder = None
+        with self._lock:
+            conn = self._connections.pop(holder.key, None)
+        if conn is not None:
+            conn.close()
+            
+    def close(self):
+        """关闭所有线程的连接，在程序退出时调用"""
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+            
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logger.error(f"关闭数据库连接失败: {e}")
+        logger.info(f"数据库连接已全部关闭，共{len(connections)}个")
+            
+    def in_transaction(self) -> bool:
+        """当前线程是否处于 transaction() 块中"""
+        return getattr(self._local, 'tx_depth', 0) > 0
+        
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        """开启一个事务，块内的所有写操作只提交一次
+        
+        块正常结束时提交，抛出异常时整体回滚。嵌套调用使用 SAVEPOINT，
+        内层失败只回滚内层的修改。
+        
+        Args:
+            immediate: 开始时立即获取写锁（BEGIN IMMEDIATE），用于先读后写、
+                不能被其他连接插入写操作的场景；嵌套调用时忽略
+        
+        用法：
+            with db.transaction():
+                db.execute_query("DELETE FROM chapter_versions WHERE chapter_id = ?", (1,))
+                db.execute_query("DELETE FROM chapters WHERE id = ?", (1,))
+                
+        Yields:
+            当前线程的数据库连接
+        """
+        conn = self.get_connection()
+        depth = getattr(self._local, 'tx_depth', 0)
+        savepoint = f"sp_{depth}"
+        
+        if depth == 0:
+            conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        else:
+            conn.execute(f"SAVEPOINT {savepoint}")
+        self._local.tx_depth = depth + 1
+        
+        try:
+            yield conn
+        except BaseException:
+            if depth == 0:
+                conn.rollback()
+                logger.warning("事务已回滚")
+            else:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+            raise
+        else:
+            if depth == 0:
+                conn.commit()
+            else:
+                conn.execute(f"RELEASE {savepoint}")
+        finally:
+            self._local.tx_depth = depth
+            
     def init_database(self):
-        """初始化数据库表结构"""
+        """初始化数据库：升级表结构并写入预定义数据"""
         try:
             logger.info("开始初始化数据库...")
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            
-            # 创建小说表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS novels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    title TEXT NOT NULL,
-                    author TEXT,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # 创建章节表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS chapters (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    novel_id INTEGER NOT NULL,
-                    chapter_number INTEGER NOT NULL,
-                    title TEXT NOT NULL,
-                    content TEXT,
-                    summary TEXT,
-                    outline TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (novel_id) REFERENCES novels(id) ON DELETE CASCADE
-                )
-            """)
-            
-            # 创建角色表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS characters (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    novel_id INTEGER NOT NULL,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    characteristics TEXT,
-                    role_type TEXT,
-                    first_appearance INTEGER,
-                    status TEXT DEFAULT '活跃',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (novel_id) REFERENCES novels(id) ON DELETE CASCADE,
-                    FOREIGN KEY (first_appearance) REFERENCES chapters(id) ON DELETE SET NULL
-                )
-            """)
-            
-            # 创建角色关系表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS character_relationships (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    novel_id INTEGER NOT NULL,
-                    character1_id INTEGER NOT NULL,
-                    character2_id INTEGER NOT NULL,
-                    relationship_type TEXT NOT NULL,
-                    description TEXT,
-                    start_chapter INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (novel_id) REFERENCES novels(id) ON DELETE CASCADE,
-                    FOREIGN KEY (character1_id) REFERENCES characters(id) ON DELETE CASCADE,
-                    FOREIGN KEY (character2_id) REFERENCES characters(id) ON DELETE CASCADE,
-                    FOREIGN KEY (start_chapter) REFERENCES chapters(id) ON DELETE SET NULL
-                )
-            """)
-            
-            # 创建关系类型表
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS relationship_types (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    category TEXT NOT NULL,
-                    type TEXT NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            self.migrate()
             
             # 插入预定义的关系类型
             predefined_types = [
@@ -130,20 +234,117 @@ class DatabaseManager:
                 ('职场', '同事', '工作中的平级关系')
             ]
             
-            cursor.executemany("""
-                INSERT OR IGNORE INTO relationship_types (category, type, description)
-                VALUES (?, ?, ?)
-            """, predefined_types)
-            
-            conn.commit()
+            with self.transaction() as conn:
+                conn.executemany("""
+                    INSERT OR IGNORE INTO relationship_types (category, type, description)
+                    VALUES (?, ?, ?)
+                """, predefined_types)
+                
             logger.info("数据库初始化成功")
             
         except Exception as e:
             logger.error(f"数据库初始化失败: {e}")
             raise
-        finally:
-            conn.close()
             
+    def get_schema_version(self) -> int:
+        """获取当前数据库的结构版本（PRAGMA user_version）"""
+        return self.get_connection().execute("PRAGMA user_version").fetchone()[0]
+        
+    def migrate(self) -> int:
+        """按顺序执行尚未应用的迁移
+        
+        每个迁移在独立事务中执行并同时更新 user_version，
+        中途失败时已完成的迁移保留，失败的迁移整体回滚。
+        
+        Returns:
+            迁移后的结构版本
+        """
+        current = self.get_schema_version()
+        pending = [m for m in MIGRATIONS if m.version > current]
+        if not pending:
+            logger.info(f"数据库结构已是最新版本: {current}")
+            return current
+            
+        for migration in pending:
+            try:
+                with self.transaction() as conn:
+                    cursor = conn.cursor()
+                    migration.apply(cursor)
+                    # PRAGMA 不支持参数绑定，version 来自代码中的常量
+                    cursor.execute(f"PRAGMA user_version = {int(migration.version)}")
+                logger.info(f"数据库迁移完成: v{migration.version} {migration.description}")
+            except Exception as e:
+                logger.error(f"数据库迁移失败: v{migration.version} {migration.description} - {e}")
+                raise
+                
+        return pending[-1].version
+
+    def get_space_usage(self) -> Dict[str, Any]:
+        """获取数据库文件的空间占用
+
+        Returns:
+            包含以下字段的字典：
+                - page_size: 页大小（字节）
+                - page_count: 总页数
+                - freelist_count: 空闲页数
+                - total_bytes: 文件大小
+                - free_bytes: 空闲页占用的大小，可通过 reclaim_space 回收
+                - incremental: 是否已开启增量回收，未开启时需要一次完整的 VACUUM
+        """
+        conn = self.get_connection()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        return {
+            "page_size": page_size,
+            "page_count": page_count,
+            "freelist_count": freelist_count,
+            "total_bytes": page_size * page_count,
+            "free_bytes": page_size * freelist_count,
+            "incremental": auto_vacuum == 2
+        }
+
+    def reclaim_space(self, full: bool = False) -> int:
+        """回收删除数据后留下的空闲页
+
+        auto_vacuum 为 INCREMENTAL 时执行 incremental_vacuum，只截断空闲页，开销很小。
+        否则只有 full 为 True 时才执行 VACUUM 重写整个文件，并顺带切换到
+        INCREMENTAL 模式，之后的回收都走增量方式。
+
+        Args:
+            full: 是否允许执行完整的 VACUUM
+
+        Returns:
+            回收的字节数
+        """
+        if self.in_transaction():
+            raise RuntimeError("不能在事务中回收数据库空间")
+
+        try:
+            conn = self.get_connection()
+            before = self.get_space_usage()["total_bytes"]
+
+            auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if auto_vacuum == 2:  # INCREMENTAL
+                # execute 只执行一步（释放一页），executescript 会执行到结束
+                conn.executescript("PRAGMA incremental_vacuum;")
+            elif full:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            else:
+                return 0
+            # WAL 模式下截断先写入 WAL，检查点后数据库文件才会真正变小
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+            reclaimed = max(before - self.get_space_usage()["total_bytes"], 0)
+            logger.info(f"数据库空间回收完成: {reclaimed}字节")
+            return reclaimed
+
+        except Exception as e:
+            logger.error(f"数据库空间回收失败: {e}")
+            raise
+
     def execute_query(self, query: str, params: tuple = ()) -> List[tuple]:
         """执行SQL查询
         
@@ -154,24 +355,57 @@ class DatabaseManager:
         Returns:
             查询结果列表
         """
+        conn = self.get_connection()
         try:
-            conn = self.get_connection()
             cursor = conn.cursor()
             cursor.execute(query, params)
             
             if query.strip().upper().startswith(('INSERT', 'UPDATE', 'DELETE')):
-                conn.commit()
+                # 事务块内的写操作由 transaction() 统一提交
+                if not self.in_transaction():
+                    conn.commit()
                 result = cursor.lastrowid if cursor.lastrowid else True
             else:
                 result = cursor.fetchall()
                 
             return result
             
+        except Exception as e:
+            # 连接会被复用，失败的写操作不能遗留未结束的事务；
+            # 事务块内的失败交给 transaction() 回滚
+            if not self.in_transaction():
+                conn.rollback()
+            logger.error(f"SQL执行失败: {query} - {e}")
+            raise
+            
+    def iter_query(self, query: str, params: tuple = (), arraysize: int = 100) -> Iterator[sqlite3.Row]:
+        """逐行执行查询，按批从数据库读取结果
+        
+        与 execute_query 不同，结果不会一次性全部载入内存，
+        适合导出、批量处理等需要遍历大量行的场景。
+        
+        Args:
+            query: SQL查询语句
+            params: 查询参数
+            arraysize: 每批从数据库读取的行数
+            
+        Yields:
+            查询结果行
+        """
+        cursor = self.get_connection().cursor()
+        cursor.arraysize = arraysize
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                yield from rows
         except Exception as e:
             logger.error(f"SQL执行失败: {query} - {e}")
             raise
         finally:
-            conn.close()
+            cursor.close()
             
     def get_table_structure(self, table_name: str) -> List[str]:
         """获取表结构
@@ -183,8 +417,7 @@ class DatabaseManager:
             字段名列表
         """
         try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
+            cursor = self.get_connection().cursor()
             cursor.execute(f"PRAGMA table_info({table_name})")
             columns = [row[1] for row in cursor.fetchall()]
             logger.info(f"获取表结构成功: {table_name}")
@@ -193,8 +426,6 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"获取表结构失败: {table_name} - {e}")
             raise
-        finally:
-            conn.close()
             
     def insert_record(self, table_name: str, data: Dict[str, Any]) -> int:
         """插入记录
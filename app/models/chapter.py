@@ -1,10 +1,18 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator
 from datetime import datetime
 from ..database.sqlite import DatabaseManager
+from ..core.delta import make_delta, apply_delta, content_hash
 import json
 import logging
 
 class Chapter:
+    # list_by_novel 可选择的字段，正文只能通过 get 按需加载
+    LIST_FIELDS = ("id", "novel_id", "chapter_number", "title", "summary", "outline", "created_at")
+    DEFAULT_LIST_FIELDS = ("id", "novel_id", "chapter_number", "title", "created_at")
+    
+    # 版本链每隔多少个版本保存一次全文关键帧，其余版本只保存与上一版本的差异
+    KEYFRAME_INTERVAL = 20
+    
     def __init__(self, db_manager: DatabaseManager):
         """初始化章节模型
         
@@ -61,6 +69,86 @@ class Chapter:
             logging.error(f"获取小说章节列表失败: {e}")
             raise
         
+    def list_by_novel(self, novel_id: int, fields: Optional[List[str]] = None,
+                      before_chapter: Optional[int] = None, descending: bool = False) -> List[Dict]:
+        """按章节号顺序列出小说的章节元数据，不读取正文
+        
+        Args:
+            novel_id: 小说ID
+            fields: 要返回的字段，取值见 LIST_FIELDS，默认只返回元数据
+            before_chapter: 只返回此章节号之前的章节
+            descending: 按章节号倒序排列，与 get_by_novel 的顺序一致
+            
+        Returns:
+            章节列表，每项只包含 fields 中的字段
+        """
+        try:
+            fields = list(fields or self.DEFAULT_LIST_FIELDS)
+            invalid = [f for f in fields if f not in self.LIST_FIELDS]
+            if invalid:
+                raise ValueError(f"不支持的章节字段: {', '.join(invalid)}")
+                
+            query = f"""
+                SELECT {', '.join(fields)}
+                FROM chapters
+                WHERE novel_id = ?
+            """
+            params = [novel_id]
+            
+            if before_chapter is not None:
+                query += " AND chapter_number < ?"
+                params.append(before_chapter)
+                
+            query += " ORDER BY chapter_number DESC" if descending else " ORDER BY chapter_number"
+            
+            result = self.db.execute_query(query, tuple(params))
+            chapters = [dict(zip(fields, row)) for row in result] if result else []
+            
+            logging.info(f"获取章节元数据成功: novel_id={novel_id}, 字段={fields}, 共{len(chapters)}章")
+            return chapters
+            
+        except Exception as e:
+            logging.error(f"获取章节元数据失败: {e}")
+            raise
+            
+    def get_max_chapter_number(self, novel_id: int) -> int:
+        """获取小说当前最大的章节号，没有章节时返回0"""
+        result = self.db.execute_query(
+            "SELECT MAX(chapter_number) FROM chapters WHERE novel_id = ?",
+            (novel_id,)
+        )
+        return result[0][0] if result and result[0][0] else 0
+        
+    def iter_by_novel(self, novel_id: int, arraysize: int = 50) -> Iterator[Dict]:
+        """按章节号顺序逐章遍历小说的完整章节
+        
+        每次只在内存中保留一批章节，适合导出整本小说或批量处理。
+        
+        Args:
+            novel_id: 小说ID
+            arraysize: 每批从数据库读取的章节数
+            
+        Yields:
+            章节信息字典，包含正文和大纲
+        """
+        query = """
+            SELECT id, novel_id, chapter_number, title, content, summary, outline, created_at
+            FROM chapters
+            WHERE novel_id = ?
+            ORDER BY chapter_number
+        """
+        for row in self.db.iter_query(query, (novel_id,), arraysize=arraysize):
+            yield {
+                "id": row[0],
+                "novel_id": row[1],
+                "chapter_number": row[2],
+                "title": row[3],
+                "content": row[4],
+                "summary": row[5],
+                "outline": row[6],
+                "created_at": row[7]
+            }
+        
     def create(self, novel_id: int, chapter_number: int, title: str,
                content: str = "", summary: str = "") -> int:
         """创建新章节
@@ -89,23 +177,26 @@ class Chapter:
                 raise ValueError(f"小说ID {novel_id} 不存在")
             
             query = """
-                INSERT INTO chapters (novel_id, chapter_number, title, content, summary)
-                VALUES (?, ?, ?, ?, ?)
+                INSERT INTO chapters (novel_id, chapter_number, title, content, summary, content_hash, summary_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
             """
-            result = self.db.execute_query(
-                query, 
-                (novel_id, chapter_number, title, content, summary)
-            )
-            
-            if not result:
-                raise ValueError("创建章节失败")
+            digest = content_hash(content)
+            with self.db.transaction():
+                result = self.db.execute_query(
+                    query, 
+                    (novel_id, chapter_number, title, content, summary, digest, digest if summary else None)
+                )
+                
+                if not result:
+                    raise ValueError("创建章节失败")
+                    
+                chapter_id = result
+                
+                # 创建初始版本
+                self._create_version(chapter_id, content, "初始版本")
                 
-            chapter_id = result[0][0]
             logging.info(f"创建章节成功，ID: {chapter_id}")
             
-            # 创建初始版本
-            self._create_version(chapter_id, content, "初始版本")
-            
             return chapter_id
             
         except Exception as e:
@@ -152,12 +243,14 @@ class Chapter:
     def update(self, chapter_id: int, **kwargs) -> bool:
         """更新章节信息
         
+        正文与当前内容相同时不会创建版本，也不会改写正文。
+        
         Args:
             chapter_id: 章节ID
             **kwargs: 要更新的字段和值
             
         Returns:
-            是否更新成功
+            是否有字段被更新，没有需要更新的内容时返回 False
         """
         try:
             # 检查章节是否存在
@@ -165,15 +258,24 @@ class Chapter:
             if not chapter_info:
                 raise ValueError(f"章节不存在: {chapter_id}")
             
-            # 如果要更新内容，先创建新版本
+            # 正文未变化时跳过正文的版本和更新
             if "content" in kwargs:
-                self._create_version(chapter_id, chapter_info["content"], "自动保存")
+                new_hash = content_hash(kwargs["content"])
+                if new_hash == content_hash(chapter_info["content"]):
+                    kwargs = {k: v for k, v in kwargs.items() if k != "content"}
+                    logging.info(f"章节内容未变化，跳过保存正文: {chapter_id}")
+                else:
+                    kwargs["content_hash"] = new_hash
+            
+            # 没有指定摘要对应的正文时，认为摘要与更新后的正文一致
+            if "summary" in kwargs and "summary_hash" not in kwargs:
+                kwargs["summary_hash"] = kwargs.get("content_hash") or content_hash(chapter_info["content"])
             
             # 构建更新语句
             fields = []
             values = []
             for key, value in kwargs.items():
-                if key in ["title", "content", "summary"]:
+                if key in ["title", "content", "summary", "content_hash", "summary_hash"]:
                     fields.append(f"{key} = ?")
                     values.append(value)
                     
@@ -187,7 +289,12 @@ class Chapter:
             """
             values.append(chapter_id)
             
-            self.db.execute_query(query, tuple(values))
+            with self.db.transaction():
+                # 如果要更新内容，先创建新版本
+                if "content" in kwargs:
+                    self._create_version(chapter_id, chapter_info["content"], "自动保存")
+                    
+                self.db.execute_query(query, tuple(values))
             logging.info(f"更新章节成功: {chapter_id}")
             return True
             
@@ -195,6 +302,30 @@ class Chapter:
             logging.error(f"更新章节失败: {e}")
             raise
             
+    def is_content_unchanged(self, chapter_id: int, content: str) -> bool:
+        """判断正文是否与数据库中保存的内容相同，只比较哈希
+        
+        Args:
+            chapter_id: 章节ID
+            content: 待保存的正文
+            
+        Returns:
+            内容相同返回 True，章节不存在或内容不同返回 False
+        """
+        result = self.db.execute_query(
+            "SELECT content_hash FROM chapters WHERE id = ?",
+            (chapter_id,)
+        )
+        if not result:
+            return False
+            
+        stored_hash = result[0][0]
+        if stored_hash is None:
+            # 哈希缺失时按正文补算
+            chapter_info = self.get(chapter_id)
+            stored_hash = content_hash(chapter_info["content"])
+        return stored_hash == content_hash(content)
+        
     def delete(self, chapter_id: int) -> bool:
         """删除章节
         
@@ -209,17 +340,22 @@ class Chapter:
             if not self.get(chapter_id):
                 raise ValueError(f"章节不存在: {chapter_id}")
             
-            # 删除版本历史
-            self.db.execute_query(
-                "DELETE FROM chapter_versions WHERE chapter_id = ?",
-                (chapter_id,)
-            )
-            
-            # 删除章节
-            self.db.execute_query(
-                "DELETE FROM chapters WHERE id = ?",
-                (chapter_id,)
-            )
+            with self.db.transaction():
+                # 删除版本历史和角色提取进度
+                self.db.execute_query(
+                    "DELETE FROM chapter_versions WHERE chapter_id = ?",
+                    (chapter_id,)
+                )
+                self.db.execute_query(
+                    "DELETE FROM chapter_extraction_state WHERE chapter_id = ?",
+                    (chapter_id,)
+                )
+                
+                # 删除章节
+                self.db.execute_query(
+                    "DELETE FROM chapters WHERE id = ?",
+                    (chapter_id,)
+                )
             logging.info(f"删除章节成功: {chapter_id}")
             return True
             
@@ -238,23 +374,24 @@ class Chapter:
         """
         try:
             # 检查章节是否存在
-            if not self.get(chapter_id):
+            if not self._chapter_id_exists(chapter_id):
                 raise ValueError(f"章节不存在: {chapter_id}")
             
             query = """
-                SELECT id, content, comment, created_at
+                SELECT id, content, delta, base_id, comment, created_at
                 FROM chapter_versions
                 WHERE chapter_id = ?
-                ORDER BY created_at DESC
+                ORDER BY id
             """
             result = self.db.execute_query(query, (chapter_id,))
+            contents = self._materialize_versions(result) if result else {}
             
             versions = [{
                 "id": row[0],
-                "content": row[1],
-                "comment": row[2],
-                "created_at": row[3]
-            } for row in result] if result else []
+                "content": contents[row[0]],
+                "comment": row[4],
+                "created_at": row[5]
+            } for row in reversed(result)] if result else []
             
             logging.info(f"获取版本历史成功: {chapter_id}, 共{len(versions)}个版本")
             return versions
@@ -263,6 +400,70 @@ class Chapter:
             logging.error(f"获取版本历史失败: {e}")
             raise
             
+    def list_versions(self, chapter_id: int, limit: int = 50, before_id: Optional[int] = None) -> List[Dict]:
+        """分页列出章节的版本，只返回元数据，不还原内容
+        
+        按ID从新到旧排列。下一页以本页最后一项的 id 作为 before_id，
+        翻页时新增的版本不会导致结果重复或遗漏。
+        
+        Args:
+            chapter_id: 章节ID
+            limit: 每页数量
+            before_id: 只返回ID小于此值的版本
+            
+        Returns:
+            版本列表，每项包含：
+                - id: 版本ID
+                - comment: 版本说明
+                - created_at: 创建时间
+                - size: 全文长度（字符数），无法还原的旧版本为 None
+                - stored_size: 实际存储的长度，增量版本为增量的长度
+                - is_keyframe: 是否保存全文
+        """
+        try:
+            if not self._chapter_id_exists(chapter_id):
+                raise ValueError(f"章节不存在: {chapter_id}")
+                
+            query = """
+                SELECT id, comment, created_at, content_size,
+                       length(coalesce(content, delta, '')), delta IS NULL
+                FROM chapter_versions
+                WHERE chapter_id = ? AND id < ?
+                ORDER BY id DESC
+                LIMIT ?
+            """
+            # SQLite 整数上限，省略 before_id 时从最新的版本开始
+            cursor_id = before_id if before_id is not None else 2 ** 63 - 1
+            result = self.db.execute_query(query, (chapter_id, cursor_id, limit))
+            
+            return [{
+                "id": row[0],
+                "comment": row[1],
+                "created_at": row[2],
+                "size": row[3],
+                "stored_size": row[4],
+                "is_keyframe": bool(row[5])
+            } for row in result] if result else []
+            
+        except Exception as e:
+            logging.error(f"列出版本失败: {e}")
+            raise
+            
+    def get_version_content(self, version_id: int) -> Optional[str]:
+        """还原指定版本的全文
+        
+        Args:
+            version_id: 版本ID
+            
+        Returns:
+            版本全文
+        """
+        try:
+            return self._reconstruct_version(version_id)
+        except Exception as e:
+            logging.error(f"获取版本内容失败: {e}")
+            raise
+            
     def restore_version(self, version_id: int) -> bool:
         """恢复到指定版本
         
@@ -274,17 +475,16 @@ class Chapter:
         """
         try:
             # 获取版本信息
-            query = """
-                SELECT chapter_id, content
-                FROM chapter_versions
-                WHERE id = ?
-            """
-            result = self.db.execute_query(query, (version_id,))
+            result = self.db.execute_query(
+                "SELECT chapter_id FROM chapter_versions WHERE id = ?",
+                (version_id,)
+            )
             
             if not result:
                 raise ValueError(f"版本不存在: {version_id}")
                 
-            chapter_id, content = result[0]
+            chapter_id = result[0][0]
+            content = self._reconstruct_version(version_id)
             
             # 更新章节内容
             success = self.update(chapter_id, content=content)
@@ -296,6 +496,11 @@ class Chapter:
             logging.error(f"恢复版本失败: {e}")
             raise
             
+    def _chapter_id_exists(self, chapter_id: int) -> bool:
+        """检查章节是否存在，不读取正文"""
+        result = self.db.execute_query("SELECT 1 FROM chapters WHERE id = ?", (chapter_id,))
+        return bool(result)
+        
     def _chapter_exists(self, novel_id: int, chapter_number: int) -> bool:
         """检查章节号是否已存在"""
         query = """
@@ -305,11 +510,225 @@ class Chapter:
         result = self.db.execute_query(query, (novel_id, chapter_number))
         return bool(result)
         
-    def _create_version(self, chapter_id: int, content: str, comment: str):
-        """创建新版本"""
+    def compact_versions(self, chapter_id: int) -> int:
+        """将章节已有的全文版本重新编码为关键帧加增量
+        
+        用于压缩升级前保存的版本历史，内容不变。
+        
+        Args:
+            chapter_id: 章节ID
+            
+        Returns:
+            改为增量存储的版本数
+        """
+        try:
+            with self.db.transaction():
+                result = self.db.execute_query("""
+                    SELECT id, content, delta, base_id
+                    FROM chapter_versions
+                    WHERE chapter_id = ?
+                    ORDER BY id
+                """, (chapter_id,))
+                if not result:
+                    return 0
+                    
+                contents = self._materialize_versions(result)
+                compacted = self._rewrite_versions([row[0] for row in result], contents)
+                    
+            logging.info(f"压缩版本历史成功: {chapter_id}, {compacted}/{len(result)}个版本改为增量存储")
+            return compacted
+            
+        except Exception as e:
+            logging.error(f"压缩版本历史失败: {e}")
+            raise
+            
+    def prune_versions(self, chapter_id: int, version_ids: List[int]) -> int:
+        """删除章节的指定版本，其余版本内容不变
+        
+        被删除的版本可能是其他版本的增量基准，因此先还原全部版本，
+        删除后再把剩余版本重新编码为新的版本链。
+        
+        Args:
+            chapter_id: 章节ID
+            version_ids: 要删除的版本ID
+            
+        Returns:
+            实际删除的版本数
+        """
+        if not version_ids:
+            return 0
+            
+        try:
+            # 立即获取写锁，避免还原版本后被其他连接插入新版本
+            with self.db.transaction(immediate=True):
+                result = self.db.execute_query("""
+                    SELECT id, content, delta, base_id
+                    FROM chapter_versions
+                    WHERE chapter_id = ?
+                    ORDER BY id
+                """, (chapter_id,))
+                if not result:
+                    return 0
+                    
+                contents = self._materialize_versions(result)
+                to_delete = set(version_ids) & set(contents)
+                if not to_delete:
+                    return 0
+                    
+                placeholders = ", ".join("?" for _ in to_delete)
+                self.db.execute_query(
+                    f"DELETE FROM chapter_versions WHERE id IN ({placeholders})",
+                    tuple(to_delete)
+                )
+                survivors = [row[0] for row in result if row[0] not in to_delete]
+                self._rewrite_versions(survivors, contents)
+                
+            logging.info(f"清理版本成功: {chapter_id}, 删除{len(to_delete)}个版本")
+            return len(to_delete)
+            
+        except Exception as e:
+            logging.error(f"清理版本失败: {e}")
+            raise
+            
+    def _rewrite_versions(self, version_ids: List[int], contents: Dict[int, Optional[str]]) -> int:
+        """按ID顺序把一组版本重新编码为关键帧加增量的版本链
+        
+        Args:
+            version_ids: 按ID升序排列的版本ID
+            contents: 版本ID到全文的映射
+            
+        Returns:
+            以增量保存的版本数
+        """
+        compacted = 0
+        depth = 0
+        previous_id = None
+        for version_id in version_ids:
+            content = contents[version_id]
+            delta = None
+            if previous_id is not None and depth + 1 < self.KEYFRAME_INTERVAL:
+                delta = make_delta(contents[previous_id], content)
+                if len(delta) >= len(content or ""):
+                    delta = None
+                    
+            if delta is None:
+                self.db.execute_query(
+                    "UPDATE chapter_versions SET content = ?, delta = NULL, base_id = NULL WHERE id = ?",
+                    (content, version_id)
+                )
+                depth = 0
+            else:
+                self.db.execute_query(
+                    "UPDATE chapter_versions SET content = NULL, delta = ?, base_id = ? WHERE id = ?",
+                    (delta, previous_id, version_id)
+                )
+                depth += 1
+                compacted += 1
+            previous_id = version_id
+        return compacted
+            
+    def _load_version_chain(self, version_id: int) -> List[tuple]:
+        """读取从最近的关键帧到指定版本的版本链
+        
+        Returns:
+            (id, content, delta) 列表，第一项为关键帧
+        """
         query = """
-            INSERT INTO chapter_versions (chapter_id, content, comment)
-            VALUES (?, ?, ?)
+            WITH RECURSIVE chain(id, content, delta, base_id, depth) AS (
+                SELECT id, content, delta, base_id, 0
+                FROM chapter_versions
+                WHERE id = ?
+                UNION ALL
+                SELECT v.id, v.content, v.delta, v.base_id, chain.depth + 1
+                FROM chapter_versions v
+                JOIN chain ON v.id = chain.base_id
+                WHERE chain.delta IS NOT NULL
+            )
+            SELECT id, content, delta FROM chain ORDER BY depth DESC
         """
-        self.db.execute_query(query, (chapter_id, content, comment))
-        logging.info(f"创建版本成功: {chapter_id}") 
\ No newline at end of file
+        result = self.db.execute_query(query, (version_id,))
+        return [tuple(row) for row in result] if result else []
+        
+    def _reconstruct_version(self, version_id: int) -> Optional[str]:
+        """还原指定版本的全文"""
+        chain = self._load_version_chain(version_id)
+        if not chain:
+            raise ValueError(f"版本不存在: {version_id}")
+        if chain[0][2] is not None:
+            raise ValueError(f"版本链缺少关键帧: {version_id}")
+        return self._apply_chain(chain)
+        
+    def _apply_chain(self, chain: List[tuple]) -> Optional[str]:
+        """从关键帧开始依次应用增量，得到版本链末尾的全文"""
+        content = chain[0][1]
+        for _, _, delta in chain[1:]:
+            content = apply_delta(content, delta)
+        return content
+        
+    def _materialize_versions(self, rows) -> Dict[int, Optional[str]]:
+        """按ID升序依次还原一组版本的全文
+        
+        Args:
+            rows: (id, content, delta, base_id, ...) 行，按ID升序排列
+            
+        Returns:
+            版本ID到全文的映射
+        """
+        contents: Dict[int, Optional[str]] = {}
+        for row in rows:
+            version_id, content, delta, base_id = row[0], row[1], row[2], row[3]
+            if delta is None:
+                contents[version_id] = content
+            elif base_id in contents:
+                contents[version_id] = apply_delta(contents[base_id], delta)
+            else:
+                contents[version_id] = self._reconstruct_version(version_id)
+        return contents
+        
+    def _create_version(self, chapter_id: int, content: str, comment: str):
+        """创建新版本
+        
+        与最新版本内容相同时不创建；与更早的某个版本相同时只记录对该版本的引用。
+        其余情况下与上一版本的增量足够小时只保存增量，版本链达到
+        KEYFRAME_INTERVAL 或改动过大时保存全文关键帧。
+        """
+        version_hash = content_hash(content)
+        last = self.db.execute_query(
+            "SELECT id, content_hash FROM chapter_versions WHERE chapter_id = ? ORDER BY id DESC LIMIT 1",
+            (chapter_id,)
+        )
+        if last and last[0][1] == version_hash:
+            logging.info(f"版本内容与最新版本相同，跳过: {chapter_id}")
+            return
+            
+        # 与更早的版本相同时以该版本为基准，增量只是一条整体复制
+        same = self.db.execute_query(
+            "SELECT MAX(id) FROM chapter_versions WHERE chapter_id = ? AND content_hash = ?",
+            (chapter_id, version_hash)
+        )
+        same_id = same[0][0] if same else None
+        base_id = same_id if same_id is not None else (last[0][0] if last else None)
+        
+        delta = None
+        if base_id is not None:
+            chain = self._load_version_chain(base_id)
+            if chain and chain[0][2] is None and len(chain) < self.KEYFRAME_INTERVAL:
+                delta = make_delta(self._apply_chain(chain), content)
+                # 增量不比全文小时直接保存全文
+                if len(delta) >= len(content or ""):
+                    delta = None
+                    
+        size = len(content or "")
+        if delta is None:
+            query = """
+                INSERT INTO chapter_versions (chapter_id, content, comment, content_hash, content_size)
+                VALUES (?, ?, ?, ?, ?)
+            """
+            self.db.execute_query(query, (chapter_id, content, comment, version_hash, size))
+        else:
+            query = """
+                INSERT INTO chapter_versions (chapter_id, delta, base_id, comment, content_hash, content_size)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """
+            self.db.execute_query(query, (chapter_id, delta, base_id, comment, version_hash, size))
+        logging.info(f"创建版本成功: {chapter_id}, {'增量' if delta is not None else '全文'}")
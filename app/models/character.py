@@ -1,6 +1,8 @@
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 from ..database.sqlite import DatabaseManager
+from ..core.delta import content_hash
+from ..core.markers import parse_character_markers
 import logging
 
 # 配置日志
@@ -31,7 +33,7 @@ class Character:
             (novel_id, name, description, characteristics, 
              role_type, first_appearance, status)
         )
-        return result[0][0] if result else None
+        return result if result else None
         
     def extract_characters_from_content(self, generator, content: str) -> List[Dict]:
         """从内容中提取角色信息
@@ -45,49 +47,127 @@ class Character:
         """
         return generator.extract_characters(content)
         
-    def auto_update_characters(self, generator, novel_id: int, chapter_id: int, content: str):
+    def auto_update_characters(self, generator, novel_id: int, chapter_id: int, content: str,
+                               force: bool = False) -> int:
         """自动更新角色信息
         
+        按段落记录已经处理过的内容，只处理新增或修改过的段落。
+        段落中的【角色名：描述】标记在本地解析后直接创建角色，【角色名】与已有角色对照；
+        只有无法解析的标记所在的段落才交给模型提取。
+        
         Args:
             generator: NovelGenerator实例
             novel_id: 小说ID
-            chapter_id: 章节ID
-            content: 章节内容
+            chapter_id: 章节ID，为空时不记录处理进度
+            content: 章节内容，也可以只是新插入的一段内容
+            force: 没有标记的新段落也交给模型提取
+            
+        Returns:
+            新添加的角色数
         """
         try:
-            # 提取新角色
-            new_characters = self.extract_characters_from_content(generator, content)
-            logger.info(f"从内容中提取到 {len(new_characters)} 个角色")
-            
+            paragraphs = self._split_paragraphs(content)
+            processed = self._get_processed_hashes(chapter_id) if chapter_id is not None else set()
+            pending = [(h, p) for h, p in paragraphs if h not in processed]
+            if not pending:
+                logger.info(f"章节 {chapter_id} 没有新段落，跳过角色提取")
+                return 0
+                
             # 获取现有角色
-            existing_characters = self.get_by_novel(novel_id)
-            existing_names = {char['name'] for char in existing_characters}
+            existing_names = {char['name'] for char in self.list_by_novel(novel_id)}
             logger.info(f"当前小说已有 {len(existing_names)} 个角色")
             
-            # 添加新角色
+            # 本地解析角色标记
+            pending_text = "\n".join(p for _, p in pending)
+            parsed = parse_character_markers(pending_text, existing_names)
+            new_characters = list(parsed.new_characters)
+            logger.info(
+                f"章节 {chapter_id} 解析 {len(pending)}/{len(paragraphs)} 个段落: "
+                f"新角色 {len(parsed.new_characters)} 个, 已有角色 {len(parsed.known_names)} 个, "
+                f"无法解析的标记 {len(parsed.unresolved)} 个"
+            )
+            
+            # 只把含有无法解析标记的段落交给模型，force 时发送全部新段落
+            if force:
+                llm_text = pending_text
+            else:
+                unresolved = ["【" + marker.raw + "】" for marker in parsed.unresolved]
+                llm_text = "\n".join(p for _, p in pending if any(m in p for m in unresolved))
+            if llm_text:
+                extracted = self.extract_characters_from_content(generator, llm_text)
+                logger.info(f"模型从 {len(llm_text)} 字中提取到 {len(extracted)} 个角色")
+                new_characters.extend(extracted)
+            
+            # 添加新角色，所有新角色和处理进度在一个事务中写入
             added_count = 0
-            for char in new_characters:
-                if char['name'] not in existing_names:
-                    self.create(
-                        novel_id=novel_id,
-                        name=char['name'],
-                        description=char.get('description'),
-                        characteristics=char.get('characteristics'),
-                        role_type=char.get('role_type', '配角'),
-                        first_appearance=chapter_id,
-                        status='活跃'
+            with self.db.transaction():
+                for char in new_characters:
+                    if char['name'] not in existing_names:
+                        self.create(
+                            novel_id=novel_id,
+                            name=char['name'],
+                            description=char.get('description'),
+                            characteristics=char.get('characteristics'),
+                            role_type=char.get('role_type', '配角'),
+                            first_appearance=chapter_id,
+                            status='活跃'
+                        )
+                        existing_names.add(char['name'])
+                        added_count += 1
+                        logger.info(f"添加新角色: {char['name']}")
+                        
+                if chapter_id is not None:
+                    self.db.get_connection().executemany(
+                        "INSERT OR IGNORE INTO chapter_extraction_state (chapter_id, paragraph_hash) VALUES (?, ?)",
+                        [(chapter_id, h) for h, _ in pending]
                     )
-                    added_count += 1
-                    logger.info(f"添加新角色: {char['name']}")
                     
             if added_count > 0:
                 logger.info(f"成功添加 {added_count} 个新角色")
             else:
                 logger.info("没有新角色需要添加")
+            return added_count
                 
         except Exception as e:
             logger.error(f"自动更新角色失败: {str(e)}")
             raise
+            
+    def reset_extraction_state(self, chapter_id: int):
+        """清除章节的角色提取进度，下次保存时重新提取全部内容
+        
+        Args:
+            chapter_id: 章节ID
+        """
+        self.db.execute_query(
+            "DELETE FROM chapter_extraction_state WHERE chapter_id = ?",
+            (chapter_id,)
+        )
+        
+    def _split_paragraphs(self, content: str) -> List[Tuple[str, str]]:
+        """按行拆分段落，忽略空行和首尾空白
+        
+        Returns:
+            (段落哈希, 段落) 列表，重复的段落只保留一次
+        """
+        paragraphs = []
+        seen = set()
+        for line in (content or "").splitlines():
+            paragraph = line.strip()
+            if not paragraph:
+                continue
+            paragraph_hash = content_hash(paragraph)
+            if paragraph_hash not in seen:
+                seen.add(paragraph_hash)
+                paragraphs.append((paragraph_hash, paragraph))
+        return paragraphs
+        
+    def _get_processed_hashes(self, chapter_id: int) -> set:
+        """获取章节已提取过角色的段落哈希"""
+        result = self.db.execute_query(
+            "SELECT paragraph_hash FROM chapter_extraction_state WHERE chapter_id = ?",
+            (chapter_id,)
+        )
+        return {row[0] for row in result} if result else set()
         
     def get_character_by_name(self, novel_id: int, name: str) -> Optional[Dict]:
         """根据名称获取角色
@@ -99,7 +179,12 @@ class Character:
         Returns:
             角色信息字典
         """
-        query = "SELECT * FROM characters WHERE novel_id = ? AND name = ?"
+        query = """
+            SELECT id, novel_id, name, description, characteristics,
+                   role_type, status, first_appearance
+            FROM characters
+            WHERE novel_id = ? AND name = ?
+        """
         result = self.db.execute_query(query, (novel_id, name))
         if result:
             row = result[0]
@@ -214,17 +299,18 @@ class Character:
             if not self.get(character_id):
                 raise ValueError(f"角色不存在: {character_id}")
             
-            # 删除角色关系
-            self.db.execute_query(
-                "DELETE FROM character_relationships WHERE character1_id = ? OR character2_id = ?",
-                (character_id, character_id)
-            )
-            
-            # 删除角色
-            self.db.execute_query(
-                "DELETE FROM characters WHERE id = ?",
-                (character_id,)
-            )
+            with self.db.transaction():
+                # 删除角色关系
+                self.db.execute_query(
+                    "DELETE FROM character_relationships WHERE character1_id = ? OR character2_id = ?",
+                    (character_id, character_id)
+                )
+                
+                # 删除角色
+                self.db.execute_query(
+                    "DELETE FROM characters WHERE id = ?",
+                    (character_id,)
+                )
             logger.info(f"删除角色成功: {character_id}")
             return True
             
@@ -280,7 +366,7 @@ class Character:
             if not result:
                 raise ValueError("创建角色关系失败")
                 
-            relationship_id = result[0][0]
+            relationship_id = result
             logger.info(f"创建角色关系成功，ID: {relationship_id}")
             return relationship_id
             
@@ -410,7 +496,13 @@ class Character:
         Returns:
             角色列表
         """
-        query = "SELECT * FROM characters WHERE novel_id = ? ORDER BY id"
+        query = """
+            SELECT id, novel_id, name, description, characteristics,
+                   role_type, status, first_appearance
+            FROM characters
+            WHERE novel_id = ?
+            ORDER BY id
+        """
         result = self.db.execute_query(query, (novel_id,))
         return [
             {
@@ -426,6 +518,32 @@ class Character:
             for row in result
         ] if result else []
         
+    def list_by_novel(self, novel_id: int) -> List[Dict]:
+        """列出小说的角色，只包含列表显示需要的字段
+        
+        Args:
+            novel_id: 小说ID
+            
+        Returns:
+            角色列表，每项包含 id、name、role_type 和 status
+        """
+        query = """
+            SELECT id, name, role_type, status
+            FROM characters
+            WHERE novel_id = ?
+            ORDER BY id
+        """
+        result = self.db.execute_query(query, (novel_id,))
+        return [
+            {
+                'id': row[0],
+                'name': row[1],
+                'role_type': row[2],
+                'status': row[3]
+            }
+            for row in result
+        ] if result else []
+        
     def get_character_relationships_for_novel(self, novel_id: int) -> List[Dict]:
         """获取小说中所有的角色关系信息"""
         try:
@@ -33,7 +33,7 @@ class Novel:
             if not result:
                 raise ValueError("创建小说失败")
                 
-            novel_id = result[0][0]
+            novel_id = result
             logging.info(f"创建小说成功，ID: {novel_id}")
             return novel_id
             
@@ -51,7 +51,7 @@ class Novel:
             小说信息字典
         """
         try:
-            query = "SELECT * FROM novels WHERE id = ?"
+            query = "SELECT id, title, outline, current_chapter FROM novels WHERE id = ?"
             result = self.db.execute_query(query, (novel_id,))
             
             if not result:
@@ -126,12 +126,31 @@ class Novel:
             if not self.get(novel_id):
                 raise ValueError(f"小说不存在: {novel_id}")
             
-            # 首先删除相关的章节和角色
-            self.db.execute_query("DELETE FROM chapters WHERE novel_id = ?", (novel_id,))
-            self.db.execute_query("DELETE FROM characters WHERE novel_id = ?", (novel_id,))
-            
-            # 删除小说
-            self.db.execute_query("DELETE FROM novels WHERE id = ?", (novel_id,))
+            with self.db.transaction():
+                # 首先删除相关的章节和角色
+                self.db.execute_query(
+                    "DELETE FROM chapter_extraction_state WHERE chapter_id IN "
+                    "(SELECT id FROM chapters WHERE novel_id = ?)",
+                    (novel_id,)
+                )
+                self.db.execute_query(
+                    "DELETE FROM chapter_versions WHERE chapter_id IN "
+                    "(SELECT id FROM chapters WHERE novel_id = ?)",
+                    (novel_id,)
+                )
+                # 任务参数中只有ID，排队中的任务执行时已找不到对应的小说和章节
+                self.db.execute_query(
+                    "DELETE FROM jobs WHERE status = 'pending' AND ("
+                    "json_extract(payload, '$.novel_id') = ? OR json_extract(payload, '$.chapter_id') IN "
+                    "(SELECT id FROM chapters WHERE novel_id = ?))",
+                    (novel_id, novel_id)
+                )
+                self.db.execute_query("DELETE FROM summary_nodes WHERE novel_id = ?", (novel_id,))
+                self.db.execute_query("DELETE FROM chapters WHERE novel_id = ?", (novel_id,))
+                self.db.execute_query("DELETE FROM characters WHERE novel_id = ?", (novel_id,))
+                
+                # 删除小说
+                self.db.execute_query("DELETE FROM novels WHERE id = ?", (novel_id,))
             logging.info(f"删除小说成功: {novel_id}")
             return True
             
@@ -146,7 +165,7 @@ class Novel:
             小说信息列表
         """
         try:
-            query = "SELECT * FROM novels ORDER BY id DESC"
+            query = "SELECT id, title, outline, current_chapter FROM novels ORDER BY id DESC"
             result = self.db.execute_query(query)
             
             novels = [{
@@ -163,6 +182,28 @@ class Novel:
             logging.error(f"获取小说列表失败: {e}")
             raise
             
+    def list_titles(self) -> List[Dict]:
+        """获取所有小说的ID和标题，不读取大纲等大字段
+        
+        Returns:
+            小说列表，每项包含 id 和 title
+        """
+        try:
+            query = "SELECT id, title FROM novels ORDER BY id DESC"
+            result = self.db.execute_query(query)
+            
+            novels = [{
+                "id": row[0],
+                "title": row[1]
+            } for row in result] if result else []
+            
+            logging.info(f"获取小说标题列表成功，共{len(novels)}本")
+            return novels
+            
+        except Exception as e:
+            logging.error(f"获取小说标题列表失败: {e}")
+            raise
+            
     def get_chapters(self, novel_id: int) -> List[Dict]:
         """获取小说的所有章节
         
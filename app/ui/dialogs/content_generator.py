@@ -4,6 +4,8 @@ from PyQt6.QtWidgets import (
     QSpinBox, QGroupBox
 )
 from PyQt6.QtCore import Qt, pyqtSignal
+from PyQt6.QtGui import QTextCursor
+from ..workers import JobRunner
 import logging
 
 class ContentGeneratorDialog(QDialog):
@@ -17,6 +19,10 @@ class ContentGeneratorDialog(QDialog):
         self.generator = generator
         self.context = context or {}
         self.generated_content = ""
+        self.runner = JobRunner(self)
+        self.job = None
+        self._chunks = []
+        self._closed = False
         self.init_ui()
         
     def init_ui(self):
@@ -109,49 +115,92 @@ class ContentGeneratorDialog(QDialog):
         layout.addLayout(button_layout)
         
     def _on_generate(self):
-        """生成内容处理"""
+        """生成内容处理，生成过程中按钮用于停止生成"""
+        if self.job is not None:
+            self._cancel_generation()
+            return
+            
         prompt = self.prompt_edit.toPlainText().strip()
         if not prompt:
             QMessageBox.warning(self, "提示", "请输入提示词")
             return
             
-        try:
-            # 显示进度条
-            self.progress_bar.setRange(0, 0)  # 显示忙碌状态
-            self.progress_bar.show()
+        # 显示进度条
+        self.progress_bar.setRange(0, 0)  # 显示忙碌状态
+        self.progress_bar.show()
+        self.generate_button.setText("停止生成")
+        self.apply_button.setEnabled(False)
+        self.prompt_edit.setEnabled(False)
+        self.word_count_spin.setEnabled(False)
+        self.preview_edit.clear()
+        self._chunks = []
+        
+        logging.info("开始生成内容...")
+        
+        # 在后台线程中流式读取，收到的文本逐段追加到预览区域
+        self.job = self.runner.submit(
+            self._stream_content, prompt, self.context,
+            on_progress=self._on_chunk_received,
+            on_error=self._on_generate_failed,
+            on_finished=self._on_generate_finished
+        )
+        
+    def _stream_content(self, job, prompt: str, context: dict):
+        """后台任务：逐段读取生成结果并作为进度报告"""
+        for chunk in self.generator.generate_content_stream(
+            prompt, context, cancel_event=job.cancel_event
+        ):
+            job.report_progress(chunk)
+        
+    def _on_chunk_received(self, chunk: str):
+        """追加一段生成的文本"""
+        if self._closed:
+            return
+        self._chunks.append(chunk)
+        cursor = self.preview_edit.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(chunk)
+        self.preview_edit.setTextCursor(cursor)
+        self.preview_edit.ensureCursorVisible()
+        
+    def _on_generate_failed(self, message: str):
+        """生成失败处理"""
+        if self._closed:
+            return
+        error_msg = f"生成内容失败：{message}"
+        logging.error(error_msg)
+        QMessageBox.critical(self, "错误", error_msg)
+        
+    def _on_generate_finished(self):
+        """生成结束（完成、取消或失败）后汇总结果并恢复UI状态"""
+        if self._closed:
+            return
+        self.job = None
+        self.generated_content = "".join(self._chunks)
+        
+        self.progress_bar.hide()
+        self.generate_button.setText("开始生成")
+        self.generate_button.setEnabled(True)
+        self.apply_button.setEnabled(bool(self.generated_content))
+        self.prompt_edit.setEnabled(True)
+        self.word_count_spin.setEnabled(True)
+        
+        logging.info(f"内容生成结束，长度: {len(self.generated_content)}")
+        
+    def _cancel_generation(self):
+        """停止正在进行的生成，已生成的内容保留"""
+        if self.job is not None:
             self.generate_button.setEnabled(False)
-            self.prompt_edit.setEnabled(False)
-            self.word_count_spin.setEnabled(False)
-            
-            logging.info("开始生成内容...")
-            
-            # 调用生成器
-            content = self.generator.generate_content(
-                prompt=prompt,
-                context=self.context
-            )
+            self.job.cancel()
             
-            # 显示生成的内容
-            self.preview_edit.setPlainText(content)
-            self.generated_content = content
-            
-            # 更新UI状态
-            self.progress_bar.hide()
-            self.apply_button.setEnabled(True)
-            self.generate_button.setEnabled(True)
-            self.prompt_edit.setEnabled(True)
-            self.word_count_spin.setEnabled(True)
-            
-            logging.info("内容生成完成")
-            
-        except Exception as e:
-            error_msg = f"生成内容失败：{str(e)}"
-            logging.error(error_msg)
-            QMessageBox.critical(self, "错误", error_msg)
-            self.progress_bar.hide()
-            self.generate_button.setEnabled(True)
-            self.prompt_edit.setEnabled(True)
-            self.word_count_spin.setEnabled(True)
+    def reject(self):
+        """关闭对话框时停止生成，后台任务在收到下一段文本时退出
+
+        同时断开任务的回调，之后才送达的文本和结束信号不再更新对话框。
+        """
+        self._closed = True
+        self.runner.cancel_all(disconnect=True)
+        super().reject()
             
     def _on_apply(self):
         """应用生成的内容"""
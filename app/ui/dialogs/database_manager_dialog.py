@@ -7,6 +7,8 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt
 import logging
 from ...models.character import Character
+from ...models.novel import Novel
+from ...core.delta import content_hash
 
 class DatabaseManagerDialog(QDialog):
     """数据库管理器对话框"""
@@ -78,6 +80,10 @@ class DatabaseManagerDialog(QDialog):
         self.refresh_button.clicked.connect(self.refresh_all_data)
         button_layout.addWidget(self.refresh_button)
         
+        self.compact_button = QPushButton("压缩数据库")
+        self.compact_button.clicked.connect(self.compact_database)
+        button_layout.addWidget(self.compact_button)
+        
         layout.addLayout(button_layout)
         
     def setup_chapters_tab(self):
@@ -454,9 +460,13 @@ class DatabaseManagerDialog(QDialog):
             if reply != QMessageBox.StandardButton.Yes:
                 return
                 
-            # 保存修改
-            for record_id, changes in self.modified_data[table_name].items():
-                self.db_manager.update_record(table_name, record_id, changes)
+            # 保存修改，所有行在一个事务中提交
+            with self.db_manager.transaction():
+                for record_id, changes in self.modified_data[table_name].items():
+                    # 直接修改正文时同步更新内容哈希
+                    if table_name == 'chapters' and 'content' in changes:
+                        changes = dict(changes, content_hash=content_hash(changes['content']))
+                    self.db_manager.update_record(table_name, record_id, changes)
                 
             # 清除修改记录
             self.modified_data[table_name].clear()
@@ -525,7 +535,7 @@ class DatabaseManagerDialog(QDialog):
                 return
                 
             # 删除小说及相关数据
-            self.db_manager.delete_record('novels', self.current_novel_id)
+            Novel(self.db_manager).delete(self.current_novel_id)
             
             # 刷新界面
             self.refresh_novel_list()
@@ -785,8 +795,9 @@ class DatabaseManagerDialog(QDialog):
                 return
                 
             # 删除记录
-            for _, record_id in selected_rows:
-                self.db_manager.delete_record('character_relationships', record_id)
+            with self.db_manager.transaction():
+                for _, record_id in selected_rows:
+                    self.db_manager.delete_record('character_relationships', record_id)
                 
             # 重新加载数据
             self.load_relationships_data()
@@ -826,8 +837,9 @@ class DatabaseManagerDialog(QDialog):
                 return
                 
             # 删除记录
-            for _, record_id in selected_rows:
-                self.db_manager.delete_record(table_name, record_id)
+            with self.db_manager.transaction():
+                for _, record_id in selected_rows:
+                    self.db_manager.delete_record(table_name, record_id)
                 
             # 重新加载数据
             self.load_all_data()
@@ -862,6 +874,40 @@ class DatabaseManagerDialog(QDialog):
         self.refresh_novel_list()
         self.load_all_data()
         
+    def compact_database(self):
+        """回收数据库文件中的空闲空间
+        
+        后台的版本清理只做增量回收。旧数据库没有开启增量回收，
+        需要执行一次完整的 VACUUM，期间其他写入会等待，因此由用户手动执行。
+        """
+        try:
+            usage = self.db_manager.get_space_usage()
+            size_mb = usage['total_bytes'] / 1024 / 1024
+            free_mb = usage['free_bytes'] / 1024 / 1024
+            if usage['incremental']:
+                message = f"数据库大小 {size_mb:.1f} MB，其中 {free_mb:.1f} MB 可以回收。是否继续？"
+            else:
+                message = (f"数据库大小 {size_mb:.1f} MB，其中 {free_mb:.1f} MB 可以回收。\n"
+                           "压缩会重写整个数据库文件并开启自动增量回收，数据较多时需要一些时间，"
+                           "期间无法保存。是否继续？")
+            reply = QMessageBox.question(
+                self,
+                "确认压缩",
+                message,
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+                
+            reclaimed = self.db_manager.reclaim_space(full=True)
+            QMessageBox.information(self, "成功", f"数据库压缩完成，回收 {reclaimed / 1024 / 1024:.1f} MB")
+            
+        except Exception as e:
+            error_msg = f"压缩数据库失败: {str(e)}"
+            logging.error(error_msg)
+            QMessageBox.critical(self, "错误", error_msg)
+            
     @classmethod
     def show_dialog(cls, db_manager, parent=None):
         """显示数据库管理器对话框"""
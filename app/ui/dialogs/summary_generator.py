@@ -4,6 +4,7 @@ from PyQt6.QtWidgets import (
     QCheckBox
 )
 from PyQt6.QtCore import Qt, pyqtSignal
+from ..workers import JobRunner
 import logging
 
 class SummaryGeneratorDialog(QDialog):
@@ -18,6 +19,7 @@ class SummaryGeneratorDialog(QDialog):
         self.summary_system = summary_system
         self.content = content
         self.generated_summary = ""
+        self.runner = JobRunner(self)
         self.init_ui()
         
         # 如果有现有摘要，显示在预览区域
@@ -88,32 +90,43 @@ class SummaryGeneratorDialog(QDialog):
         self.summary_preview.textChanged.connect(self._on_summary_edited)
         
     def _on_generate(self):
-        """生成摘要处理"""
-        try:
-            # 更新UI状态
-            self.progress_bar.setRange(0, 0)
-            self.progress_bar.show()
-            self.generate_button.setEnabled(False)
-            self.status_label.setText("正在分析章节内容...")
-            
-            # 生成摘要
-            summary = self.summary_system.generate_chapter_summary(self.content)
-            
-            # 显示摘要
-            self.summary_preview.setPlainText(summary)
-            self.generated_summary = summary
-            
-            # 更新UI状态
-            self.progress_bar.hide()
-            self.apply_button.setEnabled(True)
-            self.generate_button.setEnabled(True)
-            self.status_label.setText("摘要生成完成")
-            
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"生成摘要失败：{str(e)}")
-            self.progress_bar.hide()
-            self.generate_button.setEnabled(True)
-            self.status_label.setText("生成失败")
+        """生成摘要处理，在后台任务中调用生成器"""
+        # 更新UI状态
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        self.generate_button.setEnabled(False)
+        self.status_label.setText("正在分析章节内容...")
+        
+        self.runner.submit(
+            lambda job, content: self.summary_system.generate_chapter_summary(content),
+            self.content,
+            on_result=self._on_summary_generated,
+            on_error=self._on_generate_failed
+        )
+        
+    def _on_summary_generated(self, summary: str):
+        """摘要生成完成处理"""
+        # 显示摘要
+        self.summary_preview.setPlainText(summary)
+        self.generated_summary = summary
+        
+        # 更新UI状态
+        self.progress_bar.hide()
+        self.apply_button.setEnabled(True)
+        self.generate_button.setEnabled(True)
+        self.status_label.setText("摘要生成完成")
+        
+    def _on_generate_failed(self, message: str):
+        """摘要生成失败处理"""
+        QMessageBox.critical(self, "错误", f"生成摘要失败：{message}")
+        self.progress_bar.hide()
+        self.generate_button.setEnabled(True)
+        self.status_label.setText("生成失败")
+        
+    def reject(self):
+        """关闭对话框时丢弃尚未返回的摘要"""
+        self.runner.cancel_all(disconnect=True)
+        super().reject()
             
     def _on_apply(self):
         """应用摘要"""
@@ -0,0 +1,196 @@
+from PyQt6.QtWidgets import (
+    QDialog, QWidget, QVBoxLayout, QHBoxLayout, QTextEdit,
+    QPushButton, QLabel, QListWidget, QListWidgetItem,
+    QComboBox, QSplitter, QMessageBox, QAbstractItemView
+)
+from PyQt6.QtCore import Qt, pyqtSignal
+import html
+import logging
+
+class VersionHistoryDialog(QDialog):
+    """版本历史对话框
+
+    列表只加载版本元数据并分页追加，选中版本时才还原内容并计算差异。
+    选中一个版本时与它的上一个版本比较，选中两个版本时比较这两个版本。
+    """
+
+    # 自定义信号
+    versionRestored = pyqtSignal(int)  # 版本恢复完成信号，参数为版本ID
+
+    PAGE_SIZE = 50
+
+    def __init__(self, chapter_model, differ, chapter_id: int, parent=None):
+        super().__init__(parent)
+        self.chapter_model = chapter_model
+        self.differ = differ
+        self.chapter_id = chapter_id
+        self.has_more = True
+        self.init_ui()
+        self.load_more()
+
+    def init_ui(self):
+        """初始化UI"""
+        self.setWindowTitle("版本历史")
+        self.setMinimumSize(900, 600)
+
+        layout = QVBoxLayout(self)
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+
+        # 版本列表
+        self.version_list = QListWidget()
+        self.version_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.version_list.itemSelectionChanged.connect(self._on_selection_changed)
+        splitter.addWidget(self.version_list)
+
+        # 差异显示区域
+        diff_panel = QWidget()
+        diff_layout = QVBoxLayout(diff_panel)
+
+        mode_layout = QHBoxLayout()
+        mode_layout.addWidget(QLabel("比较方式："))
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItem("按行", "line")
+        self.mode_combo.addItem("按字", "char")
+        self.mode_combo.currentIndexChanged.connect(self._on_selection_changed)
+        mode_layout.addWidget(self.mode_combo)
+        mode_layout.addStretch()
+        self.stats_label = QLabel()
+        mode_layout.addWidget(self.stats_label)
+        diff_layout.addLayout(mode_layout)
+
+        self.diff_view = QTextEdit()
+        self.diff_view.setReadOnly(True)
+        diff_layout.addWidget(self.diff_view)
+        splitter.addWidget(diff_panel)
+        splitter.setSizes([250, 650])
+        layout.addWidget(splitter)
+
+        # 按钮区域
+        button_layout = QHBoxLayout()
+
+        self.more_button = QPushButton("加载更多")
+        self.more_button.clicked.connect(self.load_more)
+        button_layout.addWidget(self.more_button)
+        button_layout.addStretch()
+
+        self.restore_button = QPushButton("恢复此版本")
+        self.restore_button.clicked.connect(self._on_restore)
+        self.restore_button.setEnabled(False)
+        button_layout.addWidget(self.restore_button)
+
+        self.close_button = QPushButton("关闭")
+        self.close_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.close_button)
+
+        layout.addLayout(button_layout)
+
+    def load_more(self):
+        """追加下一页版本"""
+        try:
+            before_id = None
+            if self.version_list.count():
+                before_id = self.version_list.item(self.version_list.count() - 1).data(Qt.ItemDataRole.UserRole)
+
+            versions = self.chapter_model.list_versions(
+                self.chapter_id, limit=self.PAGE_SIZE, before_id=before_id
+            )
+            for version in versions:
+                size = f"{version['size']}字" if version['size'] is not None else "未知大小"
+                text = f"{version['created_at']}  {size}\n{version['comment'] or ''}"
+                item = QListWidgetItem(text.strip())
+                item.setData(Qt.ItemDataRole.UserRole, version['id'])
+                self.version_list.addItem(item)
+
+            self.has_more = len(versions) == self.PAGE_SIZE
+            self.more_button.setEnabled(self.has_more)
+
+        except Exception as e:
+            logging.error(f"加载版本列表失败: {e}")
+            QMessageBox.critical(self, "错误", f"加载版本列表失败：{str(e)}")
+
+    def _selected_pair(self):
+        """返回要比较的 (旧版本ID, 新版本ID)
+
+        选中一个版本时与它的上一个版本比较，上一个版本可能还没有加载到列表中。
+        选中的是最早的版本时旧版本ID为 None，选中数量不对时返回 None。
+        """
+        rows = sorted(self.version_list.row(item) for item in self.version_list.selectedItems())
+        if len(rows) == 2:
+            new_id = self.version_list.item(rows[0]).data(Qt.ItemDataRole.UserRole)
+            old_id = self.version_list.item(rows[1]).data(Qt.ItemDataRole.UserRole)
+            return old_id, new_id
+        if len(rows) != 1:
+            return None
+
+        # 列表按从新到旧排列，下一行就是上一个版本
+        new_id = self.version_list.item(rows[0]).data(Qt.ItemDataRole.UserRole)
+        if rows[0] + 1 < self.version_list.count():
+            return self.version_list.item(rows[0] + 1).data(Qt.ItemDataRole.UserRole), new_id
+        if not self.has_more:
+            return None, new_id
+        older = self.chapter_model.list_versions(self.chapter_id, limit=1, before_id=new_id)
+        return (older[0]['id'] if older else None), new_id
+
+    def _on_selection_changed(self):
+        """选中的版本变化时刷新差异"""
+        selected = self.version_list.selectedItems()
+        self.restore_button.setEnabled(len(selected) == 1)
+
+        try:
+            pair = self._selected_pair()
+            if pair is None:
+                self.diff_view.clear()
+                self.stats_label.setText("请选择一个或两个版本")
+                return
+
+            old_id, new_id = pair
+            if old_id is None:
+                # 最早的版本没有可比较的对象，直接显示全文
+                self.diff_view.setPlainText(self.chapter_model.get_version_content(new_id) or "")
+                self.stats_label.clear()
+                return
+
+            result = self.differ.diff(old_id, new_id, self.mode_combo.currentData())
+            self.diff_view.setHtml(self._render(result["ops"]))
+            self.stats_label.setText(f"新增 {result['added']} 字，删除 {result['removed']} 字")
+        except Exception as e:
+            logging.error(f"比较版本失败: {e}")
+            QMessageBox.critical(self, "错误", f"比较版本失败：{str(e)}")
+
+    def _render(self, ops) -> str:
+        """将差异片段渲染为 HTML"""
+        parts = []
+        for op in ops:
+            if op["tag"] == "equal":
+                parts.append(html.escape(op["new"]))
+                continue
+            if op["old"]:
+                parts.append(
+                    f'<span style="background:#fdd;text-decoration:line-through">{html.escape(op["old"])}</span>'
+                )
+            if op["new"]:
+                parts.append(f'<span style="background:#dfd">{html.escape(op["new"])}</span>')
+        return '<pre style="white-space:pre-wrap">' + "".join(parts) + "</pre>"
+
+    def _on_restore(self):
+        """恢复选中的版本"""
+        selected = self.version_list.selectedItems()
+        if len(selected) != 1:
+            return
+
+        version_id = selected[0].data(Qt.ItemDataRole.UserRole)
+        reply = QMessageBox.question(
+            self, "确认恢复",
+            "恢复后当前内容会保存为一个新版本，是否继续？",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        try:
+            self.chapter_model.restore_version(version_id)
+            self.versionRestored.emit(version_id)
+            self.accept()
+        except Exception as e:
+            logging.error(f"恢复版本失败: {e}")
+            QMessageBox.critical(self, "错误", f"恢复版本失败：{str(e)}")
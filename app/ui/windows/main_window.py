@@ -13,10 +13,21 @@ from app.ui.widgets.outline_editor import OutlineEditor
 from app.ui.widgets.character_list import CharacterList
 from app.ui.dialogs.content_generator import ContentGeneratorDialog
 from app.ui.dialogs.summary_generator import SummaryGeneratorDialog
+from app.ui.dialogs.version_history import VersionHistoryDialog
+from app.ui.workers import JobQueueSignals
 from app.core.summary import SummarySystem
+from app.core.search import SearchIndex
+from app.core.retention import VersionPruner
+from app.core.diff import VersionDiffer
+from app.core.retrieval import ContextRetriever
+from app.core.names import CastIndex
+from app.core.jobs import JobQueue, JobWorker
+from app.core.tasks import AITasks
+from app.core.delta import content_hash
 from app.ui.dialogs.character_editor import CharacterEditorDialog
 from app.models.character import Character
 from app.ui.dialogs.database_manager_dialog import DatabaseManagerDialog
+import os
 import logging
 
 class MainWindow(QMainWindow):
@@ -28,12 +39,37 @@ class MainWindow(QMainWindow):
         self.generator = NovelGenerator()
         self.summary_system = SummarySystem(db_manager, self.generator)
         self.character_model = Character(db_manager)
+        self.search_index = SearchIndex(db_manager)
+        self.version_differ = VersionDiffer(db_manager)
+        
+        # 续写时检索相关前文
+        self.context_retriever = ContextRetriever(db_manager)
+        self.generator.retriever = self.context_retriever
+        self.generator.cast_index = CastIndex(db_manager)
+        
+        # 调用模型的工作以任务形式保存在数据库中，由后台线程按优先级执行，
+        # 关闭窗口或程序崩溃后未完成的任务在下次启动时继续
+        self.job_queue = JobQueue(db_manager)
+        self.job_worker = JobWorker(self.job_queue, workers=int(os.getenv("JOB_WORKERS", "2")))
+        self.tasks = AITasks(db_manager, self.job_queue, self.generator, self.summary_system,
+                             self.context_retriever)
+        self.tasks.register(self.job_worker)
+        self.job_signals = JobQueueSignals(self.job_worker, self)
+        self.job_signals.progress.connect(self._on_job_progress)
+        self.job_signals.finished.connect(self._on_job_finished)
+        self._outline_jobs = {}  # 大纲任务ID -> 发起时的位置
+        self._backfill_job_id = None
+        
+        # 后台按保留策略清理旧版本
+        self.version_pruner = VersionPruner(db_manager)
+        self.version_pruner.start()
         
         self.current_novel_id = None
         self.current_chapter_id = None
         self.auto_summary = False  # 自动摘要标志
         
         self.init_ui()
+        self.job_worker.start()
         
     def init_ui(self):
         """初始化UI"""
@@ -162,9 +198,8 @@ class MainWindow(QMainWindow):
     def _on_chapter_created(self, novel_id: int):
         """章节创建处理"""
         try:
-            # 获取当前章节数
-            chapters = self.chapter_model.get_by_novel(novel_id)
-            chapter_number = len(chapters) + 1
+            # 新章节号接在当前最大章节号之后
+            chapter_number = self.chapter_model.get_max_chapter_number(novel_id) + 1
             
             # 创建新章节
             chapter_id = self.chapter_model.create(
@@ -201,7 +236,8 @@ class MainWindow(QMainWindow):
     def _refresh_chapter_list(self):
         """刷新章节列表"""
         if self.current_novel_id:
-            chapters = self.chapter_model.get_by_novel(self.current_novel_id)
+            # 与之前一样最新的章节排在最前
+            chapters = self.chapter_model.list_by_novel(self.current_novel_id, descending=True)
             self.chapter_list.set_novel(self.current_novel_id, chapters)
             
     def new_novel(self):
@@ -243,8 +279,8 @@ class MainWindow(QMainWindow):
     def open_novel(self):
         """打开小说"""
         try:
-            # 获取所有小说列表
-            novels = self.novel_model.list_all()
+            # 获取所有小说标题
+            novels = self.novel_model.list_titles()
             if not novels:
                 QMessageBox.information(self, "提示", "还没有创建任何小说")
                 return
@@ -324,7 +360,7 @@ class MainWindow(QMainWindow):
     def _refresh_character_list(self):
         """刷新角色列表"""
         if self.current_novel_id:
-            characters = self.character_model.get_by_novel(self.current_novel_id)
+            characters = self.character_model.list_by_novel(self.current_novel_id)
             self.character_list.set_novel(self.current_novel_id, characters)
             
     def _on_character_selected(self, character_id: int):
@@ -413,6 +449,9 @@ class MainWindow(QMainWindow):
         edit_menu = menubar.addMenu('编辑')
         edit_menu.addAction('生成内容', self.generate_content)
         edit_menu.addAction('更新摘要', self.update_summary)
+        edit_menu.addAction('补全全部章节摘要', self.backfill_summaries)
+        edit_menu.addSeparator()
+        edit_menu.addAction('全文搜索', self.search_novel)
         
         # 视图菜单
         view_menu = menubar.addMenu('视图')
@@ -421,6 +460,7 @@ class MainWindow(QMainWindow):
         # 工具菜单
         tools_menu = menubar.addMenu('工具')
         tools_menu.addAction('数据库管理', self.show_database_manager)
+        tools_menu.addAction('后台任务', self.show_job_status)
 
     def show_database_manager(self):
         """显示数据库管理器"""
@@ -492,34 +532,29 @@ class MainWindow(QMainWindow):
             )
             
             if file_path:
-                # 获取所有章节
-                chapters = self.chapter_model.get_by_novel(self.current_novel_id)
-                
                 # 构建导出内容
                 content = [
                     novel['title'],
                     "=" * 40,
                     "小说大纲：",
-                    novel.get('outline', '暂无大纲'),
+                    novel.get('outline') or '暂无大纲',
                     "=" * 40,
                     ""
                 ]
                 
-                # 添加每个章节
-                for chapter in chapters:
-                    content.extend([
-                        f"第{chapter['chapter_number']}章 {chapter['title']}",
-                        "-" * 40,
-                        "章节大纲：",
-                        chapter.get('outline', '暂无大纲'),
-                        "-" * 40,
-                        chapter['content'],
-                        "\n" + "=" * 40 + "\n"
-                    ])
-                
-                # 写入文件
+                # 逐章读取并写入文件，避免一次载入整本小说
                 with open(file_path, 'w', encoding='utf-8') as f:
                     f.write('\n\n'.join(content))
+                    for chapter in self.chapter_model.iter_by_novel(self.current_novel_id):
+                        f.write('\n\n' + '\n\n'.join([
+                            f"第{chapter['chapter_number']}章 {chapter['title']}",
+                            "-" * 40,
+                            "章节大纲：",
+                            chapter['outline'] or '暂无大纲',
+                            "-" * 40,
+                            chapter['content'] or '',
+                            "\n" + "=" * 40 + "\n"
+                        ]))
                     
                 self.statusBar.showMessage(f'小说已导出到：{file_path}')
                 
@@ -533,7 +568,7 @@ class MainWindow(QMainWindow):
                 raise ValueError('请先打开小说')
                 
             # 获取所有角色
-            characters = self.character_model.get_by_novel(self.current_novel_id)
+            characters = self.character_model.list_by_novel(self.current_novel_id)
             if not characters:
                 raise ValueError('当前小说没有角色信息')
                 
@@ -604,8 +639,12 @@ class MainWindow(QMainWindow):
             )
             
             if file_path:
-                # 获取所有章节
-                chapters = self.chapter_model.get_by_novel(self.current_novel_id)
+                # 获取所有章节大纲
+                chapters = self.chapter_model.list_by_novel(
+                    self.current_novel_id,
+                    fields=["chapter_number", "title", "outline"],
+                    descending=True
+                )
                 
                 # 构建导出内容
                 content = [
@@ -622,7 +661,7 @@ class MainWindow(QMainWindow):
                     content.extend([
                         f"第{chapter['chapter_number']}章 {chapter['title']}",
                         "-" * 40,
-                        chapter.get('outline', '暂无大纲'),
+                        chapter['outline'] or '暂无大纲',
                         ""
                     ])
                 
@@ -641,72 +680,81 @@ class MainWindow(QMainWindow):
             self.statusBar.showMessage('正在编辑...')
             
     def _on_editor_save_requested(self, content: str):
-        """编辑器保存请求处理"""
+        """编辑器保存请求处理
+        
+        内容在界面线程中直接保存，角色提取和自动摘要需要调用生成器，
+        提交到后台任务队列中执行。
+        """
         try:
             if self.current_chapter_id:
+                # 内容未变化时跳过保存、角色提取和摘要生成
+                if self.chapter_model.is_content_unchanged(self.current_chapter_id, content):
+                    self.statusBar.showMessage('内容未变化')
+                    return
+                    
                 # 保存内容
                 self.chapter_model.update(
                     self.current_chapter_id,
                     content=content
                 )
-                
-                # 自动提取和更新角色
-                self.character_model.auto_update_characters(
-                    self.generator,
-                    self.current_novel_id,
-                    self.current_chapter_id,
-                    content
-                )
-                self._refresh_character_list()
-                
-                # 如果启用了自动摘要，生成并保存摘要
-                if self.auto_summary:
-                    try:
-                        summary = self.summary_system.generate_chapter_summary(content)
-                        self.chapter_model.update(
-                            self.current_chapter_id,
-                            summary=summary
-                        )
-                        self.summary_text.setPlainText(summary)
-                        self.statusBar.showMessage('内容、角色和摘要已自动保存')
-                    except Exception as e:
-                        logging.error(f"自动生成摘要失败: {e}")
-                        self.statusBar.showMessage('内容和角色已保存，但自动摘要失败')
-                else:
-                    self.statusBar.showMessage('内容和角色已自动保存')
-                    
+                self.statusBar.showMessage('内容已保存，正在更新角色...')
                 logging.info(f"章节 {self.current_chapter_id} 已自动保存")
+                
+                # 角色提取、检索索引和自动摘要提交到后台任务队列，
+                # 同一章节还在排队的任务会合并，保存不等待模型调用
+                self.tasks.chapter_saved(self.current_novel_id, self.current_chapter_id, self.auto_summary)
         except Exception as e:
             self.statusBar.showMessage('自动保存失败')
             logging.error(f"自动保存失败: {str(e)}")
             
+    # 后台任务失败时状态栏中显示的名称
+    _JOB_LABELS = {
+        AITasks.EXTRACT_CHARACTERS: '更新角色',
+        AITasks.CHAPTER_SUMMARY: '自动摘要',
+        AITasks.SUMMARY_TREE: '更新分层摘要',
+        AITasks.INDEX_CHAPTER: '更新检索索引',
+        AITasks.KEY_POINTS: '提取关键情节',
+    }
+    
+    def _on_job_progress(self, job: dict, value):
+        """后台任务进度处理"""
+        if job["kind"] == AITasks.SUMMARY_BACKFILL:
+            self.statusBar.showMessage(
+                f'正在补全摘要：{value.done}/{value.total}章，{value.chapters_per_second:.2f}章/秒'
+            )
+            
+    def _on_job_finished(self, job: dict):
+        """后台任务结束处理"""
+        kind = job["kind"]
+        if kind == AITasks.OUTLINE:
+            self._on_outline_job_finished(job)
+            return
+        if kind == AITasks.SUMMARY_BACKFILL:
+            self._on_backfill_finished(job)
+            return
+            
+        if job["status"] == JobQueue.FAILED:
+            logging.error(f"后台任务失败: {kind}#{job['id']}, {job['error']}")
+            self.statusBar.showMessage(f'{self._JOB_LABELS.get(kind, "后台任务")}失败：{job["error"]}')
+            return
+        if job["status"] != JobQueue.DONE or job["payload"].get("novel_id") != self.current_novel_id:
+            return
+            
+        if kind == AITasks.EXTRACT_CHARACTERS:
+            self._refresh_character_list()
+            self.statusBar.showMessage('角色已更新')
+        elif kind == AITasks.CHAPTER_SUMMARY and job["result"]["summary"] is not None:
+            if job["payload"]["chapter_id"] == self.current_chapter_id:
+                self.summary_text.setPlainText(job["result"]["summary"])
+            self.statusBar.showMessage('摘要已自动更新')
+            
     def save_novel(self):
         """保存小说"""
         try:
             if self.current_novel_id and self.current_chapter_id:
-                content = self.editor.save_content()
-                
-                # 保存内容
-                self.chapter_model.update(
-                    self.current_chapter_id,
-                    content=content
-                )
-                
-                # 如果启用了自动摘要，生成并保存摘要
-                if self.auto_summary:
-                    try:
-                        summary = self.summary_system.generate_chapter_summary(content)
-                        self.chapter_model.update(
-                            self.current_chapter_id,
-                            summary=summary
-                        )
-                        self.summary_text.setPlainText(summary)
-                        self.statusBar.showMessage('内容和摘要已保存')
-                    except Exception as e:
-                        logging.error(f"自动生成摘要失败: {e}")
-                        self.statusBar.showMessage('内容已保存，但自动摘要失败')
-                else:
-                    self.statusBar.showMessage('保存成功')
+                # save_content 会发出 saveRequested 信号，由 _on_editor_save_requested
+                # 完成保存、角色提取和自动摘要，这里不再重复保存
+                self.editor.save_content()
             else:
                 self.new_novel()
         except Exception as e:
@@ -734,20 +782,14 @@ class MainWindow(QMainWindow):
                     context['current_chapter'] = current_chapter
                     logging.info(f"已获取当前章节信息：第{current_chapter['chapter_number']}章")
                     
-                    # 获取之前所有章节的摘要
-                    previous_chapters = self.chapter_model.get_by_novel(
+                    # 获取之前章节的分层摘要，较早的章节以情节段和卷的摘要代替
+                    previous_summaries = self.summary_system.get_previous_summaries(
                         self.current_novel_id,
-                        before_chapter=current_chapter['chapter_number']
+                        current_chapter['chapter_number']
                     )
-                    if previous_chapters:
-                        context['previous_summaries'] = [
-                            {
-                                'chapter_number': chapter['chapter_number'],
-                                'summary': chapter.get('summary', '')
-                            }
-                            for chapter in previous_chapters
-                        ]
-                        logging.info(f"已获取{len(previous_chapters)}个之前章节的摘要")
+                    if previous_summaries:
+                        context['previous_summaries'] = previous_summaries
+                        logging.info(f"已获取{len(previous_summaries)}条之前章节的摘要")
             
             # 获取角色信息
             characters = self.character_model.get_by_novel(self.current_novel_id)
@@ -764,22 +806,14 @@ class MainWindow(QMainWindow):
                 context
             )
             
-            # 如果生成了内容，插入到当前位置并提取角色
+            # 如果生成了内容，插入到当前位置并在后台提取角色
             if content:
                 cursor = self.editor.textCursor()
                 cursor.insertText(content)
                 
-                # 自动提取和更新角色
-                self.character_model.auto_update_characters(
-                    self.generator,
-                    self.current_novel_id,
-                    self.current_chapter_id,
-                    content
-                )
-                self._refresh_character_list()
-                
-                self.statusBar.showMessage('内容已插入，角色已更新')
-                logging.info("内容生成和插入完成，角色已更新")
+                self.statusBar.showMessage('内容已插入，正在更新角色...')
+                self.tasks.extract_characters(self.current_novel_id, self.current_chapter_id, content)
+                logging.info("内容生成和插入完成")
                 
         except Exception as e:
             error_msg = f'生成内容失败：{str(e)}'
@@ -818,9 +852,11 @@ class MainWindow(QMainWindow):
             
             # 如果生成了摘要，更新数据库
             if summary:
+                # 摘要对应编辑器中的正文，可能还没有保存，未保存的修改保存后摘要即视为过期
                 self.chapter_model.update(
                     self.current_chapter_id,
-                    summary=summary
+                    summary=summary,
+                    summary_hash=content_hash(content)
                 )
                 self.summary_text.setPlainText(summary)
                 self.statusBar.showMessage('摘要已更新')
@@ -828,6 +864,120 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, '错误', f'更新摘要失败：{str(e)}')
             
+    def search_novel(self):
+        """在当前小说中全文搜索并跳转到命中的章节"""
+        try:
+            if not self.current_novel_id:
+                raise ValueError('请先打开小说')
+                
+            keyword, ok = QInputDialog.getText(self, "全文搜索", "请输入关键词（多个关键词用空格分隔）：")
+            if not ok or not keyword.strip():
+                return
+                
+            results = self.search_index.search(self.current_novel_id, keyword.strip())
+            if not results:
+                QMessageBox.information(self, "提示", f"未找到：{keyword}")
+                return
+                
+            items = [
+                f"第{r['chapter_number']}章 {r['title']}：{r['snippet']}"
+                for r in results
+            ]
+            item, ok = QInputDialog.getItem(
+                self,
+                "搜索结果",
+                f"共找到{len(results)}个章节：",
+                items,
+                0,
+                False
+            )
+            if not ok:
+                return
+                
+            result = results[items.index(item)]
+            self.chapter_list.select_chapter(result['chapter_id'])
+            
+            # 将光标移动到正文中的命中位置
+            if result['position'] is not None and self.current_chapter_id == result['chapter_id']:
+                cursor = self.editor.textCursor()
+                cursor.setPosition(min(result['position'], len(self.editor.toPlainText())))
+                self.editor.setTextCursor(cursor)
+                self.editor.ensureCursorVisible()
+                
+        except Exception as e:
+            QMessageBox.critical(self, '错误', f'搜索失败：{str(e)}')
+            
+    def backfill_summaries(self):
+        """在后台为当前小说摘要缺失或过期的章节生成摘要，再次选择时取消"""
+        try:
+            if not self.current_novel_id:
+                raise ValueError('请先创建或打开小说')
+                
+            if self._backfill_job_id is not None:
+                self.job_worker.cancel(self._backfill_job_id)
+                self.statusBar.showMessage('正在停止补全摘要，已生成的摘要会保留...')
+                return
+                
+            # 先保存编辑器中的修改，按最新的正文生成摘要
+            if self.editor.is_modified():
+                self.editor.save_content()
+                
+            self._backfill_job_id = self.tasks.backfill_summaries(self.current_novel_id)
+            self.statusBar.showMessage('已提交补全摘要任务，将在其他任务之后执行')
+            
+        except Exception as e:
+            QMessageBox.critical(self, '错误', f'补全摘要失败：{str(e)}')
+            
+    def _on_backfill_finished(self, job: dict):
+        """补全摘要任务结束处理"""
+        if job["id"] == self._backfill_job_id:
+            self._backfill_job_id = None
+        if job["status"] == JobQueue.CANCELLED:
+            self.statusBar.showMessage('已停止补全摘要')
+            return
+        if job["status"] == JobQueue.FAILED:
+            self.statusBar.showMessage(f'补全摘要失败：{job["error"]}')
+            return
+            
+        report = job["result"]
+        if job["payload"]["novel_id"] == self.current_novel_id and self.current_chapter_id:
+            chapter = self.chapter_model.get(self.current_chapter_id)
+            if chapter:
+                self.summary_text.setPlainText(chapter['summary'] or "暂无摘要")
+        message = f'摘要补全完成：{report["done"]}/{report["total"]}章，耗时{report["elapsed"]:.0f}秒'
+        if report["failed"]:
+            message += f'，{report["failed"]}章失败，可再次补全'
+        self.statusBar.showMessage(message)
+        
+    def show_job_status(self):
+        """显示后台任务队列的状态，可以重试失败的任务"""
+        try:
+            metrics = self.job_worker.metrics()
+            counts = metrics["queue"]
+            failed = self.job_queue.list_jobs(JobQueue.FAILED, limit=20)
+            lines = [
+                f'排队中：{counts[JobQueue.PENDING]}',
+                f'执行中：{counts[JobQueue.RUNNING]}',
+                f'已完成：{counts[JobQueue.DONE]}',
+                f'已失败：{counts[JobQueue.FAILED]}',
+                f'本次启动已完成：{metrics["processed"]}，重试：{metrics["retried"]}',
+            ]
+            for job in failed:
+                lines.append(f'- {job["kind"]}#{job["id"]}：{job["error"]}')
+                
+            if not failed:
+                QMessageBox.information(self, '后台任务', '\n'.join(lines))
+                return
+            reply = QMessageBox.question(
+                self, '后台任务', '\n'.join(lines) + '\n\n是否重试失败的任务？'
+            )
+            if reply == QMessageBox.StandardButton.Yes:
+                retried = sum(1 for job in failed if self.job_queue.reset(job["id"]))
+                self.statusBar.showMessage(f'已重新提交{retried}个任务')
+                
+        except Exception as e:
+            QMessageBox.critical(self, '错误', f'读取后台任务失败：{str(e)}')
+            
     def _on_auto_summary_changed(self, enabled: bool):
         """自动摘要设置变更处理"""
         self.auto_summary = enabled
@@ -839,11 +989,25 @@ class MainWindow(QMainWindow):
             if not self.current_chapter_id:
                 raise ValueError('请先选择章节')
                 
-            # TODO: 实现显示版本历史功能
-            self.statusBar.showMessage('正在加载版本历史...')
+            # 先保存编辑器中的修改，历史中才包含当前内容
+            if self.editor.is_modified():
+                self.save_novel()
+                
+            dialog = VersionHistoryDialog(
+                self.chapter_model, self.version_differ, self.current_chapter_id, self
+            )
+            dialog.versionRestored.connect(self._on_version_restored)
+            dialog.exec()
         except Exception as e:
             QMessageBox.critical(self, '错误', f'加载版本历史失败：{str(e)}')
             
+    def _on_version_restored(self, version_id: int):
+        """版本恢复后重新加载章节"""
+        chapter = self.chapter_model.get(self.current_chapter_id)
+        if chapter:
+            self.editor.load_content(chapter['content'])
+        self.statusBar.showMessage('已恢复到所选版本')
+        
     def closeEvent(self, event):
         """关闭窗口事件"""
         if self.editor.is_modified():
@@ -863,7 +1027,15 @@ class MainWindow(QMainWindow):
             else:
                 event.ignore()
         else:
-            event.accept() 
+            event.accept()
+            
+        if event.isAccepted():
+            # 正在执行的任务中断后留在队列中，下次启动时继续
+            self.job_worker.stop()
+            self.version_pruner.stop()
+            # 删除服务端的设定集缓存，不等它按有效期过期
+            if self.generator.bible_cache is not None:
+                self.generator.bible_cache.clear()
 
     def _on_chapter_renamed(self, chapter_id: int, new_title: str):
         """章节重命名处理"""
@@ -879,12 +1051,13 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, '错误', f'重命名章节失败：{str(e)}')
             
     def _on_generate_outline(self):
-        """AI生成大纲处理"""
+        """AI生成大纲处理，生成在后台任务中进行"""
         try:
             if not self.current_novel_id:
                 raise ValueError('请先创建或打开小说')
                 
-            if self.outline_editor.is_chapter_outline():
+            is_chapter = self.outline_editor.is_chapter_outline()
+            if is_chapter:
                 # 生成章节大纲
                 if not self.current_chapter_id:
                     raise ValueError('请先选择章节')
@@ -894,26 +1067,42 @@ class MainWindow(QMainWindow):
                     raise ValueError('当前章节没有内容')
                     
                 self.statusBar.showMessage('正在生成章节大纲...')
-                outline = self.generator.generate_outline(
-                    chapter_content=chapter['content'],
-                    is_chapter=True
-                )
                 
             else:
                 # 生成小说大纲
-                novel = self.novel_model.get(self.current_novel_id)
                 self.statusBar.showMessage('正在生成小说大纲...')
-                outline = self.generator.generate_outline(
-                    novel_title=novel['title'],
-                    is_chapter=False
-                )
                 
-            # 更新编辑器内容
-            self.outline_editor.set_content(
-                outline,
-                is_chapter=self.outline_editor.is_chapter_outline()
-            )
-            self.statusBar.showMessage('大纲生成完成')
+            # 记录发起时的位置，生成期间切换了章节或小说时不覆盖新的大纲
+            target = (self.current_novel_id, self.current_chapter_id if is_chapter else None, is_chapter)
+            # 同一位置的大纲还在排队时合并为一个任务
+            job_id = self.tasks.generate_outline(self.current_novel_id, self.current_chapter_id, is_chapter)
+            self._outline_jobs[job_id] = target
             
         except Exception as e:
-            QMessageBox.critical(self, '错误', f'生成大纲失败：{str(e)}') 
\ No newline at end of file
+            QMessageBox.critical(self, '错误', f'生成大纲失败：{str(e)}')
+            
+    def _on_outline_generated(self, target: tuple, outline: str):
+        """大纲生成完成处理"""
+        is_chapter = target[2]
+        current = (
+            self.current_novel_id,
+            self.current_chapter_id if is_chapter else None,
+            self.outline_editor.is_chapter_outline()
+        )
+        if current != target:
+            self.statusBar.showMessage('大纲已生成，但当前位置已变化，未更新编辑器')
+            return
+            
+        # 更新编辑器内容
+        self.outline_editor.set_content(outline, is_chapter=is_chapter)
+        self.statusBar.showMessage('大纲生成完成')
+        
+    def _on_outline_job_finished(self, job: dict):
+        """大纲任务结束处理，上次启动时提交的任务没有发起位置，不更新编辑器"""
+        target = self._outline_jobs.pop(job["id"], None)
+        if target is None:
+            return
+        if job["status"] == JobQueue.FAILED:
+            QMessageBox.critical(self, '错误', f'生成大纲失败：{job["error"]}')
+        elif job["status"] == JobQueue.DONE:
+            self._on_outline_generated(target, job["result"]["outline"]) 
\ No newline at end of file
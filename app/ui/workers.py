@@ -0,0 +1,161 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from typing import Callable, Optional, Set
+import threading
+import logging
+
+class JobSignals(QObject):
+    """后台任务的信号，在界面线程中处理"""
+
+    progress = pyqtSignal(object)  # 任务进度或中间结果
+    result = pyqtSignal(object)  # 任务完成，参数为返回值
+    error = pyqtSignal(str)  # 任务失败，参数为错误信息
+    cancelled = pyqtSignal()  # 任务被取消
+    finished = pyqtSignal()  # 任务结束，无论成功、失败还是取消都会发出
+
+class Job(QRunnable):
+    """在线程池中执行的一个任务
+
+    任务函数以 job 为第一个参数，通过 job.report_progress 报告进度，
+    并在适当的位置检查 job.is_cancelled()。耗时的生成器调用可以把
+    job.cancel_event 传给支持取消的接口。
+    """
+
+    def __init__(self, fn: Callable, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self.callbacks = []  # JobRunner 连接的 (信号, 回调)
+        self.cancel_event = threading.Event()
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        """请求取消任务，任务函数检查到后自行结束，取消后不再发出 result"""
+        self.cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self.cancel_event.is_set()
+
+    def report_progress(self, value):
+        """报告进度，可在任务函数中多次调用"""
+        if not self.is_cancelled():
+            self.signals.progress.emit(value)
+
+    def run(self):
+        try:
+            result = self.fn(self, *self.args, **self.kwargs)
+            if self.is_cancelled():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.result.emit(result)
+        except Exception as e:
+            logging.error(f"后台任务失败: {e}")
+            if self.is_cancelled():
+                self.signals.cancelled.emit()
+            else:
+                self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
+class JobRunner(QObject):
+    """提交和管理后台任务
+
+    默认使用全局线程池，多个 JobRunner 共享线程，各自跟踪自己提交的任务，
+    关闭窗口或对话框时只取消属于自己的任务。
+    """
+
+    def __init__(self, parent=None, pool: Optional[QThreadPool] = None):
+        super().__init__(parent)
+        self.pool = pool or QThreadPool.globalInstance()
+        self._jobs: Set[Job] = set()
+
+    def submit(self, fn: Callable, *args,
+               on_result: Optional[Callable] = None,
+               on_error: Optional[Callable] = None,
+               on_progress: Optional[Callable] = None,
+               on_finished: Optional[Callable] = None,
+               **kwargs) -> Job:
+        """提交任务
+
+        Args:
+            fn: 任务函数，调用方式为 fn(job, *args, **kwargs)
+            on_result: 成功时在界面线程中调用，参数为返回值
+            on_error: 失败时在界面线程中调用，参数为错误信息
+            on_progress: 报告进度时在界面线程中调用
+            on_finished: 任务结束时在界面线程中调用
+
+        Returns:
+            提交的任务，可用于取消
+        """
+        job = Job(fn, *args, **kwargs)
+        # 先于调用方的回调移除记录，on_finished 中 is_active 已返回 False；
+        # 任务结束后才释放引用，避免信号对象在排队的信号送达前被回收
+        job.signals.finished.connect(lambda: self._jobs.discard(job))
+        # 记录调用方的回调，取消时可以断开
+        job.callbacks = [
+            (signal, callback) for signal, callback in (
+                (job.signals.result, on_result),
+                (job.signals.error, on_error),
+                (job.signals.progress, on_progress),
+                (job.signals.finished, on_finished)
+            ) if callback is not None
+        ]
+        for signal, callback in job.callbacks:
+            signal.connect(callback)
+
+        self._jobs.add(job)
+        self.pool.start(job)
+        return job
+
+    def is_active(self, job: Job) -> bool:
+        """任务是否尚未结束"""
+        return job in self._jobs
+        
+    def active_count(self) -> int:
+        """尚未结束的任务数"""
+        return len(self._jobs)
+
+    def cancel_all(self, disconnect: bool = False):
+        """取消所有尚未结束的任务
+
+        Args:
+            disconnect: 是否同时断开调用方的回调，关闭窗口或对话框时使用，
+                之后送达的进度和结束信号不会再调用已关闭界面上的方法
+        """
+        for job in list(self._jobs):
+            job.cancel()
+            if disconnect:
+                for signal, callback in job.callbacks:
+                    try:
+                        signal.disconnect(callback)
+                    except TypeError:
+                        # 已经断开
+                        pass
+                job.callbacks = []
+
+    def shutdown(self, timeout_ms: int = 5000):
+        """取消全部任务并等待线程池中的任务退出，在关闭窗口时调用"""
+        self.cancel_all()
+        for job in list(self._jobs):
+            # 还在排队的任务直接移出线程池
+            if self.pool.tryTake(job):
+                self._jobs.discard(job)
+        self.pool.waitForDone(timeout_ms)
+
+
+class JobQueueSignals(QObject):
+    """把 JobWorker 在工作线程中的回调转为界面线程中的信号"""
+
+    progress = pyqtSignal(object, object)  # 任务信息, 进度
+    finished = pyqtSignal(object)  # 结束后的任务信息，status 为 done / failed / cancelled
+
+    def __init__(self, worker, parent=None):
+        """
+        Args:
+            worker: app.core.jobs.JobWorker 实例
+        """
+        super().__init__(parent)
+        worker.add_listener(self.finished.emit)
+        worker.add_progress_listener(self.progress.emit)
@@ -54,7 +54,11 @@ def main():
     window.show()
     
     # 运行应用
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    
+    # 关闭数据库连接
+    db_manager.close()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,70 @@
+import os
+import time
+import logging
+from app.core.backends import FakeBackend, create_backend
+from app.core.bible import NovelBibleCache
+
+def test_fake_backend():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 同样的提示词得到同样的输出
+        print("\n测试确定性输出：")
+        backend = FakeBackend(output_chars=120, chunk_chars=50)
+        text = backend.generate("续写第一章")
+        print("输出:", text)
+        assert len(text) == 120
+        assert backend.generate("续写第一章") == text
+        assert backend.generate("续写第二章") != text
+        assert backend.generate("仅返回JSON数组") == "[]"
+
+        # 2. 流式输出拼接后与全文相同
+        print("\n测试流式输出：")
+        chunks = list(backend.stream("续写第一章"))
+        assert [len(c) for c in chunks] == [50, 50, 20]
+        assert "".join(chunks) == text
+        assert backend.calls == 5
+        assert backend.count_tokens("月光如水") == 4
+
+        # 3. 延迟
+        print("\n测试延迟：")
+        slow = FakeBackend(latency=0.05, chunk_delay=0.01, output_chars=40, chunk_chars=10)
+        start = time.time()
+        slow.generate("续写")
+        assert time.time() - start >= 0.08
+
+        # 4. 缓存上下文：句柄内容作为提示词前缀，句柄失效后报错
+        print("\n测试缓存上下文：")
+        bible_cache = NovelBibleCache(backend.context_cache(), min_tokens=1)
+        handle = bible_cache.get_handle(1, "小说设定")
+        assert backend.generate("续写第一章", cached_content=handle) == backend.generate("小说设定续写第一章")
+        bible_cache.invalidate(1)
+        try:
+            backend.generate("续写第一章", cached_content=handle)
+            raise AssertionError("失效的句柄应当报错")
+        except ValueError:
+            pass
+
+        # 5. 按配置选择后端
+        print("\n测试后端选择：")
+        os.environ["FAKE_LLM_OUTPUT_CHARS"] = "30"
+        try:
+            configured = create_backend("fake")
+        finally:
+            del os.environ["FAKE_LLM_OUTPUT_CHARS"]
+        assert configured.name == "fake" and len(configured.generate("续写")) == 30
+        try:
+            create_backend("unknown")
+            raise AssertionError("未知后端应当报错")
+        except ValueError:
+            pass
+
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_fake_backend()
@@ -0,0 +1,71 @@
+import logging
+from app.core.bible import NovelBibleCache, LocalContextBackend, build_novel_bible
+
+class FailingBackend(LocalContextBackend):
+    """登记总是失败的后端"""
+    def create(self, text: str, ttl: int) -> str:
+        raise RuntimeError("模型不支持缓存上下文")
+
+def test_novel_bible_cache():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 设定集与角色顺序无关
+        print("\n测试设定集：")
+        characters = [
+            {"id": i, "name": f"角色{i}", "description": "江湖中人" * 20, "role_type": "配角"}
+            for i in range(1, 60)
+        ]
+        relationships = [{
+            "character1_id": 2, "character1_name": "角色2",
+            "character2_id": 1, "character2_name": "角色1",
+            "relationship_type": "师徒", "description": None
+        }]
+        bible = build_novel_bible("写作要求", "一个武侠故事", characters, relationships)
+        assert bible == build_novel_bible("写作要求", "一个武侠故事", list(reversed(characters)), relationships)
+        assert bible.startswith("写作要求") and "- 角色2 与 角色1：师徒" in bible
+
+        # 2. 内容不变时复用句柄
+        print("\n测试句柄复用：")
+        backend = LocalContextBackend()
+        cache = NovelBibleCache(backend, ttl=3600, min_tokens=1000)
+        handle = cache.get_handle(1, bible)
+        assert handle is not None and backend.resolve(handle) == bible
+        assert cache.get_handle(1, bible) == handle
+        assert backend.created == 1
+
+        # 3. 大纲或角色变化后作废旧句柄
+        print("\n测试句柄作废：")
+        changed = build_novel_bible("写作要求", "一个武侠故事", characters[:-1], relationships)
+        new_handle = cache.get_handle(1, changed)
+        assert new_handle != handle and backend.resolve(handle) is None
+        assert backend.created == 2 and backend.deleted == 1
+
+        # 4. 即将过期时重新登记
+        print("\n测试过期：")
+        digest, stored, _ = cache._handles[1]
+        cache._handles[1] = (digest, stored, 0)
+        assert cache.get_handle(1, changed) not in (None, new_handle)
+        assert backend.created == 3
+
+        # 5. 设定集太短时不登记
+        assert cache.get_handle(2, "写作要求") is None
+        assert backend.created == 3
+
+        # 6. 登记失败时暂停登记，由调用方发送完整提示词
+        print("\n测试登记失败：")
+        failing = NovelBibleCache(FailingBackend(), min_tokens=10)
+        assert failing.get_handle(1, bible) is None
+        assert failing._disabled_until > 0
+
+        cache.clear()
+        assert backend.created == backend.deleted
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_novel_bible_cache()
@@ -0,0 +1,53 @@
+import logging
+from app.core.cache import ResponseCache
+
+def test_response_cache():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 初始化缓存
+        cache = ResponseCache("test_cache.db", max_entries=3)
+        cache.clear()
+
+        # 2. 未命中后写入，只有行尾空白和首尾空行不同的提示词命中同一条缓存
+        print("\n测试缓存读写：")
+        prompt = "\n请为以下内容生成摘要：  \n\u3000\u3000月光如水，李白独坐江畔。\t\n\n"
+        assert cache.get("model-a", prompt) is None
+        cache.put("model-a", prompt, "李白在江边赏月。")
+        assert cache.get("model-a", "请为以下内容生成摘要：\n\u3000\u3000月光如水，李白独坐江畔。") == "李白在江边赏月。"
+        # 段首的全角空格缩进是正文的一部分
+        assert cache.get("model-a", "请为以下内容生成摘要：\n月光如水，李白独坐江畔。") is None
+        # 不同模型不共用缓存
+        assert cache.get("model-b", prompt) is None
+
+        stats = cache.stats()
+        print("缓存统计:", stats)
+        assert stats["hits"] == 1 and stats["misses"] == 3 and stats["entries"] == 1
+
+        # 3. 超出条目上限时淘汰最久未使用的条目
+        print("\n测试缓存淘汰：")
+        for i in range(3):
+            cache.put("model-a", f"提示词{i}", f"响应{i}")
+        assert cache.get("model-a", prompt) is None
+        assert cache.get("model-a", "提示词2") == "响应2"
+        assert cache.stats()["entries"] == 3
+        assert cache.stats()["evictions"] == 1
+
+        # 4. 过期条目不再返回
+        print("\n测试缓存过期：")
+        cache.ttl = 60
+        cache.db.execute_query("UPDATE llm_cache SET created_at = created_at - 120")
+        assert cache.get("model-a", "提示词2") is None
+        assert cache.purge_expired() == 2
+        assert cache.stats()["entries"] == 0
+
+        cache.close()
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_response_cache()
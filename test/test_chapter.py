@@ -2,6 +2,7 @@ import logging
 from app.database.sqlite import DatabaseManager
 from app.models.novel import Novel
 from app.models.chapter import Chapter
+from app.core.delta import content_hash
 
 def test_chapter_model():
     # 设置日志
@@ -48,7 +49,37 @@ def test_chapter_model():
         updated_info = chapter_model.get(chapter_id)
         print("更新后的信息:", updated_info)
         
-        # 6. 测试获取版本历史
+        # 6. 测试逐章遍历
+        print("\n测试逐章遍历：")
+        chapter_model.create(
+            novel_id=novel_id,
+            chapter_number=2,
+            title="第二章 测试",
+            content="这是第二章的内容"
+        )
+        numbers = [c['chapter_number'] for c in chapter_model.iter_by_novel(novel_id, arraysize=1)]
+        print("章节顺序:", numbers)
+        assert numbers == [1, 2]
+        
+        # 列表只返回元数据，不包含正文
+        listed = chapter_model.list_by_novel(novel_id)
+        print("章节元数据:", listed)
+        assert [c['chapter_number'] for c in listed] == [1, 2]
+        assert 'content' not in listed[0]
+        assert [c['chapter_number'] for c in chapter_model.list_by_novel(novel_id, descending=True)] == [2, 1]
+        summaries = chapter_model.list_by_novel(novel_id, fields=["chapter_number", "summary"], before_chapter=2)
+        assert summaries == [{"chapter_number": 1, "summary": "第一章的摘要"}]
+        assert chapter_model.get_max_chapter_number(novel_id) == 2
+        
+        # 摘要按未保存的正文生成时，记录该正文的哈希，与已保存的正文不一致
+        chapter_model.update(chapter_id, summary="新摘要", summary_hash=content_hash("编辑器中未保存的内容"))
+        result = db.execute_query("SELECT summary_hash = content_hash FROM chapters WHERE id = ?", (chapter_id,))
+        assert result[0][0] == 0
+        chapter_model.update(chapter_id, summary="第一章的摘要")
+        result = db.execute_query("SELECT summary_hash = content_hash FROM chapters WHERE id = ?", (chapter_id,))
+        assert result[0][0] == 1
+        
+        # 7. 测试获取版本历史
         print("\n测试获取版本历史：")
         versions = chapter_model.get_versions(chapter_id)
         print(f"版本历史（共{len(versions)}个版本）:")
@@ -58,7 +89,7 @@ def test_chapter_model():
             print(f"  备注: {version['comment']}")
             print(f"  创建时间: {version['created_at']}")
         
-        # 7. 测试恢复版本
+        # 8. 测试恢复版本
         if versions:
             print("\n测试恢复版本：")
             first_version_id = versions[-1]['id']  # 获取最早的版本
@@ -66,7 +97,7 @@ def test_chapter_model():
             restored_info = chapter_model.get(chapter_id)
             print("恢复后的信息:", restored_info)
         
-        # 8. 测试删��章节
+        # 9. 测试删��章节
         print("\n测试删除章节：")
         chapter_model.delete(chapter_id)
         deleted_info = chapter_model.get(chapter_id)
@@ -79,4 +110,136 @@ def test_chapter_model():
         raise
 
 if __name__ == "__main__":
-    test_chapter_model() 
\ No newline at end of file
+    test_chapter_model() 
+
+def test_version_delta_storage():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+    
+    try:
+        # 1. 初始化数据库和模型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        novel_model = Novel(db)
+        chapter_model = Chapter(db)
+        novel_id = novel_model.create(title="版本测试小说")
+        
+        # 2. 连续保存多次，每次只改动一段
+        print("\n测试增量版本：")
+        paragraphs = [f"第{i}段，月光如水，李白独坐江畔。\n" for i in range(50)]
+        chapter_id = chapter_model.create(
+            novel_id=novel_id,
+            chapter_number=1,
+            title="第一章",
+            content="".join(paragraphs)
+        )
+        history = ["".join(paragraphs)]
+        for i in range(chapter_model.KEYFRAME_INTERVAL + 5):
+            paragraphs[i % 50] = f"第{i}次修改后的段落。\n"
+            history.append("".join(paragraphs))
+            chapter_model.update(chapter_id, content=history[-1])
+            
+        # 3. 大部分版本只保存增量
+        stats = db.execute_query("""
+            SELECT SUM(delta IS NULL), SUM(delta IS NOT NULL)
+            FROM chapter_versions WHERE chapter_id = ?
+        """, (chapter_id,))[0]
+        print(f"关键帧: {stats[0]}, 增量版本: {stats[1]}")
+        assert stats[0] == 2
+        
+        # 内容未变化的保存不产生新版本
+        assert chapter_model.is_content_unchanged(chapter_id, history[-1])
+        assert not chapter_model.update(chapter_id, content=history[-1])
+        assert len(chapter_model.get_versions(chapter_id)) == len(history) - 1
+        
+        # 4. 每个版本都能完整还原（每次保存记录保存前的内容，与最新版本相同的不重复记录）
+        versions = chapter_model.get_versions(chapter_id)
+        restored = [v['content'] for v in reversed(versions)]
+        assert restored == history[:-1]
+        
+        # 5. 恢复最早的版本，与旧版本相同的内容只记录引用
+        chapter_model.restore_version(versions[-1]['id'])
+        assert chapter_model.get(chapter_id)['content'] == history[0]
+        chapter_model.update(chapter_id, content=history[1])
+        latest = db.execute_query(
+            "SELECT content, base_id FROM chapter_versions WHERE chapter_id = ? ORDER BY id DESC LIMIT 1",
+            (chapter_id,)
+        )[0]
+        assert latest[0] is None and latest[1] == versions[-1]['id']
+        assert chapter_model.get_versions(chapter_id)[0]['content'] == history[0]
+        
+        # 6. 压缩升级前的全文版本
+        before = [v['content'] for v in chapter_model.get_versions(chapter_id)]
+        chapter_model.compact_versions(chapter_id)
+        assert [v['content'] for v in chapter_model.get_versions(chapter_id)] == before
+        
+        chapter_model.delete(chapter_id)
+        print("\n测试完成！")
+        
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+def test_version_listing_and_diff():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+    
+    try:
+        from app.core.diff import VersionDiffer, diff_texts
+        
+        # 1. 初始化数据库和模型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        novel_model = Novel(db)
+        chapter_model = Chapter(db)
+        novel_id = novel_model.create(title="版本列表测试小说")
+        
+        # 2. 保存若干版本
+        paragraphs = [f"第{i}段，山高水长。\n" for i in range(20)]
+        chapter_id = chapter_model.create(
+            novel_id=novel_id,
+            chapter_number=1,
+            title="第一章",
+            content="".join(paragraphs)
+        )
+        for i in range(7):
+            paragraphs[i] = f"第{i}段，改成了风急天高。\n"
+            chapter_model.update(chapter_id, content="".join(paragraphs))
+            
+        # 3. 分页列出版本，只包含元数据
+        print("\n测试版本分页：")
+        first_page = chapter_model.list_versions(chapter_id, limit=3)
+        second_page = chapter_model.list_versions(chapter_id, limit=3, before_id=first_page[-1]['id'])
+        rest = chapter_model.list_versions(chapter_id, limit=10, before_id=second_page[-1]['id'])
+        listed = first_page + second_page + rest
+        print("第一页:", first_page)
+        assert 'content' not in first_page[0]
+        full = chapter_model.get_versions(chapter_id)
+        assert [v['id'] for v in listed] == [v['id'] for v in full]
+        assert all(v['size'] == len(f['content']) for v, f in zip(listed, full))
+        
+        # 4. 比较两个版本，结果按版本对缓存
+        print("\n测试版本比较：")
+        differ = VersionDiffer(db)
+        oldest, newest = listed[-1]['id'], listed[0]['id']
+        result = differ.diff(oldest, newest)
+        changed = [op for op in result['ops'] if op['tag'] != 'equal']
+        print("改动片段:", changed)
+        assert len(changed) == 1 and changed[0]['old'].count("\n") == 6
+        assert differ.diff(oldest, newest) is result
+        assert differ.hits == 1 and differ.misses == 1
+        
+        # 按字比较只标出改动的文字
+        char_ops = differ.diff(oldest, newest, mode="char")['ops']
+        assert all("山高水长" not in op['old'] for op in char_ops if op['tag'] != 'equal')
+        assert diff_texts("甲\n乙\n", "甲\n丙\n") == [
+            {"tag": "equal", "old": "甲\n", "new": "甲\n"},
+            {"tag": "replace", "old": "乙\n", "new": "丙\n"}
+        ]
+        
+        chapter_model.delete(chapter_id)
+        print("\n测试完成！")
+        
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
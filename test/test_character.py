@@ -119,5 +119,81 @@ def test_character_model():
         print(f"测试过程中出现错误: {e}")
         raise
 
+class RecordingGenerator:
+    """记录每次提取请求的生成器，按【角色名：描述】标记返回角色"""
+    
+    def __init__(self):
+        self.calls = []
+        
+    def extract_characters(self, content: str) -> list:
+        self.calls.append(content)
+        characters = []
+        for part in content.split("【")[1:]:
+            name, _, description = part.split("】")[0].partition("：")
+            characters.append({
+                "name": name,
+                "description": description,
+                "characteristics": "",
+                "role_type": "配角"
+            })
+        return characters
+
+def test_incremental_extraction():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+    
+    try:
+        # 1. 初始化数据库和模型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        novel_model = Novel(db)
+        chapter_model = Chapter(db)
+        character_model = Character(db)
+        generator = RecordingGenerator()
+        novel_id = novel_model.create(title="角色提取测试小说")
+        
+        paragraphs = [f"第{i}段，" + "风雨如晦，鸡鸣不已。" * 5 for i in range(10)]
+        paragraphs[3] += "【王五：沉默寡言、白衣长剑、江湖剑客】"
+        chapter_id = chapter_model.create(
+            novel_id=novel_id, chapter_number=1, title="第一章", content="\n".join(paragraphs)
+        )
+        
+        # 2. 带描述的标记在本地解析，不调用模型
+        print("\n测试本地解析：")
+        added = character_model.auto_update_characters(generator, novel_id, chapter_id, "\n".join(paragraphs))
+        assert added == 1 and len(generator.calls) == 0
+        wang = character_model.get_character_by_name(novel_id, "王五")
+        print("解析出的角色:", wang)
+        assert wang['description'] == "沉默寡言，白衣长剑" and wang['characteristics'] == "江湖剑客"
+        
+        # 3. 内容未变化、没有标记的改动和指向已有角色的标记都不调用模型
+        print("\n测试跳过提取：")
+        character_model.auto_update_characters(generator, novel_id, chapter_id, "\n".join(paragraphs))
+        paragraphs[5] += "又下雨了。"
+        paragraphs.append("【王五】推门而入。")
+        character_model.auto_update_characters(generator, novel_id, chapter_id, "\n".join(paragraphs))
+        assert len(generator.calls) == 0
+        
+        # 4. 无法解析的标记只把所在段落交给模型
+        print("\n测试模型提取：")
+        paragraphs.append("【赵六】来了。")
+        added = character_model.auto_update_characters(generator, novel_id, chapter_id, "\n".join(paragraphs))
+        print("发送的内容:", generator.calls)
+        assert added == 1 and generator.calls == ["【赵六】来了。"]
+        assert {c['name'] for c in character_model.list_by_novel(novel_id)} == {"王五", "赵六"}
+        
+        # 5. 清除进度后强制提取全部内容
+        character_model.reset_extraction_state(chapter_id)
+        character_model.auto_update_characters(generator, novel_id, chapter_id, "\n".join(paragraphs), force=True)
+        assert "第0段" in generator.calls[-1]
+        
+        novel_model.delete(novel_id)
+        print("\n测试完成！")
+        
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
 if __name__ == "__main__":
-    test_character_model() 
\ No newline at end of file
+    test_character_model()
+    test_incremental_extraction() 
\ No newline at end of file
@@ -0,0 +1,272 @@
+import os
+import logging
+import sqlite3
+import gc
+import threading
+from app.database.sqlite import DatabaseManager
+from app.database.migrations import MIGRATIONS
+
+def test_connection_reuse():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+    
+    try:
+        # 1. 初始化数据库
+        db = DatabaseManager("test_database.db")
+        db.init_database()
+        
+        # 2. 同一线程复用同一个连接
+        print("\n测试连接复用：")
+        conn = db.get_connection()
+        assert db.get_connection() is conn
+        db.execute_query("SELECT COUNT(*) FROM novels")
+        assert db.get_connection() is conn
+        print("同一线程连接复用正常")
+        
+        # 3. 不同线程使用各自的连接
+        print("\n测试线程隔离：")
+        other = {}
+        
+        def worker():
+            other['conn'] = db.get_connection()
+            other['count'] = db.execute_query("SELECT COUNT(*) FROM relationship_types")[0][0]
+            db.release_connection()
+            
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert other['conn'] is not conn
+        assert other['count'] > 0
+        print(f"后台线程查询到{other['count']}个关系类型")
+        
+        # 没有释放连接的线程结束后，连接也会被关闭
+        def short_lived():
+            db.execute_query("SELECT 1")
+            
+        threads = [threading.Thread(target=short_lived) for _ in range(5)]
+        for t in threads:
+            t.start()
+            t.join()
+        gc.collect()
+        assert list(db._connections.values()) == [conn]
+        print("已结束线程的连接已关闭")
+        
+        # 4. 关闭后重新获取会创建新连接
+        print("\n测试关闭连接：")
+        db.close()
+        new_conn = db.get_connection()
+        assert new_conn is not conn
+        db.close()
+        
+        print("\n测试完成！")
+        
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+def test_transaction():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+    
+    try:
+        # 1. 初始化数据库
+        db = DatabaseManager("test_database.db")
+        db.init_database()
+        count_query = "SELECT COUNT(*) FROM relationship_types WHERE category = ?"
+        
+        # 2. 事务正常结束时一次性提交
+        print("\n测试事务提交：")
+        with db.transaction():
+            for i in range(3):
+                db.execute_query(
+                    "INSERT INTO relationship_types (category, type) VALUES (?, ?)",
+                    ("事务测试", f"类型{i}")
+                )
+            assert db.in_transaction()
+        assert not db.in_transaction()
+        committed = db.execute_query(count_query, ("事务测试",))[0][0]
+        print(f"提交后记录数: {committed}")
+        assert committed >= 3
+        
+        # 3. 事务中抛出异常时整体回滚
+        print("\n测试事务回滚：")
+        try:
+            with db.transaction():
+                db.execute_query("DELETE FROM relationship_types WHERE category = ?", ("事务测试",))
+                raise RuntimeError("模拟失败")
+        except RuntimeError:
+            pass
+        assert db.execute_query(count_query, ("事务测试",))[0][0] == committed
+        
+        # 4. 嵌套事务只回滚内层
+        print("\n测试嵌套事务：")
+        with db.transaction():
+            db.execute_query(
+                "INSERT INTO relationship_types (category, type) VALUES (?, ?)",
+                ("事务测试", "外层")
+            )
+            try:
+                with db.transaction():
+                    db.execute_query("DELETE FROM relationship_types WHERE category = ?", ("事务测试",))
+                    raise RuntimeError("内层失败")
+            except RuntimeError:
+                pass
+        assert db.execute_query(count_query, ("事务测试",))[0][0] == committed + 1
+        
+        # 5. 清理测试数据
+        db.execute_query("DELETE FROM relationship_types WHERE category = ?", ("事务测试",))
+        db.close()
+        
+        print("\n测试完成！")
+        
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+def test_migrate_legacy_database():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+    
+    try:
+        # 1. 构造旧版本数据库：只有基础表，关系类型被重复插入
+        db_path = "test_migration.db"
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE novels (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                author TEXT,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE relationship_types (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT NOT NULL,
+                type TEXT NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        conn.execute("INSERT INTO novels (title) VALUES ('旧小说')")
+        for _ in range(3):
+            conn.execute("INSERT INTO relationship_types (category, type) VALUES ('社会', '朋友')")
+        conn.commit()
+        conn.close()
+        
+        # 2. 初始化时自动升级
+        print("\n测试旧数据库升级：")
+        db = DatabaseManager(db_path)
+        db.init_database()
+        version = db.get_schema_version()
+        print(f"升级后版本: {version}")
+        assert version == MIGRATIONS[-1].version
+        
+        # 3. 检查新增字段、表和索引
+        columns = db.get_table_structure('novels')
+        assert 'outline' in columns and 'current_chapter' in columns
+        assert 'chapter_id' in db.get_table_structure('chapter_versions')
+        indexes = {row[0] for row in db.execute_query(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )}
+        print("索引:", sorted(indexes))
+        assert 'idx_chapters_novel_number' in indexes
+        assert 'idx_chapter_versions_chapter_created' in indexes
+        assert 'idx_characters_novel_name' in indexes
+        
+        # 4. 旧数据保留，重复的关系类型被清理
+        assert db.execute_query("SELECT title FROM novels")[0][0] == '旧小说'
+        friends = db.execute_query(
+            "SELECT COUNT(*) FROM relationship_types WHERE category = '社会' AND type = '朋友'"
+        )[0][0]
+        assert friends == 1
+        
+        # 5. 再次初始化不会重复迁移
+        assert db.migrate() == version
+        db.close()
+        
+        print("\n测试完成！")
+        
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+def test_performance_profiles():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+    
+    try:
+        # 1. 默认使用 interactive 配置
+        db = DatabaseManager("test_database.db")
+        db.init_database()
+        settings = db.get_active_settings()
+        print("\n当前设置:", settings)
+        assert settings['profile'] == 'interactive'
+        assert settings['journal_mode'] == 'wal'
+        assert settings['busy_timeout'] == 5000
+        
+        # 2. 切换到只读导出配置后禁止写入
+        print("\n测试只读配置：")
+        db.set_profile('readonly_export')
+        settings = db.get_active_settings()
+        print("只读设置:", settings)
+        assert settings['query_only'] == 1
+        try:
+            db.execute_query("INSERT INTO novels (title) VALUES (?)", ("只读测试",))
+            raise AssertionError("只读配置下不应允许写入")
+        except sqlite3.OperationalError:
+            pass
+        db.set_profile('interactive')
+        
+        # 3. 未知配置名称报错
+        try:
+            DatabaseManager("test_database.db", profile="unknown")
+            raise AssertionError("未知配置应当报错")
+        except ValueError:
+            pass
+        db.close()
+        
+        print("\n测试完成！")
+        
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+def test_iter_query():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+    
+    try:
+        db = DatabaseManager("test_database.db")
+        db.init_database()
+        
+        # 分批读取的结果与一次性读取一致
+        print("\n测试流式查询：")
+        query = "SELECT id, category, type FROM relationship_types ORDER BY id"
+        expected = [tuple(row) for row in db.execute_query(query)]
+        streamed = [tuple(row) for row in db.iter_query(query, arraysize=4)]
+        print(f"共读取{len(streamed)}行")
+        assert streamed == expected
+        
+        # 提前结束遍历不影响后续查询
+        for row in db.iter_query(query, arraysize=2):
+            break
+        assert db.execute_query("SELECT COUNT(*) FROM relationship_types")[0][0] == len(expected)
+        db.close()
+        
+        print("\n测试完成！")
+        
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_connection_reuse()
+    test_transaction()
+    test_migrate_legacy_database()
+    test_performance_profiles()
+    test_iter_query()
@@ -0,0 +1,194 @@
+import time
+import logging
+import threading
+from app.database.sqlite import DatabaseManager
+from app.models.novel import Novel
+from app.models.chapter import Chapter
+from app.core.summary import SummarySystem
+from app.core.jobs import JobQueue, JobWorker, JobInterrupted, PRIORITY_HIGH, PRIORITY_LOW
+from app.core.tasks import AITasks
+
+class APIError(Exception):
+    """模拟带状态码的接口错误"""
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+class StubGenerator:
+    """不访问模型的生成器"""
+    def generate_summary(self, text: str) -> str:
+        return f"{text}的摘要"
+
+    def generate_outline(self, novel_title: str = None, chapter_content: str = None, is_chapter: bool = False) -> str:
+        return f"{chapter_content if is_chapter else novel_title}的大纲"
+
+def test_job_queue():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 初始化数据库和队列
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        db.execute_query("DELETE FROM jobs")
+        queue = JobQueue(db)
+
+        # 2. 按优先级取出，排队中的同键任务合并
+        print("\n测试优先级和去重：")
+        low = queue.enqueue("echo", {"n": 1}, PRIORITY_LOW)
+        first = queue.enqueue("echo", {"n": 2}, dedup_key="echo:a")
+        assert queue.enqueue("echo", {"n": 3}, PRIORITY_HIGH, dedup_key="echo:a") == first
+        job = queue.claim()
+        assert job["id"] == first and job["payload"] == {"n": 3} and job["attempts"] == 1
+        # 同键任务正在执行时，新提交的任务排队但不会被取出
+        second = queue.enqueue("echo", {"n": 4}, PRIORITY_HIGH, dedup_key="echo:a")
+        assert second != first
+        assert queue.claim()["id"] == low
+        assert queue.claim() is None
+        queue.complete(first, {"ok": True})
+        assert queue.claim()["id"] == second
+        assert queue.get(first)["result"] == {"ok": True}
+
+        # 3. 程序崩溃后执行中的任务重新排队
+        print("\n测试重启恢复：")
+        assert queue.recover() == 2
+        assert queue.counts()[JobQueue.PENDING] == 2
+        # 被新任务取代的中断任务直接取消
+        queue.claim()
+        queue.enqueue("echo", {"n": 5}, dedup_key="echo:a")
+        queue.requeue(second)
+        assert queue.get(second)["status"] == JobQueue.CANCELLED
+        db.execute_query("DELETE FROM jobs")
+
+        # 4. 工作线程执行任务，临时错误重试，其他错误直接失败
+        print("\n测试工作线程：")
+        worker = JobWorker(queue, workers=3, poll_interval=0.05, retry_delay=0.01)
+        lock = threading.Lock()
+        state = {"active": 0, "max_active": 0, "flaky": 0}
+
+        def echo(ctx, payload):
+            with lock:
+                state["active"] += 1
+                state["max_active"] = max(state["max_active"], state["active"])
+            time.sleep(0.02)
+            with lock:
+                state["active"] -= 1
+            return payload
+
+        def flaky(ctx, payload):
+            state["flaky"] += 1
+            if state["flaky"] < 3:
+                raise APIError(503)
+            return "ok"
+
+        def broken(ctx, payload):
+            raise ValueError("参数错误")
+
+        finished = []
+        worker.register("echo", echo)
+        worker.register("flaky", flaky)
+        worker.register("broken", broken)
+        worker.add_listener(finished.append)
+        worker.start()
+        ids = [queue.enqueue("echo", {"n": i}) for i in range(10)]
+        flaky_id = queue.enqueue("flaky")
+        broken_id = queue.enqueue("broken")
+        # 等待中的重试不算在 wait_idle 内
+        deadline = time.time() + 5
+        while queue.counts()[JobQueue.PENDING] and time.time() < deadline:
+            worker.wait_idle(timeout=1)
+        print("统计:", worker.metrics())
+        assert all(queue.get(job_id)["status"] == JobQueue.DONE for job_id in ids)
+        assert queue.get(ids[3])["result"] == {"n": 3}
+        assert state["max_active"] <= 3
+        assert queue.get(flaky_id)["status"] == JobQueue.DONE and queue.get(flaky_id)["attempts"] == 3
+        assert queue.get(broken_id)["status"] == JobQueue.FAILED and queue.get(broken_id)["error"] == "参数错误"
+        assert worker.metrics()["retried"] == 2 and len(finished) == 12
+
+        # 5. 取消执行中的任务；退出时中断的任务下次继续
+        print("\n测试取消和中断：")
+        started = threading.Event()
+
+        def long_job(ctx, payload):
+            started.set()
+            ctx.cancel_event.wait(5)
+            raise JobInterrupted()
+
+        worker.register("long", long_job)
+        cancelled = queue.enqueue("long")
+        assert started.wait(2)
+        assert worker.cancel(cancelled)
+        assert worker.wait_idle(timeout=2)
+        assert queue.get(cancelled)["status"] == JobQueue.CANCELLED
+
+        started.clear()
+        interrupted = queue.enqueue("long")
+        assert started.wait(2)
+        worker.stop()
+        job = queue.get(interrupted)
+        assert job["status"] == JobQueue.PENDING and job["attempts"] == 0
+
+        # 失败的任务可以重新执行
+        assert queue.reset(broken_id)
+        assert queue.get(broken_id)["status"] == JobQueue.PENDING
+        db.execute_query("DELETE FROM jobs")
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+def test_ai_tasks():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 初始化数据库、任务队列和任务类型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        db.execute_query("DELETE FROM jobs")
+        novel_model = Novel(db)
+        chapter_model = Chapter(db)
+        generator = StubGenerator()
+        queue = JobQueue(db)
+        worker = JobWorker(queue, workers=2, poll_interval=0.05)
+        tasks = AITasks(db, queue, generator, SummarySystem(db, generator))
+        tasks.register(worker)
+
+        novel_id = novel_model.create(title="任务测试", outline="测试用小说大纲")
+        chapter_id = chapter_model.create(novel_id=novel_id, chapter_number=1, title="第一章", content="月下独酌")
+
+        # 2. 保存章节后提交的任务合并，启动后执行
+        print("\n测试保存后的任务：")
+        jobs = tasks.chapter_saved(novel_id, chapter_id, auto_summary=True)
+        assert tasks.chapter_saved(novel_id, chapter_id, auto_summary=True) == jobs
+        outline_id = tasks.generate_outline(novel_id, chapter_id, is_chapter=True)
+        worker.start()
+        assert worker.wait_idle(timeout=5)
+        worker.stop()
+
+        assert queue.get(jobs[AITasks.CHAPTER_SUMMARY])["result"] == {"summary": "月下独酌的摘要"}
+        assert chapter_model.get(chapter_id)["summary"] == "月下独酌的摘要"
+        assert queue.get(outline_id)["result"] == {"outline": "月下独酌的大纲"}
+        assert queue.get(jobs[AITasks.EXTRACT_CHARACTERS])["status"] == JobQueue.DONE
+        # 摘要变化后排队更新分层摘要
+        assert queue.list_jobs()[0]["kind"] == AITasks.SUMMARY_TREE
+
+        # 3. 摘要已是最新时不再生成
+        job_id = tasks.chapter_saved(novel_id, chapter_id, auto_summary=True)[AITasks.CHAPTER_SUMMARY]
+        worker.start()
+        assert worker.wait_idle(timeout=5)
+        worker.stop()
+        assert queue.get(job_id)["result"] == {"summary": None}
+
+        novel_model.delete(novel_id)
+        db.execute_query("DELETE FROM jobs")
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_job_queue()
+    test_ai_tasks()
@@ -1,6 +1,8 @@
 import logging
 from app.database.sqlite import DatabaseManager
 from app.models.novel import Novel
+from app.models.chapter import Chapter
+from app.core.jobs import JobQueue
 
 def test_novel_model():
     # 设置日志
@@ -40,20 +42,33 @@ def test_novel_model():
         novels = novel_model.list_all()
         print(f"小说列表（共{len(novels)}本）:", novels)
         
-        # 6. 测试添加章节
+        # 6. 测试获取小说标题列表
+        print("\n测试获取小说标题列表：")
+        titles = novel_model.list_titles()
+        print(f"标题列表（共{len(titles)}本）:", titles[:3])
+        assert set(titles[0].keys()) == {"id", "title"}
+        
+        # 7. 测试添加章节
         print("\n测试添加章节：")
         query = """
             INSERT INTO chapters (novel_id, chapter_number, title, content, summary)
             VALUES (?, ?, ?, ?, ?)
         """
-        db.execute_query(query, (novel_id, 1, "第一章", "章节内容", "章节摘要"))
+        chapter_id = db.execute_query(query, (novel_id, 1, "第一章", "章节内容", "章节摘要"))
+        # 修改章节产生版本历史，并提交后台任务
+        Chapter(db).update(chapter_id, content="修改后的章节内容")
+        queue = JobQueue(db)
+        job_ids = [
+            queue.enqueue("chapter_summary", {"novel_id": novel_id, "chapter_id": chapter_id}),
+            queue.enqueue("key_points", {"chapter_id": chapter_id})
+        ]
         
-        # 7. 测试获取章节
+        # 8. 测试获取章节
         print("\n测试获取章节：")
         chapters = novel_model.get_chapters(novel_id)
         print("章节列表:", chapters)
         
-        # 8. 测试添加角色
+        # 9. 测试添加角色
         print("\n测试添加角色：")
         query = """
             INSERT INTO characters (novel_id, name, description, characteristics)
@@ -61,16 +76,20 @@ def test_novel_model():
         """
         db.execute_query(query, (novel_id, "测试角色", "角色描述", "角色特征"))
         
-        # 9. 测试获取角色
+        # 10. 测试获取角色
         print("\n测试获取角色：")
         characters = novel_model.get_characters(novel_id)
         print("角色列表:", characters)
         
-        # 10. 测试删除小说
+        # 11. 测试删除小说
         print("\n测试删除小说：")
         novel_model.delete(novel_id)
         deleted_info = novel_model.get(novel_id)
         print(f"删除后查询结果: {deleted_info}")
+        # 版本历史和排队中的任务一并删除
+        result = db.execute_query("SELECT COUNT(*) FROM chapter_versions WHERE chapter_id = ?", (chapter_id,))
+        assert result[0][0] == 0
+        assert all(queue.get(job_id) is None for job_id in job_ids)
         
         print("\n测试完成！")
         
@@ -0,0 +1,71 @@
+import logging
+from app.database.sqlite import DatabaseManager
+from app.models.novel import Novel
+from app.models.character import Character
+from app.core.names import NameMatcher, CastIndex
+
+def test_name_matching():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 多模式匹配，包括重叠和别名
+        print("\n测试自动机：")
+        matcher = NameMatcher([("李白", 1), ("太白", 1), ("白居易", 2), ("杜甫", 3), ("王五", 4), ("王五郎", 5)])
+        matches = matcher.find("李白居易，王五郎见杜甫")
+        print("匹配:", matches)
+        assert (0, 2, 1) in matches and (1, 4, 2) in matches
+        assert matcher.keys("太白醉了") == {1}
+        assert matcher.keys("王五郎来了") == {4, 5}
+        assert matcher.keys("无人提及") == set()
+
+        # 2. 初始化数据库和模型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        novel_model = Novel(db)
+        character_model = Character(db)
+        cast = CastIndex(db)
+
+        novel_id = novel_model.create(title="角色匹配测试", outline="测试用小说大纲")
+        ids = {}
+        for i in range(400):
+            ids[f"路人{i:03d}"] = character_model.create(novel_id, f"路人{i:03d}", "路人")
+        ids["林冲"] = character_model.create(novel_id, "林冲", "禁军教头", role_type="主角")
+        ids["鲁智深"] = character_model.create(novel_id, "鲁智深", "花和尚")
+        character_model.add_relationship(novel_id, ids["林冲"], ids["鲁智深"], "结义兄弟", "野猪林相救")
+        character_model.add_relationship(novel_id, ids["路人001"], ids["路人002"], "同乡")
+
+        # 3. 只找出被提到的角色
+        print("\n测试角色匹配：")
+        mentioned = cast.mentioned(novel_id, "鲁智深倒拔垂杨柳", "路人007在旁喝彩")
+        assert mentioned == {ids["鲁智深"], ids["路人007"]}
+
+        relationships = cast.relationships(novel_id, mentioned)
+        print("关系:", relationships)
+        assert len(relationships) == 1 and relationships[0]["relationship_type"] == "结义兄弟"
+
+        # 4. 角色名单变化后重建自动机
+        print("\n测试重建：")
+        matcher = cast._get_matcher(novel_id)
+        assert cast._get_matcher(novel_id) is matcher
+        # 只修改描述不重建
+        character_model.update(ids["鲁智深"], description="花和尚鲁达")
+        assert cast._get_matcher(novel_id) is matcher
+        character_model.update(ids["鲁智深"], name="智深")
+        assert cast.mentioned(novel_id, "智深来了") == {ids["鲁智深"]}
+        assert cast._get_matcher(novel_id) is not matcher
+        # 在数据库管理器中改名同样重建
+        matcher = cast._get_matcher(novel_id)
+        db.update_record("characters", ids["林冲"], {"name": "豹子头"})
+        assert cast.mentioned(novel_id, "豹子头夜奔") == {ids["林冲"]}
+        assert cast._get_matcher(novel_id) is not matcher
+
+        novel_model.delete(novel_id)
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_name_matching()
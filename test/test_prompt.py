@@ -0,0 +1,59 @@
+import logging
+from app.core.prompt import PromptAssembler, estimate_tokens, truncate_to_tokens
+
+def test_prompt_assembler():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 估算 token 数
+        print("\n测试 token 估算：")
+        assert estimate_tokens("月光如水") == 4
+        assert estimate_tokens("hello world") == 3
+        assert estimate_tokens(truncate_to_tokens("天" * 100, 10)) <= 10
+
+        # 2. 预算充足时全部保留
+        print("\n测试预算充足：")
+        summaries = [f"第{i}章：李白在第{i}个渡口饮酒。随后乘舟东去，见到了许多风景。" for i in range(1, 101)]
+        assembler = PromptAssembler(100000)
+        assembler.add("outline", ["一个关于诗人的故事"], priority=1, header="小说大纲：")
+        assembler.add("summaries", summaries, priority=2, header="之前章节摘要：", compress=True)
+        assembler.add("prompt", ["请续写下一章"], priority=0, required=True)
+        prompt, report = assembler.build()
+        print("报告:", report)
+        assert all(r["included"] == r["items"] for r in report)
+        assert prompt.endswith("请续写下一章")
+
+        # 3. 预算不足时保留最新的摘要，较早的压缩为第一句或丢弃
+        print("\n测试预算不足：")
+        assembler = PromptAssembler(600)
+        assembler.add("outline", ["一个关于诗人的故事"], priority=1, header="小说大纲：")
+        assembler.add("summaries", summaries, priority=2, header="之前章节摘要：", compress=True)
+        assembler.add("prompt", ["请续写下一章"], priority=0, required=True)
+        prompt, report = assembler.build()
+        print("报告:", report)
+        total = sum(r["tokens"] for r in report)
+        assert total <= 600
+        summary_report = report[1]
+        assert summary_report["dropped"] > 0
+        assert summary_report["included"] + summary_report["compressed"] + summary_report["dropped"] == 100
+        assert summaries[-1] in prompt and summaries[0] not in prompt
+        assert "一个关于诗人的故事" in prompt and "请续写下一章" in prompt
+
+        # 4. 指定保留顺序
+        print("\n测试保留顺序：")
+        assembler = PromptAssembler(12)
+        assembler.add("characters", ["- 张三: 樵夫", "- 李白: 诗人", "- 王五: 剑客"],
+                      priority=3, header="已有角色：", rank=[1, 0, 2])
+        prompt, report = assembler.build()
+        print("提示词:", prompt)
+        assert "李白" in prompt and "王五" not in prompt
+
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_prompt_assembler()
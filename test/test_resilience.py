@@ -0,0 +1,144 @@
+import time
+import logging
+from app.core.backends import FakeBackend
+from app.core.resilience import (
+    ResilientBackend, CircuitBreaker, TokenBucket, CircuitOpenError, DeadlineExceeded, is_retryable
+)
+
+class APIError(Exception):
+    """模拟带状态码的接口错误"""
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+class TransportError(Exception):
+    """与 httpx.TransportError 同名的网络异常"""
+
+class ReadTimeout(TransportError):
+    """与 httpx.ReadTimeout 同名，不继承内置的 TimeoutError"""
+
+class FlakyBackend(FakeBackend):
+    """前几次调用按给定的状态码失败"""
+    def __init__(self, errors, **kwargs):
+        super().__init__(**kwargs)
+        self.errors = list(errors)
+
+    def stream(self, prompt, cached_content=None, timeout=None):
+        if self.errors:
+            self.calls += 1
+            raise APIError(self.errors.pop(0))
+        yield from super().stream(prompt, cached_content, timeout)
+
+def test_resilient_backend():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 区分可重试的错误
+        print("\n测试错误分类：")
+        assert is_retryable(APIError(429)) and is_retryable(APIError(503))
+        assert is_retryable(ConnectionError()) and not is_retryable(APIError(400))
+        assert not is_retryable(CircuitOpenError())
+        # httpx 的网络异常按类名识别
+        assert is_retryable(ReadTimeout("read timed out")) and not is_retryable(ValueError())
+
+        # 2. 临时错误重试后成功
+        print("\n测试重试：")
+        flaky = FlakyBackend([429, 503], model="flaky-retry")
+        backend = ResilientBackend(flaky, rate=0, base_delay=0.01, max_attempts=4)
+        assert backend.generate("续写") == FakeBackend(model="flaky-retry").generate("续写")
+        metrics = backend.metrics()
+        print("统计:", metrics)
+        assert metrics["retries"] == 2 and metrics["failures"] == 0
+        assert metrics["breaker"]["state"] == "closed"
+
+        # 3. 不可重试的错误直接抛出
+        flaky = FlakyBackend([400], model="flaky-bad-request")
+        backend = ResilientBackend(flaky, rate=0, base_delay=0.01)
+        try:
+            backend.generate("续写")
+            raise AssertionError("400 不应重试")
+        except APIError:
+            pass
+        assert flaky.calls == 1
+
+        # 4. 流式输出在第一个片段前重试
+        print("\n测试流式重试：")
+        flaky = FlakyBackend([502], model="flaky-stream", output_chars=100, chunk_chars=40)
+        backend = ResilientBackend(flaky, rate=0, base_delay=0.01)
+        assert len("".join(backend.stream("续写"))) == 100
+        assert backend.metrics()["retries"] == 1
+
+        # 5. 连续失败后熔断，到期后放行一次试探调用
+        print("\n测试熔断：")
+        flaky = FlakyBackend([500] * 6, model="flaky-outage")
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.2)
+        backend = ResilientBackend(flaky, rate=0, base_delay=0.01, max_attempts=5, breaker=breaker)
+        try:
+            backend.generate("续写")
+            raise AssertionError("熔断后应拒绝调用")
+        except CircuitOpenError:
+            pass
+        assert flaky.calls == 3 and breaker.state == "open"
+        try:
+            backend.generate("续写")
+            raise AssertionError("熔断期间应直接拒绝")
+        except CircuitOpenError:
+            pass
+        assert flaky.calls == 3 and breaker.metrics()["rejected"] == 2
+        time.sleep(0.25)
+        assert breaker.state == "half_open"
+        # 试探调用失败后重新熔断
+        try:
+            backend.generate("续写")
+        except CircuitOpenError:
+            pass
+        assert flaky.calls == 4 and breaker.state == "open"
+        # 服务恢复后试探成功
+        flaky.errors = []
+        time.sleep(0.25)
+        assert backend.generate("续写")
+        assert breaker.state == "closed"
+
+        # 6. 截止时间
+        print("\n测试截止时间：")
+        slow = FakeBackend(latency=1.0, model="slow")
+        backend = ResilientBackend(slow, rate=0, base_delay=0.01, deadline=0.2)
+        start = time.time()
+        try:
+            backend.generate("续写")
+            raise AssertionError("应当超时")
+        except TimeoutError:
+            pass
+        assert time.time() - start < 0.9
+
+        # 7. 令牌桶限流
+        print("\n测试限流：")
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.time()
+        for _ in range(4):
+            assert bucket.acquire()
+        assert time.time() - start >= 0.09
+        assert bucket.metrics()["waits"] == 2
+        empty = TokenBucket(rate=1, capacity=1)
+        empty.acquire()
+        assert not empty.acquire(timeout=0.1)
+        # 同一模型的调用共用令牌桶，等待超过截止时间时报错
+        first = ResilientBackend(FakeBackend(model="limited"), rate=0.5, burst=1, deadline=0.5)
+        second = ResilientBackend(FakeBackend(model="limited"), rate=0.5, burst=1, deadline=0.5)
+        assert first.limiter is second.limiter
+        first.generate("一")
+        try:
+            second.generate("二")
+            raise AssertionError("等待限流应超过截止时间")
+        except DeadlineExceeded:
+            pass
+
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_resilient_backend()
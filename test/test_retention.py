@@ -0,0 +1,146 @@
+import os
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from app.database.sqlite import DatabaseManager
+from app.models.novel import Novel
+from app.models.chapter import Chapter
+from app.core.retention import RetentionPolicy, VersionPruner
+
+def test_version_retention():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 初始化数据库和模型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        novel_model = Novel(db)
+        chapter_model = Chapter(db)
+        novel_id = novel_model.create(title="版本清理测试小说")
+
+        # 2. 保存多个版本，并把版本时间分散到过去十周
+        print("\n准备版本历史：")
+        paragraphs = [f"第{i}段，夜雨敲窗，灯下写字。\n" for i in range(30)]
+        chapter_id = chapter_model.create(
+            novel_id=novel_id,
+            chapter_number=1,
+            title="第一章",
+            content="".join(paragraphs)
+        )
+        for i in range(40):
+            paragraphs[i % 30] = f"第{i}次修改。\n"
+            chapter_model.update(chapter_id, content="".join(paragraphs))
+
+        now = datetime(2024, 6, 1, 12, 0, 0)
+        version_ids = [row[0] for row in db.execute_query(
+            "SELECT id FROM chapter_versions WHERE chapter_id = ? ORDER BY id", (chapter_id,)
+        )]
+        # 最旧的版本在十周前，最新的在十分钟前，中间每个版本间隔不同
+        ages = [timedelta(weeks=10) / (i + 1) for i in range(len(version_ids) - 3)]
+        ages += [timedelta(minutes=50), timedelta(minutes=30), timedelta(minutes=10)]
+        for version_id, age in zip(version_ids, ages):
+            db.execute_query(
+                "UPDATE chapter_versions SET created_at = ? WHERE id = ?",
+                ((now - age).strftime("%Y-%m-%d %H:%M:%S"), version_id)
+            )
+        before = {v['id']: v['content'] for v in chapter_model.get_versions(chapter_id)}
+        print(f"版本数: {len(before)}")
+
+        # 3. 按策略选出过期版本：一小时内的全部保留
+        policy = RetentionPolicy()
+        versions = [{"id": vid, "created_at": (now - age).strftime("%Y-%m-%d %H:%M:%S")}
+                    for vid, age in zip(version_ids, ages)]
+        expired = policy.select_expired(versions, now)
+        print(f"过期版本: {len(expired)}")
+        assert expired
+        assert not set(expired) & set(version_ids[-3:])
+
+        # 4. 执行清理，剩余版本内容不变
+        pruner = VersionPruner(db, policy, batch_size=1)
+        report = pruner.prune(now=now, full_vacuum=True)
+        print("清理结果:", report)
+        assert report.versions_deleted == len(expired)
+        assert report.bytes_reclaimed == report.bytes_before - report.bytes_after
+
+        after = {v['id']: v['content'] for v in chapter_model.get_versions(chapter_id)}
+        assert set(after) == set(before) - set(expired)
+        assert all(after[vid] == before[vid] for vid in after)
+
+        # 5. 再次清理没有可删除的版本
+        assert pruner.prune(now=now).versions_deleted == 0
+        assert db.execute_query("PRAGMA auto_vacuum")[0][0] == 2
+
+        chapter_model.delete(chapter_id)
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+def test_prune_reclaims_space():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 新建的数据库默认开启增量回收，旧数据库没有开启
+        for path in ("test_vacuum_new.db", "test_vacuum_old.db"):
+            if os.path.exists(path):
+                os.remove(path)
+        new_db = DatabaseManager("test_vacuum_new.db")
+        new_db.init_database()
+        assert new_db.execute_query("PRAGMA auto_vacuum")[0][0] == 2
+        legacy = sqlite3.connect("test_vacuum_old.db")
+        legacy.execute("CREATE TABLE legacy (id INTEGER PRIMARY KEY)")
+        legacy.close()
+        old_db = DatabaseManager("test_vacuum_old.db")
+        old_db.init_database()
+        assert old_db.execute_query("PRAGMA auto_vacuum")[0][0] == 0
+
+        now = datetime(2024, 6, 1, 12, 0, 0)
+        for db in (new_db, old_db):
+            # 2. 写入大量版本并设为过期
+            print(f"\n测试空间回收: {db.db_path}")
+            chapter_model = Chapter(db)
+            novel_id = Novel(db).create(title="空间回收测试小说")
+            chapter_id = chapter_model.create(novel_id=novel_id, chapter_number=1, title="第一章", content="")
+            for i in range(60):
+                chapter_model.update(chapter_id, content="".join(f"第{i}稿第{j}段。\n" for j in range(500)))
+            db.execute_query(
+                "UPDATE chapter_versions SET created_at = ?",
+                ((now - timedelta(weeks=30)).strftime("%Y-%m-%d %H:%M:%S"),)
+            )
+            # 先把 WAL 中的数据写回数据库文件，文件大小才能反映实际占用
+            db.execute_query("PRAGMA wal_checkpoint(TRUNCATE)")
+            size_before = os.path.getsize(db.db_path)
+
+            # 3. 按默认参数清理，与主窗口的后台清理相同，只做增量回收
+            report = VersionPruner(db).prune(now=now)
+            size_after = os.path.getsize(db.db_path)
+            print("清理结果:", report, f"文件大小: {size_before} -> {size_after}")
+            assert report.versions_deleted > 0
+            if db is old_db:
+                # 后台清理不执行 VACUUM，旧数据库由用户手动压缩一次
+                assert report.bytes_reclaimed == 0 and size_after == size_before
+                assert not db.get_space_usage()["incremental"]
+                assert db.reclaim_space(full=True) > 0
+                size_after = os.path.getsize(db.db_path)
+            else:
+                assert report.bytes_reclaimed > 0
+            assert size_after < size_before
+            assert db.get_space_usage()["freelist_count"] == 0
+            # 之后的清理都走增量回收
+            assert db.get_space_usage()["incremental"]
+            db.close()
+
+        for path in ("test_vacuum_new.db", "test_vacuum_old.db"):
+            os.remove(path)
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_version_retention()
+    test_prune_reclaims_space()
@@ -0,0 +1,82 @@
+import logging
+import time
+from app.database.sqlite import DatabaseManager
+from app.models.novel import Novel
+from app.models.chapter import Chapter
+from app.core.retrieval import ContextRetriever, BM25Index, term_ids, split_chunks
+
+def test_context_retrieval():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 分词和切分片段
+        print("\n测试分词：")
+        # 三个二元组、一个单字和一个单词
+        assert len(term_ids("李白饮酒，月 Moon")) == 5
+        assert set(term_ids("李白")) <= set(term_ids("李白饮酒"))
+        assert list(term_ids("moon")) == list(term_ids("MOON"))
+        chunks = split_chunks("第一段\n\n" + "长" * 25 + "\n第三段", max_chars=10)
+        print("片段:", chunks)
+        assert all(len(chunk) <= 10 for chunk in chunks) and chunks[0] == "第一段"
+
+        # 2. 初始化数据库和模型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        novel_model = Novel(db)
+        chapter_model = Chapter(db)
+        retriever = ContextRetriever(db)
+
+        novel_id = novel_model.create(title="检索测试", outline="测试用小说大纲")
+        chapter_ids = {}
+        for number in range(1, 201):
+            chapter_ids[number] = chapter_model.create(
+                novel_id=novel_id,
+                chapter_number=number,
+                title=f"第{number}章",
+                content=f"第{number}章，众人赶路，在客栈歇脚。\n天色渐晚，各自回房。",
+                summary=f"第{number}章众人赶路"
+            )
+        chapter_model.update(chapter_ids[37], content="铸剑师欧冶子在龙泉山中铸成青锋宝剑，剑身映出寒光。")
+
+        # 3. 检索最相关的前文
+        print("\n测试检索：")
+        start = time.time()
+        results = retriever.search(novel_id, "主角来到龙泉山，想起那把青锋宝剑", before_chapter=150, top_k=3)
+        print(f"检索耗时 {time.time() - start:.3f}s:", results)
+        assert results[0]["chapter_number"] == 37 and results[0]["kind"] == "content"
+
+        # 4. 只检索指定章节之前，排除指定章节
+        assert retriever.search(novel_id, "青锋宝剑", before_chapter=30) == []
+        assert retriever.search(novel_id, "青锋宝剑", exclude_chapters=[37]) == []
+
+        # 5. 章节修改后增量更新
+        print("\n测试增量更新：")
+        chapter_model.update(chapter_ids[120], summary="众人在东海之滨遇见蓬莱仙岛")
+        retriever.update_chapter(novel_id, chapter_ids[120])
+        results = retriever.search(novel_id, "蓬莱仙岛", top_k=1)
+        assert results[0]["chapter_number"] == 120 and results[0]["kind"] == "summary"
+        # 未通过 update_chapter 的修改在下次检索时同步
+        chapter_model.update(chapter_ids[37], content="这一章改写了，不再提到那件兵器。")
+        assert retriever.search(novel_id, "青锋宝剑") == []
+
+        # 6. 删除过半文档后重建倒排表，结果不变
+        print("\n测试重建：")
+        index = BM25Index()
+        for i in range(10):
+            index.add(f"文档{i}", {"n": i}, group=i)
+        index.add("青锋宝剑", {"n": 10}, group=10)
+        for i in range(6):
+            index.remove_group(i)
+        assert len(index) == 5 and len(index._texts) == 5
+        assert index.meta(index.search("宝剑")[0][0])["n"] == 10
+
+        novel_model.delete(novel_id)
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_context_retrieval()
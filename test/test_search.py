@@ -0,0 +1,75 @@
+import logging
+from app.database.sqlite import DatabaseManager
+from app.models.novel import Novel
+from app.models.chapter import Chapter
+from app.core.search import SearchIndex
+
+def test_search_index():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+    
+    try:
+        # 1. 初始化数据库和模型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        novel_model = Novel(db)
+        chapter_model = Chapter(db)
+        search_index = SearchIndex(db)
+        
+        # 2. 创建测试小说和章节
+        novel_id = novel_model.create(title="检索测试小说", outline="江湖故事")
+        chapter_model.create(
+            novel_id=novel_id,
+            chapter_number=1,
+            title="第一章 江畔",
+            content="月光如水，李白独坐江畔，手中的酒壶映照着星光。",
+            summary="李白在江边饮酒"
+        )
+        chapter2_id = chapter_model.create(
+            novel_id=novel_id,
+            chapter_number=2,
+            title="第二章 对决",
+            content="剑光如虹，李白与蒙面剑客的对决惊动了整个江湖。",
+            summary="李白与蒙面剑客交手"
+        )
+        
+        # 3. 测试全文检索
+        print("\n测试全文检索：")
+        results = search_index.search(novel_id, "蒙面剑客")
+        print("检索结果:", results)
+        assert [r['chapter_number'] for r in results] == [2]
+        assert "[蒙面剑客]" in results[0]['snippet']
+        assert results[0]["position"] == len("剑光如虹，李白与")
+        
+        # 4. 测试短关键词
+        print("\n测试短关键词：")
+        results = search_index.search(novel_id, "李白")
+        print("检索结果:", results)
+        assert [r['chapter_number'] for r in results] == [1, 2]
+        
+        # 5. 修改章节后索引自动更新
+        print("\n测试索引更新：")
+        chapter_model.update(chapter2_id, content="剑光如虹，李白与黑衣刺客的对决惊动了整个江湖。")
+        assert search_index.search(novel_id, "黑衣刺客")[0]['chapter_id'] == chapter2_id
+        assert not search_index.search(novel_id, "蒙面剑客的对决")
+        
+        # 6. 没有全文索引时逐章扫描
+        print("\n测试无全文索引：")
+        scan_index = SearchIndex(db)
+        scan_index._fts_available = False
+        results = scan_index.search(novel_id, "黑衣刺客")
+        assert [r['chapter_number'] for r in results] == [2]
+        assert results[0]["position"] == len("剑光如虹，李白与")
+        
+        # 7. 删除小说后不再检索到
+        novel_model.delete(novel_id)
+        assert not search_index.search(novel_id, "月光如水")
+        
+        print("\n测试完成！")
+        
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_search_index()
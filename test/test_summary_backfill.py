@@ -0,0 +1,132 @@
+import time
+import logging
+import threading
+from app.database.sqlite import DatabaseManager
+from app.models.novel import Novel
+from app.models.chapter import Chapter
+from app.core.summary import SummarySystem
+from app.core.cache import ResponseCache
+from app.core.backends import FakeBackend
+from app.core.generator import NovelGenerator
+
+class SlowGenerator:
+    """模拟模型延迟的生成器，记录并发数，可以让指定章节失败"""
+    def __init__(self, delay: float = 0.02, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def generate_summary(self, text: str) -> str:
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if text in self.fail:
+                raise ConnectionError("模拟网络错误")
+            return f"{text}的摘要"
+        finally:
+            with self._lock:
+                self.active -= 1
+
+def test_summary_backfill():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 初始化数据库和模型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        novel_model = Novel(db)
+        chapter_model = Chapter(db)
+
+        # 2. 创建 30 章，其中前 5 章已有摘要，第 30 章没有正文
+        print("\n创建测试章节：")
+        novel_id = novel_model.create(title="摘要补全测试", outline="测试用小说大纲")
+        chapter_ids = {}
+        for number in range(1, 31):
+            chapter_ids[number] = chapter_model.create(
+                novel_id=novel_id,
+                chapter_number=number,
+                title=f"第{number}章",
+                content=f"第{number}章正文" if number < 30 else "",
+                summary=f"第{number}章正文的摘要" if number <= 5 else None
+            )
+
+        # 3. 正文修改后原有摘要过期
+        print("\n测试查找待补全章节：")
+        chapter_model.update(chapter_ids[2], content="第2章修改后的正文")
+        pending = SummarySystem(db, SlowGenerator()).get_pending_chapters(novel_id)
+        assert [c["chapter_number"] for c in pending] == [2] + list(range(6, 30))
+
+        # 4. 中途取消，已完成的章节已经保存
+        print("\n测试取消：")
+        cancel = threading.Event()
+        generator = SlowGenerator()
+        system = SummarySystem(db, generator)
+        report = system.backfill_summaries(
+            novel_id, concurrency=4, cancel_event=cancel,
+            progress=lambda r: r.done >= 8 and cancel.set()
+        )
+        print("结果:", report)
+        assert report.total == 25 and 8 <= report.done < 25
+        assert len(system.get_pending_chapters(novel_id)) == 25 - report.done
+
+        # 5. 再次补全只处理剩余章节，失败的章节留到下次
+        print("\n测试继续补全：")
+        generator = SlowGenerator(fail={"第20章正文"})
+        system = SummarySystem(db, generator)
+        resumed = system.backfill_summaries(novel_id, concurrency=4, refresh_tree=False)
+        print("结果:", resumed, f"{resumed.chapters_per_second:.1f}章/秒")
+        assert resumed.total == 25 - report.done and resumed.failed == 1
+        assert resumed.done == resumed.total - 1
+        assert generator.calls == resumed.total and generator.max_active <= 4
+        assert resumed.chapters_per_second > 0 and resumed.chars_per_second > 0
+        assert [c["chapter_number"] for c in system.get_pending_chapters(novel_id)] == [20]
+        assert chapter_model.get(chapter_ids[2])["summary"] == "第2章修改后的正文的摘要"
+        assert chapter_model.get(chapter_ids[1])["summary"] == "第1章正文的摘要"
+
+        # 6. 全部补全后更新情节段摘要，之后不再调用模型
+        system = SummarySystem(db, SlowGenerator(delay=0))
+        assert system.backfill_summaries(novel_id).done == 1
+        result = db.execute_query("SELECT COUNT(*) FROM summary_nodes WHERE novel_id = ?", (novel_id,))
+        assert result[0][0] == 2
+        calls = system.generator.calls
+        assert system.backfill_summaries(novel_id).total == 0
+        assert system.generator.calls == calls
+
+        # 7. 使用带响应缓存的生成器，工作线程每次调用后释放缓存数据库的连接
+        print("\n测试连接释放：")
+        for number in range(1, 21):
+            chapter_model.update(chapter_ids[number], content=f"第{number}章第二稿")
+        cache = ResponseCache("test_llm_cache.db")
+        cache.clear()
+        main_conn = cache.db.get_connection()
+        generator = NovelGenerator(cache=cache, backend=FakeBackend(latency=0.01))
+        system = SummarySystem(db, generator)
+        connections = []
+
+        def check_connections(r):
+            # 最后一章完成时线程池的线程仍然存活，只剩主线程的连接
+            if r.done == 20:
+                connections.extend(cache.db._connections.values())
+
+        report = system.backfill_summaries(novel_id, concurrency=4, progress=check_connections, refresh_tree=False)
+        assert report.done == 20
+        assert connections == [main_conn]
+        assert list(cache.db._connections.values()) == [main_conn]
+        cache.close()
+
+        novel_model.delete(novel_id)
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_summary_backfill()
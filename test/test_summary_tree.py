@@ -0,0 +1,108 @@
+import logging
+from app.database.sqlite import DatabaseManager
+from app.models.novel import Novel
+from app.models.chapter import Chapter
+from app.core.summary_tree import SummaryTree
+
+class CountingGenerator:
+    """记录调用次数的生成器，摘要为输入的行数"""
+    def __init__(self):
+        self.calls = 0
+
+    def generate_summary(self, text: str) -> str:
+        self.calls += 1
+        return f"汇总{len(text.splitlines())}条"
+
+def test_summary_tree():
+    # 设置日志
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # 1. 初始化数据库和模型
+        db = DatabaseManager("test_models.db")
+        db.init_database()
+        novel_model = Novel(db)
+        chapter_model = Chapter(db)
+        generator = CountingGenerator()
+        tree = SummaryTree(db, generator)
+
+        # 2. 创建 125 章
+        print("\n创建测试章节：")
+        novel_id = novel_model.create(title="分层摘要测试", outline="测试用小说大纲")
+        chapter_ids = {}
+        for number in range(1, 126):
+            chapter_ids[number] = chapter_model.create(
+                novel_id=novel_id,
+                chapter_number=number,
+                title=f"第{number}章",
+                content=f"第{number}章的内容",
+                summary=f"第{number}章的摘要"
+            )
+
+        # 3. 不生成时缺失的节点展开为章节摘要
+        print("\n测试只读取：")
+        items = tree.get_context_summaries(novel_id, before_chapter=30)
+        assert len(items) == 29 and generator.calls == 0
+        assert items[0]["label"] == "第1章"
+
+        # 4. 生成后条目数有上限：1 卷 + 2 个情节段 + 5 章
+        print("\n测试生成分层摘要：")
+        items = tree.get_context_summaries(novel_id, generate=True)
+        print("摘要:", [(item["label"], item["summary"]) for item in items])
+        assert [item["level"] for item in items] == ["volume", "arc", "arc"] + ["chapter"] * 5
+        assert items[0]["label"] == "第1-100章" and items[0]["summary"] == "汇总10条"
+        assert items[1]["label"] == "第101-110章"
+        # 10 个情节段 + 1 卷 + 2 个情节段
+        assert generator.calls == 13
+
+        # 5. 节点未过期时直接复用
+        print("\n测试复用节点：")
+        assert tree.refresh(novel_id) == 0
+        items = tree.get_context_summaries(novel_id, before_chapter=60)
+        assert [item["level"] for item in items] == ["arc"] * 5 + ["chapter"] * 9
+        assert generator.calls == 13
+
+        # 6. 修改一章摘要后只重新生成所在的情节段和卷
+        print("\n测试局部更新：")
+        chapter_model.update(chapter_ids[15], summary="第15章的新摘要")
+        # 不生成时沿用过期节点
+        items = tree.get_context_summaries(novel_id, before_chapter=30)
+        assert [item["level"] for item in items] == ["arc", "arc"] + ["chapter"] * 9
+        assert tree.refresh(novel_id) == 2
+        assert generator.calls == 15
+
+        # 7. 删除小说时删除汇总节点
+        print("\n测试删除：")
+        novel_model.delete(novel_id)
+        result = db.execute_query("SELECT COUNT(*) FROM summary_nodes WHERE novel_id = ?", (novel_id,))
+        assert result[0][0] == 0
+
+        # 8. 长篇小说的条目数不随章节数线性增长
+        print("\n测试长篇小说：")
+        novel_id = novel_model.create(title="长篇分层摘要测试", outline="测试用小说大纲")
+        for number in range(1, 1235):
+            chapter_model.create(
+                novel_id=novel_id,
+                chapter_number=number,
+                title=f"第{number}章",
+                content=f"第{number}章的内容",
+                summary=f"第{number}章的摘要"
+            )
+        tree.refresh(novel_id)
+        # 1 个千章节点 + 2 卷 + 3 个情节段 + 4 章
+        items = tree.get_context_summaries(novel_id)
+        assert [item["label"] for item in items[:3]] == ["第1-1000章", "第1001-1100章", "第1101-1200章"]
+        assert len(items) == 10
+        for before_chapter in (200, 999, 1000, 1001, 1100, 1200):
+            items = tree.get_context_summaries(novel_id, before_chapter=before_chapter)
+            assert len(items) <= 30 and items[-1]["end_chapter"] == before_chapter - 1
+        novel_model.delete(novel_id)
+
+        print("\n测试完成！")
+
+    except Exception as e:
+        print(f"测试过程中出现错误: {e}")
+        raise
+
+if __name__ == "__main__":
+    test_summary_tree()